@@ -0,0 +1,167 @@
+"""
+Benchmark each stage of a clean on a synthetic tree and check for regressions.
+
+Stages are timed separately and reported in files per second: scan
+(get_files), classify (map_file_to_category), conflict resolution
+(get_unique_filename), move (move_files), save_log and revert_changes.
+Each stage's best rate over the repeats is compared against a baseline
+recorded on this machine, and the run exits with status 1 if any stage got
+slower than the allowed margin. Baselines are machine specific and are not
+part of the repository: the first run with a given set of parameters
+records one, and --update-baseline replaces it. With --memory the tree
+lives in the in-memory filesystem backend, which times the cleaner's own
+Python work without any disk I/O.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--width N] [--depth N] [--collision-rate R] [--memory] [--update-baseline]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from change_logger import ChangeLogger
+from filesystem import MemoryBackend, use_backend
+from folder_cleaner import (DEFAULT_RULES, create_directories, get_files, get_unique_filename,
+                            map_file_to_category, move_files)
+from name_index import NameIndex
+from revert_changes import revert_changes
+from synthetic_tree import DEFAULT_MIX, generate_tree, parse_mix
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+STAGES = ('scan', 'classify', 'conflicts', 'move', 'save_log', 'revert')
+
+def run_once(directories: List[str]) -> Dict[str, float]:
+    """Run every stage once over the tree and return files per second per stage."""
+    timings = dict.fromkeys(STAGES, 0.0)
+    logger = ChangeLogger(directories[0])
+
+    start = time.perf_counter()
+    listings = [(directory, get_files(directory)) for directory in directories]
+    timings['scan'] = time.perf_counter() - start
+    total = sum(len(files) for _, files in listings)
+
+    start = time.perf_counter()
+    file_maps = []
+    for directory, files in listings:
+        file_map = {category: [] for category in DEFAULT_RULES.categories}
+        for file in files:
+            map_file_to_category(file, file_map)
+        file_maps.append(file_map)
+    timings['classify'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    name_index = NameIndex()
+    for (directory, _), file_map in zip(listings, file_maps):
+        for category, files in file_map.items():
+            for file in files:
+                get_unique_filename(os.path.join(directory, category, file), name_index)
+    timings['conflicts'] = time.perf_counter() - start
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        category_dirs = [create_directories(directory, logger=logger) for directory, _ in listings]
+        start = time.perf_counter()
+        for (directory, _), file_map, dirs in zip(listings, file_maps, category_dirs):
+            move_files(directory, file_map, dirs, logger=logger)
+        timings['move'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        log_file = logger.save_log()
+        timings['save_log'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        revert_changes(log_file)
+        timings['revert'] = time.perf_counter() - start
+
+    return {stage: total / max(seconds, 1e-9) for stage, seconds in timings.items()}
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], max_regression: float) -> List[str]:
+    """Return the stages whose rate fell more than max_regression below the baseline."""
+    return [stage for stage in STAGES
+            if stage in baseline and results[stage] < baseline[stage] * (1 - max_regression)]
+
+def load_baselines(path: str) -> List[dict]:
+    """Read the recorded baselines, one {"params", "results"} entry per parameter set."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)["baselines"]
+
+def save_baselines(path: str, baselines: List[dict]) -> None:
+    with open(path, 'w') as f:
+        json.dump({"baselines": baselines}, f, indent=2)
+        f.write('\n')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the cleaning pipeline stage by stage.")
+    parser.add_argument('--width', type=int, default=2000, help='Files per directory')
+    parser.add_argument('--depth', type=int, default=1, help='Levels of subdirectories')
+    parser.add_argument('--fanout', type=int, default=4, help='Subdirectories per directory')
+    parser.add_argument('--mix', type=str, default=None,
+                        help='Extension mix as ext=weight pairs, e.g. "pdf=3,mp3=1,none=1"')
+    parser.add_argument('--collision-rate', type=float, default=0.1,
+                        help='Fraction of files whose name is already taken in their category folder')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the tree generator')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage; the best rate is kept')
+    parser.add_argument('--baseline', type=str, default=BASELINE_FILE,
+                        help='Baseline file to compare against (recorded on first run)')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='Allowed slowdown per stage relative to the baseline (0.25 = 25%%)')
+    parser.add_argument('--memory', action='store_true', help='Run on the in-memory filesystem backend')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Replace the recorded baseline for these parameters')
+    args = parser.parse_args()
+
+    params = {"width": args.width, "depth": args.depth, "fanout": args.fanout,
+              "mix": args.mix or "default", "collision_rate": args.collision_rate, "seed": args.seed}
+    if args.memory:
+        params["backend"] = "memory"
+        with use_backend(MemoryBackend()):
+            directories = generate_tree('/bench_pipeline', args.width, args.depth, args.fanout,
+                                        parse_mix(args.mix) if args.mix else DEFAULT_MIX,
+                                        args.collision_rate, args.seed)
+            runs = [run_once(directories) for _ in range(args.repeat)]
+    else:
+        root = tempfile.mkdtemp(prefix='bench_pipeline_')
+        try:
+            directories = generate_tree(root, args.width, args.depth, args.fanout,
+                                        parse_mix(args.mix) if args.mix else DEFAULT_MIX,
+                                        args.collision_rate, args.seed)
+            runs = [run_once(directories) for _ in range(args.repeat)]
+        finally:
+            shutil.rmtree(root)
+    results = {stage: max(run[stage] for run in runs) for stage in STAGES}
+
+    baselines = load_baselines(args.baseline)
+    entry = next((entry for entry in baselines if entry["params"] == params), None)
+    baseline = entry["results"] if entry is not None and not args.update_baseline else {}
+
+    print(f"{'stage':>10} {'files/sec':>12} {'baseline':>12} {'relative':>9}")
+    for stage in STAGES:
+        if stage in baseline:
+            print(f"{stage:>10} {results[stage]:>12,.0f} {baseline[stage]:>12,.0f} "
+                  f"{results[stage] / baseline[stage]:>9.2f}")
+        else:
+            print(f"{stage:>10} {results[stage]:>12,.0f} {'-':>12} {'-':>9}")
+
+    if not baseline:
+        # first run with these parameters on this machine, or an explicit update
+        baselines = [other for other in baselines if other["params"] != params]
+        baselines.append({"params": params, "results": {stage: round(rate) for stage, rate in results.items()}})
+        save_baselines(args.baseline, baselines)
+        print(f"Baseline recorded in: {args.baseline}")
+        sys.exit(0)
+
+    regressions = compare(results, baseline, args.max_regression)
+    if regressions:
+        print(f"Regression beyond {args.max_regression:.0%} in: {', '.join(regressions)}")
+        sys.exit(1)
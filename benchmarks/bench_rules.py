@@ -0,0 +1,84 @@
+"""
+Benchmark classification throughput as the number of rules grows.
+
+Usage:
+    python benchmarks/bench_rules.py [--files N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from folder_cleaner import DEFAULT_RULES
+from rules import RuleSet
+
+def make_rules(count: int, kind: str = 'mixed') -> RuleSet:
+    """
+    Extend the built-in rules with count rules of one kind.
+
+    'mixed' adds extension, glob and regex rules with distinct literal
+    prefixes. 'ignore_case' adds the same globs and regexes matched
+    case-insensitively, and 'unanchored' adds globs and regexes that may
+    match anywhere in the name, so neither has a plain literal prefix.
+    """
+    rng = random.Random(count)
+    config = {"categories": {}, "patterns": []}
+    for i in range(count):
+        rule_kind = i % 3
+        if kind == 'mixed' and rule_kind == 0:
+            config["categories"].setdefault(f"Custom{i % 20}", []).append(f".ext{i}")
+        elif kind == 'unanchored':
+            if rule_kind == 0:
+                config["patterns"].append({"glob": f"*tag{i}*", "category": f"Custom{i % 20}"})
+            else:
+                config["patterns"].append({"regex": rf".*report_{i}_\d+", "category": f"Custom{i % 20}"})
+        elif rule_kind == 1:
+            config["patterns"].append({"glob": f"prefix{i}_*.{rng.choice(['pdf', 'png', 'zip'])}",
+                                       "category": f"Custom{i % 20}", "ignore_case": kind == 'ignore_case'})
+        else:
+            config["patterns"].append({"regex": rf"report_{i}_\d+", "category": f"Custom{i % 20}",
+                                       "ignore_case": kind == 'ignore_case'})
+    return RuleSet.from_config(config, DEFAULT_RULES)
+
+def make_names(count: int) -> list:
+    """Mostly ordinary downloads, with some names that hit glob and regex rules."""
+    rng = random.Random(0)
+    extensions = ['.pdf', '.mp3', '.png', '.zip', '.exe', '.xyz', '']
+    names = []
+    for _ in range(count):
+        kind = rng.randrange(10)
+        if kind == 0:
+            names.append(f"prefix{rng.randrange(1000)}_{rng.randrange(100)}.pdf")
+        elif kind == 1:
+            names.append(f"report_{rng.randrange(1000)}_{rng.randrange(100)}")
+        elif kind == 2:
+            names.append(f"file_tag{rng.randrange(1000)}_{rng.randrange(100)}.pdf")
+        else:
+            names.append(f"file_{rng.randrange(10 ** 6)}{rng.choice(extensions)}")
+    return names
+
+def bench(rules: RuleSet, names: list) -> float:
+    """Return classified files per second."""
+    classify = rules.classify
+    start = time.perf_counter()
+    for name in names:
+        classify(name)
+    return len(names) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark rule classification throughput.")
+    parser.add_argument('--files', type=int, default=200000, help='Number of filenames to classify')
+    args = parser.parse_args()
+
+    names = make_names(args.files)
+    baseline = bench(DEFAULT_RULES, names)
+    print(f"{'kind':>12} {'rules':>6} {'files/sec':>12} {'relative':>9}")
+    print(f"{'default':>12} {'0':>6} {baseline:>12,.0f} {1:>9.2f}")
+    for kind in ('mixed', 'ignore_case', 'unanchored'):
+        for count in (50, 500, 1000):
+            rate = bench(make_rules(count, kind), names)
+            print(f"{kind:>12} {count:>6} {rate:>12,.0f} {rate / baseline:>9.2f}")
@@ -0,0 +1,85 @@
+"""
+Seeded generator for synthetic download trees used by the benchmarks.
+
+The same seed and parameters always produce the same tree, so runs on one
+machine are comparable with each other and with a stored baseline.
+"""
+
+import os
+import random
+from typing import Dict, List, Optional
+
+# extension -> relative weight; roughly what a Downloads folder looks like
+DEFAULT_MIX: Dict[str, float] = {
+    '.pdf': 20, '.docx': 5, '.txt': 5, '.jpg': 15, '.png': 10, '.mp3': 5, '.mp4': 5,
+    '.zip': 10, '.exe': 5, '.dmg': 2, '.csv': 5, '.json': 3, '': 5, '.part': 5,
+}
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """
+    Parse an extension mix such as "pdf=3,mp3=1,none=1".
+
+    Args:
+        spec: Comma separated ext=weight pairs ("none" means no extension)
+
+    Returns:
+        Dictionary of extension (with dot) to weight
+    """
+    mix = {}
+    for item in spec.split(','):
+        ext, _, weight = item.partition('=')
+        ext = ext.strip().lstrip('.')
+        mix['' if ext == 'none' else '.' + ext] = float(weight or 1)
+    return mix
+
+def generate_tree(root: str, width: int = 1000, depth: int = 0, fanout: int = 4,
+                  mix: Optional[Dict[str, float]] = None, collision_rate: float = 0.0,
+                  seed: int = 0) -> List[str]:
+    """
+    Create a synthetic tree of small files through the current filesystem backend.
+
+    Every directory gets width files; directories above the given depth get
+    fanout subdirectories each. With a collision rate, that fraction of the
+    files also gets a same-named file pre-placed in the category folder it
+    will be moved to, so conflict resolution has to pick a new name.
+
+    Args:
+        root: Directory to create the tree in (created if missing)
+        width: Files per directory
+        depth: Levels of subdirectories below root
+        fanout: Subdirectories per directory
+        mix: Extension to weight (defaults to DEFAULT_MIX)
+        collision_rate: Fraction of files (0-1) that collide on move
+        seed: Random seed
+
+    Returns:
+        Paths of every directory created, root first
+    """
+    # imported here so the generator can be used without importing the cleaner
+    from filesystem import backend
+    from folder_cleaner import DEFAULT_RULES
+
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    extensions = list(mix)
+    weights = [mix[ext] for ext in extensions]
+
+    directories = []
+    stack = [(root, depth)]
+    while stack:
+        directory, remaining = stack.pop()
+        backend.makedirs(directory, exist_ok=True)
+        directories.append(directory)
+        for i, ext in enumerate(rng.choices(extensions, weights, k=width)):
+            name = f"file_{i}_{rng.randrange(10 ** 6)}{ext}"
+            with backend.open(os.path.join(directory, name), 'w') as f:
+                f.write(name)
+            if rng.random() < collision_rate:
+                category_dir = os.path.join(directory, DEFAULT_RULES.classify(name))
+                backend.makedirs(category_dir, exist_ok=True)
+                with backend.open(os.path.join(category_dir, name), 'w') as f:
+                    f.write('existing')
+        if remaining > 0:
+            for j in reversed(range(fanout)):
+                stack.append((os.path.join(directory, f"dir_{j}"), remaining - 1))
+    return directories
@@ -0,0 +1,234 @@
+"""Module indexing change logs in a SQLite catalog for lookups and selective reverts."""
+
+import argparse
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from change_logger import Change, _is_journal, _open_log, iter_changes
+from subfolders import move_category
+
+# catalog written next to the logs unless another path is given
+CATALOG_NAME = 'catalog.sqlite3'
+
+# (catalog row id, Type, source, destination, run timestamp)
+CatalogRow = Tuple[int, str, str, str, str]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    log_file TEXT NOT NULL UNIQUE,
+    base_path TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    type TEXT NOT NULL,
+    source TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    name TEXT NOT NULL,
+    category TEXT,
+    reverted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS changes_source ON changes (source);
+CREATE INDEX IF NOT EXISTS changes_destination ON changes (destination);
+CREATE INDEX IF NOT EXISTS changes_name ON changes (name);
+CREATE INDEX IF NOT EXISTS changes_category ON changes (category);
+CREATE INDEX IF NOT EXISTS changes_run ON changes (run_id);
+"""
+
+def default_catalog_path() -> str:
+    """Path of the catalog in the logs directory."""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', CATALOG_NAME)
+
+def _category(change_type: str, src: str, dst: str) -> Optional[str]:
+    """Category folder a move ended up in (None for other change types)."""
+    if change_type != "move":
+        return None
+    return move_category(src, dst)
+
+def _prefix_range(prefix: str) -> Tuple[str, str]:
+    """Bounds matching every string that starts with prefix, usable as an index range."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def _log_metadata(log_file: str) -> Dict[str, str]:
+    """Read the base path and timestamp stored in a log's header."""
+    with _open_log(log_file, 'rt') as f:
+        if _is_journal(log_file):
+            header = json.loads(f.readline())
+        else:
+            header = json.load(f)
+    return {"base_path": header.get("base_path"), "timestamp": header.get("timestamp", "")}
+
+class Catalog:
+    """
+    SQLite index over the changes of every run.
+
+    Each change is stored with its run, full source and destination paths,
+    file name and destination category, all indexed, so questions like
+    "where did report.pdf go" or "undo everything moved into Videos last
+    week" are answered with indexed queries instead of parsing every log.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Args:
+            db_path: Catalog file (defaults to logs/catalog.sqlite3)
+        """
+        self.db_path = db_path or default_catalog_path()
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.db_path)
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> 'Catalog':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _run_id(self, log_file: str, base_path: Optional[str], timestamp: str) -> int:
+        log_file = os.path.abspath(log_file)
+        row = self._db.execute("SELECT id FROM runs WHERE log_file = ?", (log_file,)).fetchone()
+        if row is not None:
+            return row[0]
+        return self._db.execute("INSERT INTO runs (log_file, base_path, timestamp) VALUES (?, ?, ?)",
+                                (log_file, base_path, timestamp)).lastrowid
+
+    def add_changes(self, log_file: str, base_path: Optional[str], timestamp: str,
+                    changes: Iterable[Change]) -> int:
+        """
+        Append changes to the run of a log file, registering the run if it is new.
+
+        Args:
+            log_file: Log the changes were written to
+            base_path: Root folder of the run
+            timestamp: Run timestamp (YYYYMMDD_HHMMSS)
+            changes: (Type, source, destination) tuples in log order
+
+        Returns:
+            Number of changes added
+        """
+        with self._db:
+            run_id = self._run_id(log_file, base_path, timestamp)
+            cursor = self._db.executemany(
+                "INSERT INTO changes (run_id, type, source, destination, name, category) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((run_id, change_type, src, dst, os.path.basename(src or dst), _category(change_type, src, dst))
+                 for change_type, src, dst in changes))
+        return cursor.rowcount
+
+    def import_log(self, log_file: str) -> int:
+        """
+        Index an existing log file. Logs that are already in the catalog are skipped.
+
+        Args:
+            log_file: Path to a log in any supported format
+
+        Returns:
+            Number of changes imported
+        """
+        row = self._db.execute("SELECT 1 FROM runs WHERE log_file = ?", (os.path.abspath(log_file),)).fetchone()
+        if row is not None:
+            return 0
+        metadata = _log_metadata(log_file)
+        return self.add_changes(log_file, metadata["base_path"], metadata["timestamp"], iter_changes(log_file))
+
+    def select(self, pattern: Optional[str] = None, directory: Optional[str] = None,
+               category: Optional[str] = None, since: Optional[str] = None,
+               until: Optional[str] = None, types: Tuple[str, ...] = ("move", "hardlink")) -> List[CatalogRow]:
+        """
+        Find changes that have not been reverted yet, newest first.
+
+        Args:
+            pattern: Glob matched against the file name, or against the full
+                source path when it contains a path separator
+            directory: Only changes whose source lies under this directory
+            category: Only moves into this category folder
+            since: Only runs at or after this time (YYYYMMDD[_HHMMSS], prefixes allowed)
+            until: Only runs at or before this time (same format, inclusive)
+            types: Change types to return
+
+        Returns:
+            List of (row id, Type, source, destination, run timestamp)
+        """
+        where = ["c.reverted = 0", f"c.type IN ({','.join('?' * len(types))})"]
+        params: List[str] = list(types)
+        if pattern:
+            column = "c.source" if os.sep in pattern or (os.altsep and os.altsep in pattern) else "c.name"
+            where.append(f"{column} GLOB ?")
+            params.append(pattern)
+        if directory:
+            low, high = _prefix_range(os.path.join(os.path.abspath(directory), ''))
+            where.append("c.source >= ? AND c.source < ?")
+            params += [low, high]
+        if category:
+            where.append("c.category = ?")
+            params.append(category)
+        if since:
+            where.append("r.timestamp >= ?")
+            params.append(since)
+        if until:
+            where.append("r.timestamp < ?")
+            params.append(_prefix_range(until)[1])  # inclusive of every timestamp starting with until
+
+        query = ("SELECT c.id, c.type, c.source, c.destination, r.timestamp "
+                 "FROM changes c JOIN runs r ON r.id = c.run_id "
+                 f"WHERE {' AND '.join(where)} ORDER BY r.timestamp DESC, c.id DESC")
+        return self._db.execute(query, params).fetchall()
+
+    def mark_reverted(self, row_ids: Iterable[int]) -> None:
+        """Flag changes as reverted so they are not selected again."""
+        with self._db:
+            self._db.executemany("UPDATE changes SET reverted = 1 WHERE id = ?", ((i,) for i in row_ids))
+
+    def mark_run_reverted(self, log_file: str, changes: Optional[Iterable[Change]] = None) -> int:
+        """
+        Flag the changes of a log's run as reverted.
+
+        Args:
+            log_file: Log the run was written to
+            changes: Only these (Type, source, destination) changes, or the whole run when None
+
+        Returns:
+            Number of rows flagged (0 when the log isn't catalogued)
+        """
+        row = self._db.execute("SELECT id FROM runs WHERE log_file = ?", (os.path.abspath(log_file),)).fetchone()
+        if row is None:
+            return 0
+        with self._db:
+            if changes is None:
+                return self._db.execute("UPDATE changes SET reverted = 1 WHERE run_id = ? AND reverted = 0",
+                                        (row[0],)).rowcount
+            return self._db.executemany(
+                "UPDATE changes SET reverted = 1 WHERE run_id = ? AND type = ? AND source = ? AND destination = ?",
+                ((row[0], change_type, src, dst) for change_type, src, dst in changes)).rowcount
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index change logs and look up where files went")
+    parser.add_argument('--catalog', type=str, default=None, help='Catalog file (default: logs/catalog.sqlite3)')
+    parser.add_argument('--import', dest='import_logs', nargs='+', default=[], metavar='LOG',
+                        help='Log files to add to the catalog')
+    parser.add_argument('--find', type=str, default=None,
+                        help='Glob matched against file names (or full source paths if it contains a separator)')
+    parser.add_argument('--directory', type=str, default=None, help='Only files that came from this directory')
+    parser.add_argument('--category', type=str, default=None, help='Only files moved into this category')
+    parser.add_argument('--since', type=str, default=None, help='Only runs at or after YYYYMMDD[_HHMMSS]')
+    parser.add_argument('--until', type=str, default=None, help='Only runs at or before YYYYMMDD[_HHMMSS]')
+    args = parser.parse_args()
+
+    with Catalog(args.catalog) as catalog:
+        for log_file in args.import_logs:
+            print(f"Imported {catalog.import_log(log_file)} changes from {log_file}")
+        if args.find or args.directory or args.category or args.since or args.until:
+            for _, change_type, src, dst, timestamp in catalog.select(
+                    args.find, args.directory, args.category, args.since, args.until):
+                print(f"{timestamp} {change_type}: {src} -> {dst}")
@@ -1,46 +1,506 @@
 """Module for logging and reverting file movements."""
 
+import gzip
 import json
+import lzma
 import os
+import zlib
+from array import array
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+import filesystem
+import stats
+
+LOG_FORMATS = ('json', 'jsonl')
+COMPRESSIONS = {'gzip': '.gz', 'lzma': '.xz'}
+CHANGE_TYPES = ('move', 'folder_creation', 'hardlink', 'duplicate_skipped')
+# journal-only records: a move about to be made, and a directory finished with its subdirectories
+CONTROL_TYPES = ('intent', 'checkpoint')
+
+# (Type, source, destination) of a single logged change
+Change = Tuple[str, str, str]
+
+def _split_path(path: str) -> Tuple[str, str]:
+    """Split a path into its directory prefix (including the separator) and name."""
+    cut = path.rfind(os.sep)
+    if os.altsep:
+        cut = max(cut, path.rfind(os.altsep))
+    return path[:cut + 1], path[cut + 1:]
+
+class ChangeTable:
+    """
+    Compact, append-only storage for change records.
+
+    Directory prefixes are interned into a table and each record only keeps
+    a type code, two directory ids and two file names in flat arrays, instead
+    of a dict holding two full absolute paths.
+
+    Indexing returns the change as a dict for convenience; bulk consumers
+    should use records(), which yields plain (Type, source, destination) tuples.
+    """
+
+    __slots__ = ('directories', '_directory_ids', '_types',
+                 '_src_dirs', '_src_names', '_dst_dirs', '_dst_names')
+
+    def __init__(self):
+        self.directories: List[str] = []
+        self._directory_ids: Dict[str, int] = {}
+        self._types = array('B')
+        self._src_dirs = array('L')
+        self._src_names: List[str] = []
+        self._dst_dirs = array('L')
+        self._dst_names: List[str] = []
+
+    def _intern(self, path: str) -> Tuple[int, str]:
+        """Return the directory id and name for a path, adding the directory to the table if new."""
+        directory, name = _split_path(path)
+        directory_id = self._directory_ids.get(directory)
+        if directory_id is None:
+            directory_id = len(self.directories)
+            self._directory_ids[directory] = directory_id
+            self.directories.append(directory)
+        return directory_id, name
+
+    def append(self, change_type: str, src: str, dst: str) -> None:
+        """Append a change record."""
+        src_dir, src_name = self._intern(src)
+        dst_dir, dst_name = self._intern(dst)
+        self._types.append(CHANGE_TYPES.index(change_type))
+        self._src_dirs.append(src_dir)
+        self._src_names.append(src_name)
+        self._dst_dirs.append(dst_dir)
+        self._dst_names.append(dst_name)
+
+    def _record(self, i: int) -> Change:
+        directories = self.directories
+        return (CHANGE_TYPES[self._types[i]],
+                directories[self._src_dirs[i]] + self._src_names[i],
+                directories[self._dst_dirs[i]] + self._dst_names[i])
+
+    def records(self, reverse: bool = False, start: int = 0) -> Iterator[Change]:
+        """Yield (Type, source, destination) tuples from index start on, newest first when reverse is set."""
+        indices = range(start, len(self._types))
+        for i in (reversed(indices) if reverse else indices):
+            yield self._record(i)
+
+    def __len__(self) -> int:
+        return len(self._types)
+
+    def __getitem__(self, i: int) -> Dict[str, str]:
+        change_type, src, dst = self._record(range(len(self._types))[i])
+        return {"Type": change_type, "source": src, "destination": dst}
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        for change_type, src, dst in self.records():
+            yield {"Type": change_type, "source": src, "destination": dst}
+
+def _open_log(log_file: str, mode: str) -> IO:
+    """
+    Open a log file, transparently handling gzip and lzma compression by extension.
+
+    Uncompressed logs are opened through the filesystem backend; compressed
+    ones always live on the real filesystem.
+    """
+    if log_file.endswith(tuple(COMPRESSIONS.values())) and not filesystem.backend.native:
+        raise ValueError(f"Compressed logs need the real filesystem: {log_file}")
+    if log_file.endswith(COMPRESSIONS['gzip']):
+        return gzip.open(log_file, mode)
+    if log_file.endswith(COMPRESSIONS['lzma']):
+        return lzma.open(log_file, mode)
+    return filesystem.backend.open(log_file, mode)
+
+def _read_intact_lines(f: IO[bytes], torn: Optional[List[bool]] = None) -> Iterator[bytes]:
+    """
+    Yield the lines of a compressed log, stopping where a crash cut the stream off.
+
+    Args:
+        f: Compressed log opened for binary reading
+        torn: Optional list that gets True appended when the stream was cut off
+    """
+    try:
+        yield from f
+    except (EOFError, zlib.error, lzma.LZMAError):
+        print(f"Warning: Compressed log {getattr(f, 'name', '')} is cut off, reading up to the last complete record")
+        if torn is not None:
+            torn.append(True)
+
+def _rewrite_intact(log_file: str) -> None:
+    """Replace a cut-off compressed journal with a copy of its complete lines."""
+    root, suffix = os.path.splitext(log_file)
+    tmp = f"{root}.tmp{suffix}"
+    with _open_log(log_file, 'rb') as src, _open_log(tmp, 'wb') as dst:
+        for line in _read_intact_lines(src):
+            if line.endswith(b'\n'):
+                dst.write(line)
+    os.replace(tmp, log_file)
+
+def _dump_line(record: Dict[str, str]) -> str:
+    return json.dumps(record, separators=(',', ':')) + '\n'
 
 class ChangeLogger:
-    def __init__(self, base_path: str):
-        self.changes: List[Dict[str, str]] = []
+    def __init__(self, base_path: str, log_format: str = 'json',
+                 flush_interval: int = 1000, fsync_batch: int = 0,
+                 compression: Optional[str] = None, catalog: Optional[str] = None,
+                 log_file: Optional[str] = None):
+        """
+        Args:
+            base_path: Root folder being cleaned
+            log_format: 'json' rewrites one JSON document on save, 'jsonl'
+                appends one compact record per change to a journal
+            flush_interval: (jsonl) number of records buffered before flushing
+            fsync_batch: (jsonl) fsync after this many records (0 disables fsync)
+            compression: Optional 'gzip' or 'lzma' compression of the log file
+            catalog: Optional SQLite catalog (see catalog.py) that every saved
+                change is also indexed in
+            log_file: Write the log here instead of logs/file_changes_<timestamp>
+        """
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"Unknown log format: {log_format}")
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.changes = ChangeTable()
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.logs_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
-        self.log_file = os.path.join(self.logs_dir, f"file_changes_{self.timestamp}.json")
+        if log_file is None:
+            self.logs_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+            suffix = COMPRESSIONS[compression] if compression else ''
+            log_file = os.path.join(self.logs_dir, f"file_changes_{self.timestamp}.{log_format}{suffix}")
+        else:
+            self.logs_dir = os.path.dirname(os.path.abspath(log_file))
+        self.log_file = log_file
         self.base_path = base_path
+        self.log_format = log_format
+        self.flush_interval = max(1, flush_interval)
+        self.fsync_batch = fsync_batch
+        self._journal: Optional[IO] = None
+        self._unflushed = 0
+        self._unsynced = 0
+        self.catalog = catalog
+        self._cataloged = 0
+        # filled in by resume(): moves intended but not confirmed, and finished directories
+        self.pending: Dict[str, str] = {}
+        self.finished: Dict[str, List[str]] = {}
+
+    @classmethod
+    def resume(cls, log_file: str, flush_interval: int = 1000, fsync_batch: int = 0,
+               catalog: Optional[str] = None) -> 'ChangeLogger':
+        """
+        Reopen the journal of an interrupted run to continue logging into it.
+
+        The journal is replayed once: confirmed changes are loaded into
+        memory without being written again, moves with an intent record but
+        no matching completion end up in pending, and directories with a
+        checkpoint end up in finished.
+
+        Args:
+            log_file: Path to a jsonl journal, optionally .gz/.xz compressed;
+                a compressed journal cut off by a crash is rewritten up to
+                its last complete record, as appending to it would leave it
+                unreadable
+            flush_interval: Number of records buffered before flushing
+            fsync_batch: fsync after this many records (0 disables fsync)
+            catalog: Optional SQLite catalog the changes are also indexed in
+
+        Returns:
+            Logger appending to the same journal
+        """
+        if not _is_journal(log_file):
+            raise ValueError(f"Only jsonl journals can be resumed: {log_file}")
+        header = None
+        changes = ChangeTable()
+        pending: Dict[str, str] = {}
+        finished: Dict[str, List[str]] = {}
+        compressed = log_file.endswith(tuple(COMPRESSIONS.values()))
+        torn: List[bool] = []
+        with _open_log(log_file, 'rb') as f:
+            for record in _parse_records(_read_intact_lines(f, torn) if compressed else f):
+                change_type = record.get("Type")
+                if change_type is None:
+                    header = header or record
+                elif change_type == "intent":
+                    pending[record["source"]] = record["destination"]
+                elif change_type == "checkpoint":
+                    finished[record["destination"]] = record["subdirs"]
+                else:
+                    if change_type == "move":
+                        pending.pop(record["source"], None)
+                    changes.append(change_type, record["source"], record["destination"])
+        if header is None:
+            raise ValueError(f"Journal has no header: {log_file}")
+        if torn:
+            _rewrite_intact(log_file)
+        elif not compressed:
+            # terminate a torn last record so the next record starts on its own line
+            with filesystem.backend.open(log_file, 'rb+') as f:
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        f.write(b'\n')
+
+        logger = cls(header["base_path"], log_format='jsonl', flush_interval=flush_interval,
+                     fsync_batch=fsync_batch, catalog=catalog, log_file=log_file)
+        logger.timestamp = header["timestamp"]
+        logger.changes = changes
+        logger.pending = pending
+        logger.finished = finished
+        return logger
 
     def log_move(self, src: str, dst: str) -> None:
         """Log a file movement. (also covers for renames)"""
-        self.changes.append({
-            "Type": "move",
-            "source": src,
-            "destination": dst
-        }) 
+        self._record("move", src, dst)
 
     def log_folder_creation(self, folder_path: str) -> None:
         """Log a folder creation."""
-        self.changes.append({
-            "Type": "folder_creation",
-            "source": "",
-            "destination": folder_path
-        })
+        self._record("folder_creation", "", folder_path)
+
+    def log_hardlink(self, original: str, duplicate: str) -> None:
+        """Log a duplicate file being replaced by a hard link to the original."""
+        self._record("hardlink", original, duplicate)
+
+    def log_duplicate_skipped(self, original: str, duplicate: str) -> None:
+        """Log a duplicate file left in place instead of being moved."""
+        self._record("duplicate_skipped", original, duplicate)
+
+    def log_intents(self, moves: List[Tuple[str, str]]) -> None:
+        """
+        Write ahead the moves about to be made (jsonl mode).
+
+        The intents are flushed, and fsynced when fsync is enabled, once for
+        the whole batch before any of the renames starts, so a run killed
+        half way can tell which moves may have happened (see resume()).
+        """
+        if self.log_format != 'jsonl' or not moves:
+            return
+        journal = self._open_journal()
+        for src, dst in moves:
+            line = _dump_line({"Type": "intent", "source": src, "destination": dst}).encode()
+            journal.write(line)
+            stats.count('log_bytes', len(line))
+        self._flush_journal(sync=True)
+
+    def log_checkpoint(self, directory: str, subdirs: List[str]) -> None:
+        """Record that every file of a directory has been handled, with its subdirectories (jsonl mode)."""
+        if self.log_format != 'jsonl':
+            return
+        line = _dump_line({"Type": "checkpoint", "source": "", "destination": directory,
+                           "subdirs": subdirs}).encode()
+        self._open_journal().write(line)
+        stats.count('log_bytes', len(line))
+        self._unflushed += 1
+        if self._unflushed >= self.flush_interval:
+            self._flush_journal()
+
+    def extend(self, changes: Iterable[Change]) -> None:
+        """Log changes made elsewhere, e.g. read back from another logger's log file."""
+        for change_type, src, dst in changes:
+            self._record(change_type, src, dst)
+
+    def _record(self, change_type: str, src: str, dst: str) -> None:
+        """Keep a change in memory and append it to the journal in jsonl mode."""
+        self.changes.append(change_type, src, dst)
+        if self.log_format == 'jsonl':
+            line = _dump_line({"Type": change_type, "source": src, "destination": dst}).encode()
+            self._open_journal().write(line)
+            stats.count('log_bytes', len(line))
+            self._unflushed += 1
+            self._unsynced += 1
+            if self._unflushed >= self.flush_interval:
+                self._flush_journal()
+
+    def _open_journal(self) -> IO:
+        """Open the journal for appending, writing the header line on creation."""
+        if self._journal is None:
+            filesystem.backend.makedirs(self.logs_dir, exist_ok=True)
+            is_new = not filesystem.backend.exists(self.log_file)
+            self._journal = _open_log(self.log_file, 'ab')
+            if is_new:
+                header = _dump_line({
+                    "base_path": self.base_path,
+                    "timestamp": self.timestamp,
+                    "format": "jsonl"
+                }).encode()
+                self._journal.write(header)
+                stats.count('log_bytes', len(header))
+        return self._journal
+
+    def _flush_journal(self, sync: bool = False) -> None:
+        """Flush buffered journal records, fsyncing once a batch has accumulated (group commit)."""
+        self._journal.flush()
+        self._unflushed = 0
+        if self.fsync_batch > 0 and (sync or self._unsynced >= self.fsync_batch):
+            filesystem.backend.fsync(self._journal)
+            self._unsynced = 0
+
+    def close(self) -> None:
+        """Flush and close the journal (jsonl mode)."""
+        if self._journal is not None:
+            self._flush_journal(sync=True)
+            self._journal.close()
+            self._journal = None
 
     def save_log(self) -> str:
         """
-        Save changes to JSON file in the logs directory and return filename.
-        
-        Creates the logs directory if it doesn't exist.
-        """
-        os.makedirs(self.logs_dir, exist_ok=True)
-        
-        with open(self.log_file, 'w') as f:
-            json.dump({
-                "base_path": self.base_path,
-                "timestamp": self.timestamp,
-                "changes": self.changes
-            }, f, indent=2)
+        Save changes to the log file in the logs directory and return filename.
+
+        Creates the logs directory if it doesn't exist. In jsonl mode the
+        records are already in the journal, so this only flushes it.
+        """
+        with stats.timer('save_log'):
+            if self.log_format == 'jsonl':
+                self._open_journal()
+                self._flush_journal(sync=True)
+            else:
+                self._write_document()
+            self._update_catalog()
         return self.log_file
+
+    def _write_document(self) -> None:
+        """Rewrite the whole log as a single indented JSON document (json mode)."""
+        filesystem.backend.makedirs(self.logs_dir, exist_ok=True)
+
+        # written record by record so the change table is never expanded into one big list of dicts
+        written = 0
+        with _open_log(self.log_file, 'wt') as f:
+            written += f.write('{\n')
+            written += f.write(f'  "base_path": {json.dumps(self.base_path)},\n')
+            written += f.write(f'  "timestamp": {json.dumps(self.timestamp)},\n')
+            written += f.write('  "changes": [')
+            for i, change in enumerate(self.changes):
+                written += f.write(',\n    ' if i else '\n    ')
+                written += f.write(json.dumps(change, indent=2).replace('\n', '\n    '))
+            written += f.write('\n  ]\n}' if len(self.changes) else ']\n}')
+        stats.count('log_bytes', written)
+
+    def _update_catalog(self) -> None:
+        """Index the changes saved since the last call in the catalog, if one is configured."""
+        if self.catalog is None or self._cataloged == len(self.changes):
+            return
+        from catalog import Catalog  # catalog reads logs through this module
+        with Catalog(self.catalog) as catalog:
+            catalog.add_changes(self.log_file, self.base_path, self.timestamp,
+                                self.changes.records(start=self._cataloged))
+        self._cataloged = len(self.changes)
+
+
+def _is_journal(log_file: str) -> bool:
+    """Check whether a log file is a jsonl journal rather than a single JSON document."""
+    if log_file.endswith(('.jsonl', '.jsonl.gz', '.jsonl.xz')):
+        return True
+    with _open_log(log_file, 'rt') as f:
+        first_line = f.readline()
+    try:
+        return isinstance(json.loads(first_line), dict)
+    except ValueError:  # first line of an indented JSON document is just "{"
+        return False
+
+def _read_lines_reversed(log_file: str, block_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Yield the lines of a file from last to first, reading it backwards in blocks."""
+    with filesystem.backend.open(log_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b''
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + remainder).split(b'\n')
+            remainder = lines.pop(0)  # may be the tail of a line that started in an earlier block
+            for line in reversed(lines):
+                yield line
+        yield remainder
+
+def _parse_records(lines: Iterable[bytes]) -> Iterator[Dict]:
+    """Parse journal lines into records, skipping torn ones."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            print(f"Warning: Skipping unreadable log record: {line[:80]!r}")
+
+def _parse_journal(lines: Iterable[bytes]) -> Iterator[Change]:
+    """Parse journal lines into change tuples, skipping the header, control records and torn records."""
+    for change in _parse_records(lines):
+        # the header line has no Type
+        if "Type" in change and change["Type"] not in CONTROL_TYPES:
+            yield change["Type"], change["source"], change["destination"]
+
+def _parse_document(f: IO[str], block_size: int = 64 * 1024) -> Iterator[Change]:
+    """Parse the changes of a JSON log document one record at a time, without loading the whole list."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    # the changes array follows base_path and timestamp; quotes inside those are escaped, so can't match
+    while True:
+        key = buffer.find('"changes"')
+        bracket = buffer.find('[', key) if key != -1 else -1
+        if bracket != -1:
+            break
+        block = f.read(block_size)
+        if not block:
+            raise ValueError(f"No changes array in log document {getattr(f, 'name', '')}")
+        buffer += block
+    pos = bracket + 1
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer):
+            if buffer[pos] == ']':
+                return
+            try:
+                change, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                end = -1  # record cut off at the end of the buffer
+            if end != -1:
+                yield change["Type"], change["source"], change["destination"]
+                pos = end
+                continue
+        block = f.read(block_size)
+        if not block:
+            raise ValueError(f"Truncated log document {getattr(f, 'name', '')}")
+        buffer = buffer[pos:] + block
+        pos = 0
+
+def iter_changes(log_file: str, reverse: bool = False) -> Iterator[Change]:
+    """
+    Iterate over the change records of a log file in any supported format.
+
+    Uncompressed journals are streamed line by line (backwards when reverse
+    is set), so the whole log is never loaded at once. Compressed journals
+    and JSON documents cannot be read backwards cheaply; their records are
+    parsed one at a time into a compact ChangeTable instead. A torn last
+    line left by an interrupted journal is skipped, and so is the rest of
+    a compressed journal cut off by a crash.
+
+    Args:
+        log_file: Path to a .json log or .jsonl journal, optionally .gz/.xz compressed
+        reverse: Yield the newest change first
+
+    Returns:
+        Iterator of (Type, source, destination) tuples
+    """
+    if not _is_journal(log_file):
+        with _open_log(log_file, 'rt') as f:
+            if not reverse:
+                yield from _parse_document(f)
+                return
+            table = ChangeTable()
+            for change in _parse_document(f):
+                table.append(*change)
+        yield from table.records(reverse=True)
+        return
+
+    if log_file.endswith(tuple(COMPRESSIONS.values())):
+        with _open_log(log_file, 'rb') as f:
+            if not reverse:
+                yield from _parse_journal(_read_intact_lines(f))
+                return
+            table = ChangeTable()
+            for change in _parse_journal(_read_intact_lines(f)):
+                table.append(*change)
+        yield from table.records(reverse=True)
+    elif not reverse:
+        with _open_log(log_file, 'rb') as f:
+            yield from _parse_journal(f)
+    else:
+        yield from _parse_journal(_read_lines_reversed(log_file))
@@ -1,13 +1,19 @@
-"""Module providing global access to the change logger."""
+"""
+Module providing global access to the change logger.
+
+Only used as the fallback for callers that don't pass a ChangeLogger to
+main and friends; the command line tools, sharded runs and the pipeline
+pass their logger explicitly so several can exist in one program.
+"""
 
 from change_logger import ChangeLogger
 
 _logger_instance = None
 
-def initialize_logger(base_path: str) -> None:
-    """Initialize the global logger."""
+def initialize_logger(base_path: str, **options) -> None:
+    """Initialize the global logger. Extra options are passed to ChangeLogger."""
     global _logger_instance
-    _logger_instance = ChangeLogger(base_path)
+    _logger_instance = ChangeLogger(base_path, **options)
 
 def set_base_path(base_path: str) -> None:
     """Set the base path for the logger."""
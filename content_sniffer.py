@@ -0,0 +1,156 @@
+"""Module classifying files without a known extension by their magic bytes."""
+
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+# bytes needed to see every signature below (the tar magic sits at offset 257)
+HEADER_SIZE = 262
+
+# (offset, magic bytes, category), checked in order
+MAGIC_SIGNATURES: List[Tuple[int, bytes, str]] = [
+    (0, b'%PDF-', 'Documents'),
+    (0, b'{\\rtf', 'Documents'),
+    (0, b'\x89PNG\r\n\x1a\n', 'Images'),
+    (0, b'\xff\xd8\xff', 'Images'),
+    (0, b'GIF87a', 'Images'),
+    (0, b'GIF89a', 'Images'),
+    (0, b'II*\x00', 'Images'),
+    (0, b'MM\x00*', 'Images'),
+    (8, b'WEBP', 'Images'),
+    (0, b'ID3', 'Audio'),
+    (0, b'fLaC', 'Audio'),
+    (0, b'OggS', 'Audio'),
+    (8, b'WAVE', 'Audio'),
+    (4, b'ftypM4A', 'Audio'),
+    (4, b'ftyp', 'Video'),
+    (8, b'AVI ', 'Video'),
+    (0, b'\x1a\x45\xdf\xa3', 'Video'),
+    (0, b'PK\x03\x04', 'Archives'),
+    (0, b'Rar!\x1a\x07', 'Archives'),
+    (0, b"7z\xbc\xaf'\x1c", 'Archives'),
+    (0, b'\x1f\x8b', 'Archives'),
+    (0, b'\xfd7zXZ\x00', 'Archives'),
+    (257, b'ustar', 'Archives'),
+    (0, b'MZ', 'Installers'),
+    (0, b'xar!', 'Installers'),
+]
+
+def sniff_category(header: bytes) -> Optional[str]:
+    """
+    Match a file header against the known signatures.
+
+    Args:
+        header: The first bytes of a file (up to HEADER_SIZE)
+
+    Returns:
+        Category name, or None if no signature matches
+    """
+    for offset, magic, category in MAGIC_SIGNATURES:
+        if header.startswith(magic, offset):
+            return category
+    return None
+
+def _read_header(path: str) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read(HEADER_SIZE)
+    except OSError:
+        return None
+
+class ContentSniffer:
+    """
+    Reclassifies files that ended up in 'Others' by reading a small fixed-size
+    header from each of them.
+
+    Headers are read in parallel on a thread pool, and results are kept in an
+    LRU cache keyed by (inode, size, mtime) so files that were already
+    inspected are not read again while the file is unchanged.
+    """
+
+    def __init__(self, cache_size: int = 100000, workers: int = 8):
+        """
+        Args:
+            cache_size: Maximum number of files remembered in the cache
+            workers: Number of threads reading headers
+        """
+        self.cache_size = cache_size
+        self.workers = workers
+        self._cache: 'OrderedDict[Tuple[int, int, int], Optional[str]]' = OrderedDict()
+        self.headers_read = 0
+
+    def _cached(self, key: Tuple[int, int, int]) -> Tuple[bool, Optional[str]]:
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return True, self._cache[key]
+        return False, None
+
+    def _remember(self, key: Tuple[int, int, int], category: Optional[str]) -> None:
+        self._cache[key] = category
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def classify(self, paths: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Classify a batch of files by content.
+
+        Args:
+            paths: Paths of the files to inspect
+
+        Returns:
+            Dictionary of path to detected category (None if unrecognized)
+        """
+        results: Dict[str, Optional[str]] = {}
+        misses: List[Tuple[str, Tuple[int, int, int]]] = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            key = (st.st_ino, st.st_size, st.st_mtime_ns)
+            hit, category = self._cached(key)
+            if hit:
+                results[path] = category
+            else:
+                misses.append((path, key))
+
+        if misses:
+            miss_paths = [path for path, _ in misses]
+            if self.workers > 1 and len(misses) > 1:
+                with ThreadPoolExecutor(max_workers=min(self.workers, len(misses))) as pool:
+                    headers = list(pool.map(_read_header, miss_paths))
+            else:
+                headers = [_read_header(path) for path in miss_paths]
+            for (path, key), header in zip(misses, headers):
+                if header is None:
+                    continue
+                self.headers_read += 1
+                category = sniff_category(header)
+                self._remember(key, category)
+                results[path] = category
+        return results
+
+    def reclassify(self, base_path: str, file_map: Dict[str, List[str]],
+                   unknown_category: str = 'Others') -> None:
+        """
+        Move files from the 'Others' bucket of a file map into the category
+        their content indicates. Files with known extensions are left alone.
+
+        Args:
+            base_path: Directory the files live in
+            file_map: Category name to list of filenames, updated in place
+            unknown_category: Bucket holding the files no rule matched
+        """
+        others = file_map.get(unknown_category)
+        if not others:
+            return
+        detected = self.classify([os.path.join(base_path, file) for file in others])
+        remaining = []
+        for file in others:
+            category = detected.get(os.path.join(base_path, file))
+            if category is not None and category in file_map:
+                file_map[category].append(file)
+            else:
+                remaining.append(file)
+        file_map[unknown_category] = remaining
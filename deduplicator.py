@@ -0,0 +1,189 @@
+"""Module detecting duplicate files before they are moved into category folders."""
+
+import hashlib
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from change_logger import ChangeLogger
+from change_logger_singleton import get_logger
+
+DEDUPE_ACTIONS = ('report', 'hardlink', 'skip')
+BLOCK_SIZE = 64 * 1024
+
+def _partial_hash(path: str, size: int) -> Optional[bytes]:
+    """Hash the first and last block of a file."""
+    try:
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read(BLOCK_SIZE))
+            if size > BLOCK_SIZE:
+                f.seek(max(BLOCK_SIZE, size - BLOCK_SIZE))
+                digest.update(f.read(BLOCK_SIZE))
+    except OSError:
+        return None
+    return digest.digest()
+
+def _full_hash(path: str) -> Optional[bytes]:
+    """Hash a whole file through a read-only memory map."""
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).digest()
+    except (OSError, ValueError):
+        return None
+
+def _group_by(keys: List[Optional[bytes]], paths: List[str]) -> List[List[str]]:
+    """Group paths sharing a key, dropping unique and unreadable ones."""
+    groups: Dict[bytes, List[str]] = {}
+    for key, path in zip(keys, paths):
+        if key is not None:
+            groups.setdefault(key, []).append(path)
+    return [group for group in groups.values() if len(group) > 1]
+
+def find_duplicates(paths: List[str], workers: int = 1) -> List[List[str]]:
+    """
+    Find groups of files with identical content.
+
+    Candidates are narrowed down in stages so most files are never read in
+    full: files are bucketed by size, same-size files are compared by a hash
+    of their first and last block, and only files that still collide get a
+    full-content hash (on a process pool when workers > 1). Empty files are
+    never reported as duplicates.
+
+    Args:
+        paths: Paths of the candidate files
+        workers: Number of processes computing full hashes
+
+    Returns:
+        List of groups of identical files, each in input order
+    """
+    by_size: Dict[int, List[str]] = {}
+    for path in paths:
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            continue
+        if size > 0:
+            by_size.setdefault(size, []).append(path)
+
+    colliding: List[str] = []
+    for size, group in by_size.items():
+        if len(group) < 2:
+            continue
+        for partial_group in _group_by([_partial_hash(path, size) for path in group], group):
+            colliding.extend(partial_group)
+
+    if not colliding:
+        return []
+    if workers > 1 and len(colliding) > 2:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            full_hashes = list(pool.map(_full_hash, colliding, chunksize=16))
+    else:
+        full_hashes = [_full_hash(path) for path in colliding]
+
+    order = {path: i for i, path in enumerate(paths)}
+    return [sorted(group, key=order.get) for group in _group_by(full_hashes, colliding)]
+
+def _make_hardlink(original: str, duplicate: str) -> None:
+    """Replace duplicate with a hard link to original, atomically."""
+    tmp = duplicate + '.dedupe-tmp'
+    os.link(original, tmp)
+    try:
+        os.replace(tmp, duplicate)
+    except OSError:
+        os.remove(tmp)
+        raise
+
+def _placed_files(directory: str, sizes: set, subfolders: bool) -> List[str]:
+    """List files in a category folder (and its subfolders) whose size is in sizes."""
+    placed = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    if entry.stat().st_size in sizes:
+                        placed.append(entry.path)
+                elif subfolders and entry.is_dir():
+                    placed.extend(_placed_files(entry.path, sizes, False))
+    except OSError:
+        pass
+    return placed
+
+def deduplicate(base_path: str, file_map: Dict[str, List[str]], directories: Dict[str, str],
+                action: str = 'report', workers: int = 1, logger: Optional[ChangeLogger] = None,
+                subfolders: bool = False) -> int:
+    """
+    Detect files about to be moved that duplicate each other or a file already
+    in their category folder, and act on them before the move.
+
+    The copy already in the category folder is kept as the original; among
+    files that are all about to be moved, the shortest name wins (so
+    report.pdf is kept over report(1).pdf).
+
+    Args:
+        base_path: Directory the files currently live in
+        file_map: Category name to list of filenames, updated in place for 'skip'
+        directories: Category name to category directory path
+        action: 'report' only prints duplicates, 'hardlink' replaces each
+            duplicate with a hard link to the original before it is moved,
+            'skip' leaves duplicates where they are
+        workers: Number of processes computing full hashes
+        logger: Change logger of the run (defaults to the global one)
+        subfolders: Also look for originals one level down in each category
+            folder, where a SubfolderLayout places files
+
+    Returns:
+        Number of duplicates found
+    """
+    if action not in DEDUPE_ACTIONS:
+        raise ValueError(f"Unknown dedupe action: {action}")
+    logger = logger or get_logger()
+
+    pending: Dict[str, Tuple[str, str]] = {}  # path -> (category, filename)
+    for category, files in file_map.items():
+        for file in files:
+            pending[os.path.join(base_path, file)] = (category, file)
+    if len(pending) == 0:
+        return 0
+
+    # files already in a category folder only matter if they share a size with a pending file
+    sizes = set()
+    for path in pending:
+        try:
+            sizes.add(os.stat(path).st_size)
+        except OSError:
+            continue
+    placed = []
+    for category in {category for category, _ in pending.values()}:
+        placed.extend(_placed_files(directories[category], sizes, subfolders))
+
+    found = 0
+    skipped: Dict[str, set] = {}
+    for group in find_duplicates(placed + list(pending), workers):
+        originals = [path for path in group if path not in pending]
+        if originals:
+            original = originals[0]
+        else:
+            original = min(group, key=lambda path: (len(pending[path][1]), pending[path][1]))
+
+        for duplicate in group:
+            if duplicate == original or duplicate not in pending:
+                continue
+            found += 1
+            category, file = pending[duplicate]
+            if action == 'report':
+                print(f"Duplicate: {duplicate} == {original}")
+            elif action == 'skip':
+                skipped.setdefault(category, set()).add(file)
+                logger.log_duplicate_skipped(original, duplicate)
+                print(f"Skipped duplicate: {duplicate} == {original}")
+            else:
+                try:
+                    _make_hardlink(original, duplicate)
+                    logger.log_hardlink(original, duplicate)
+                except OSError as e:
+                    print(f"Error hardlinking {duplicate}: {e}")
+
+    for category, files in skipped.items():
+        file_map[category] = [file for file in file_map[category] if file not in files]
+    return found
@@ -0,0 +1,238 @@
+"""Module compiling gitignore-style exclusion patterns into a single matcher."""
+
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import stats
+
+_SEP = re.escape(os.sep)
+_NOT_SEP = f'[^{_SEP}]'
+# names differing only in case are the same file where the filesystem folds case
+_FLAGS = re.DOTALL | (re.IGNORECASE if os.path.normcase('A') == 'a' else 0)
+
+def _translate_segment(segment: str) -> str:
+    """Translate one path segment of a glob (*, ?, [...] and \\ escapes) into a regex."""
+    regex = []
+    i = 0
+    while i < len(segment):
+        char = segment[i]
+        i += 1
+        if char == '*':
+            while i < len(segment) and segment[i] == '*':
+                i += 1
+            regex.append(f'{_NOT_SEP}*')
+        elif char == '?':
+            regex.append(_NOT_SEP)
+        elif char == '[':
+            end = i + 1 if i < len(segment) and segment[i] in '!^' else i
+            end = segment.find(']', end + 1 if end < len(segment) and segment[end] == ']' else end)
+            if end < 0:  # no closing bracket, so it is a literal
+                regex.append(re.escape(char))
+                continue
+            content = segment[i:end].replace('\\', '\\\\')
+            if content[:1] == '!':
+                content = '^' + content[1:]
+            regex.append(f'[{content}]')
+            i = end + 1
+        elif char == '\\' and i < len(segment):
+            regex.append(re.escape(segment[i]))
+            i += 1
+        else:
+            regex.append(re.escape(char))
+    return ''.join(regex)
+
+def _parse(line: str) -> Optional[Tuple[str, bool, bool, bool]]:
+    """
+    Parse one gitignore line.
+
+    Returns:
+        (regex, negated, directories only, matched against the name only),
+        or None for blank lines and comments
+    """
+    line = line.rstrip('\r\n')
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):  # "\ " keeps one trailing space
+        stripped += ' '
+    line = stripped
+    if not line or line.startswith('#'):
+        return None
+    negated = line.startswith('!')
+    if negated:
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+
+    # a slash anywhere but at the end anchors the pattern to the root
+    if '/' not in line:
+        return _translate_segment(line), negated, dir_only, True
+    segments = line[1:].split('/') if line.startswith('/') else line.split('/')
+    regex = ''
+    for k, segment in enumerate(segments):
+        if segment == '**':
+            separator = _SEP if k else ''
+            # trailing /** is everything inside; leading **/ and inner /**/ are zero or more folders
+            regex += separator + ('.*' if k == len(segments) - 1 else f'(?:.*{_SEP})?')
+        else:
+            if k and segments[k - 1] != '**':
+                regex += _SEP
+            regex += _translate_segment(segment)
+    return regex, negated, dir_only, False
+
+class ExclusionRules:
+    """
+    Gitignore-style patterns deciding which files and folders a run never touches.
+
+    Patterns follow .gitignore syntax: '*', '?' and '[...]' never match a
+    path separator, '**' matches across folders, a trailing '/' only
+    matches folders, a pattern containing another '/' is anchored to the
+    root of the run, and a leading '!' re-includes what an earlier pattern
+    excluded (the last matching pattern wins). As with git, nothing inside
+    an excluded folder can be re-included, because the folder is never
+    listed.
+
+    All patterns are compiled into two combined regexes per entry type: one
+    over the entry name for patterns without a slash and one over the full
+    path for anchored patterns, so a lookup costs at most two regex matches
+    no matter how many patterns there are. Excluded files are dropped before
+    classification and excluded folders are pruned before they are listed;
+    both are counted.
+    """
+
+    def __init__(self, patterns: Iterable[str], roots: Iterable[str] = ()):
+        """
+        Args:
+            patterns: Lines in gitignore syntax (blank lines and comments are skipped)
+            roots: Folders anchored patterns are relative to; without roots
+                they match below any folder
+        """
+        self.patterns: List[str] = []
+        parsed = []
+        for line in patterns:
+            rule = _parse(line)
+            if rule is not None:
+                self.patterns.append(line.strip())
+                parsed.append(rule)
+        self._negated = [negated for _, negated, _, _ in parsed]
+        self._has_negations = any(self._negated)
+
+        anchors = set()
+        for root in roots:
+            anchors.update({root, os.path.abspath(root)})
+        # '/' becomes an empty anchor, as the separator is added after it
+        anchor = '|'.join(sorted(re.escape(root.rstrip(os.sep)) for root in anchors))
+        prefix = f'(?:{anchor}){_SEP}' if anchors else f'(?:.*{_SEP})?'
+
+        self._groups: Dict[str, int] = {}
+        indexed = [(i, regex if name_only else prefix + regex, dir_only, name_only)
+                   for i, (regex, _, dir_only, name_only) in enumerate(parsed)]
+        # (name regex, path regex) for files and for folders
+        self._file_regexes = (self._combine(rule for rule in indexed if rule[3] and not rule[2]),
+                              self._combine(rule for rule in indexed if not rule[3] and not rule[2]))
+        self._dir_regexes = (self._combine(rule for rule in indexed if rule[3]),
+                             self._combine(rule for rule in indexed if not rule[3]))
+        self.excluded_files = 0
+        self.pruned_dirs = 0
+
+    def _combine(self, rules: Iterable[Tuple[int, str, bool, bool]]) -> Optional[re.Pattern]:
+        """Combine patterns into one regex whose first matching alternative is the last matching pattern."""
+        alternatives = []
+        for i, regex, _, _ in sorted(rules, reverse=True):
+            # the empty marker group closes last, so match.lastgroup names the pattern that matched
+            self._groups[f'p{i}'] = i
+            alternatives.append(f'(?:{regex})(?P<p{i}>)')
+        return re.compile('|'.join(alternatives), _FLAGS) if alternatives else None
+
+    def excluded(self, path: str, is_dir: bool = False) -> bool:
+        """
+        Check whether a file or folder is excluded.
+
+        Args:
+            path: Path of the entry, starting with one of the roots
+            is_dir: Whether the entry is a folder
+
+        Returns:
+            True if the last pattern matching the entry excludes it
+        """
+        name_regex, path_regex = self._dir_regexes if is_dir else self._file_regexes
+        best = -1
+        if name_regex is not None:
+            match = name_regex.fullmatch(path, path.rfind(os.sep) + 1)
+            if match:
+                best = self._groups[match.lastgroup]
+        if path_regex is not None:
+            match = path_regex.fullmatch(path)
+            if match:
+                best = max(best, self._groups[match.lastgroup])
+        return best >= 0 and not self._negated[best]
+
+    def filter_files(self, directory: str, names: List[str]) -> List[str]:
+        """
+        Drop the excluded names of files in a directory.
+
+        Args:
+            directory: Directory holding the files
+            names: File names
+
+        Returns:
+            The names that are not excluded, in their original order
+        """
+        name_regex, path_regex = self._file_regexes
+        if path_regex is None and not self._has_negations:
+            if name_regex is None:
+                return names
+            kept = [name for name in names if not name_regex.fullmatch(name)]
+        else:
+            prefix = os.path.join(directory, '')
+            kept = [name for name in names if not self.excluded(prefix + name)]
+        if len(kept) != len(names):
+            self.excluded_files += len(names) - len(kept)
+            stats.count('excluded', len(names) - len(kept))
+        return kept
+
+    def prune(self, directories: List[str]) -> List[str]:
+        """
+        Drop excluded folders before they are listed.
+
+        Args:
+            directories: Paths of folders about to be descended into
+
+        Returns:
+            The folders that are not excluded, in their original order
+        """
+        kept = [directory for directory in directories if not self.excluded(directory, True)]
+        if len(kept) != len(directories):
+            self.pruned_dirs += len(directories) - len(kept)
+            stats.count('pruned', len(directories) - len(kept))
+        return kept
+
+    def summary(self) -> str:
+        """One line reporting how many entries were never touched."""
+        return f"Excluded {self.excluded_files} files and pruned {self.pruned_dirs} folders"
+
+def load_exclusions(pattern_files: Iterable[str] = (), excludes: Iterable[str] = (),
+                    includes: Iterable[str] = (), roots: Iterable[str] = ()) -> ExclusionRules:
+    """
+    Build exclusion rules from gitignore-style files and command line patterns.
+
+    Patterns from files come first, then excludes, then includes (as
+    negated patterns), so an include always wins over an exclude.
+
+    Args:
+        pattern_files: Files in .gitignore syntax
+        excludes: Patterns excluding what they match
+        includes: Patterns re-including what an exclude matched
+        roots: Folders anchored patterns are relative to
+
+    Returns:
+        The compiled rules
+    """
+    patterns: List[str] = []
+    for pattern_file in pattern_files:
+        with open(pattern_file, 'r', encoding='utf-8') as f:
+            patterns.extend(f.read().splitlines())
+    patterns.extend(excludes)
+    patterns.extend('!' + pattern for pattern in includes)
+    return ExclusionRules(patterns, roots)
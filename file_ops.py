@@ -0,0 +1,305 @@
+"""Module providing a file move that never replaces an existing file and also works across filesystems."""
+
+import ctypes
+import errno
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import stats
+
+# bytes handed to the kernel per copy call
+COPY_CHUNK = 64 * 1024 * 1024
+
+# errors meaning "this copy mechanism isn't available here", not "the copy failed"
+_UNSUPPORTED = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF,
+                errno.ENOTSOCK}
+
+# renameat2 flag: fail with EEXIST instead of replacing the destination
+RENAME_NOREPLACE = 1
+AT_FDCWD = -100
+# errors of renameat2 meaning the flag or the call isn't supported by this kernel or filesystem
+_NOREPLACE_UNSUPPORTED = {errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP}
+# whether os.rename accepts src_dir_fd/dst_dir_fd on this platform
+SUPPORTS_DIR_FD = os.rename in os.supports_dir_fd
+# directory descriptors a DirectoryFds keeps open at most, well below the usual 1024 per-process limit
+DIR_FD_LIMIT = 64
+
+def _load_renameat2():
+    """Look up renameat2 in the C library (glibc 2.28+), or return None."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return None
+    # no argtypes: ints and bytes convert natively, and skipping the conversion layer is faster
+    renameat2.restype = ctypes.c_int
+    return renameat2
+
+_renameat2 = _load_renameat2()
+
+def rename_noreplace(src: str, dst: str, src_dir_fd: Optional[int] = None,
+                     dst_dir_fd: Optional[int] = None) -> None:
+    """
+    Rename src to dst, failing with FileExistsError instead of replacing dst.
+
+    On Linux this is a single atomic renameat2(RENAME_NOREPLACE) call, so a
+    file created at dst by someone else can never be overwritten. Where that
+    isn't available, dst is checked right before a plain rename.
+
+    Args:
+        src: Path of the file, relative to src_dir_fd when given
+        dst: Destination path, relative to dst_dir_fd when given
+        src_dir_fd: Optional open directory src is relative to
+        dst_dir_fd: Optional open directory dst is relative to
+    """
+    if _renameat2 is not None:
+        result = _renameat2(AT_FDCWD if src_dir_fd is None else src_dir_fd, os.fsencode(src),
+                            AT_FDCWD if dst_dir_fd is None else dst_dir_fd, os.fsencode(dst),
+                            RENAME_NOREPLACE)
+        if result == 0:
+            return
+        error = ctypes.get_errno()
+        if error not in _NOREPLACE_UNSUPPORTED:
+            raise OSError(error, os.strerror(error), src, None, dst)
+
+    try:
+        os.stat(dst, dir_fd=dst_dir_fd, follow_symlinks=False)
+    except FileNotFoundError:
+        os.rename(src, dst, src_dir_fd=src_dir_fd, dst_dir_fd=dst_dir_fd)
+        return
+    raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), src, None, dst)
+
+class DirectoryFds:
+    """
+    Directory file descriptors kept open for a batch of moves.
+
+    Renaming relative to an open source and destination directory saves the
+    kernel from resolving both full paths from the root for every file.
+    At most limit descriptors stay open; the least recently used one is
+    closed to make room. For use from a single thread; see
+    SharedDirectoryFds for thread pools.
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        # a rename needs two descriptors at once, so never fewer than that
+        self.limit = max(2, DIR_FD_LIMIT if limit is None else limit)
+        self._fds: 'OrderedDict[str, int]' = OrderedDict()
+        # the pair handed out last; a batch mostly moves between the same two directories
+        self._last: Tuple[str, str, Optional[Tuple[int, int]]] = ('', '', None)
+
+    def _open(self, directory: str) -> int:
+        """Open a directory that has no descriptor yet, evicting old ones to stay within the limit."""
+        if len(self._fds) >= self.limit:
+            os.close(self._fds.popitem(last=False)[1])
+            self._last = ('', '', None)
+        stats.count('open_dir')
+        fd = os.open(directory, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+        self._fds[directory] = fd
+        return fd
+
+    def _get(self, directory: str) -> int:
+        fd = self._fds.get(directory)
+        if fd is None:
+            return self._open(directory)
+        self._fds.move_to_end(directory)
+        return fd
+
+    def acquire(self, src_dir: str, dst_dir: str) -> Optional[Tuple[int, int]]:
+        """
+        Return descriptors of a source and destination directory, opening them as needed.
+
+        Returns None instead when the process is out of file descriptors, in
+        which case the caller should fall back to plain paths.
+        """
+        last_src, last_dst, fds = self._last
+        if src_dir == last_src and dst_dir == last_dst:
+            return fds
+        try:
+            fds = self._get(src_dir), self._get(dst_dir)
+        except OSError as e:
+            if e.errno not in (errno.EMFILE, errno.ENFILE):
+                raise
+            stats.count('open_dir_exhausted')
+            return None
+        self._last = (src_dir, dst_dir, fds)
+        return fds
+
+    def close(self) -> None:
+        """Close every descriptor."""
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+        self._last = ('', '', None)
+
+    def __enter__(self) -> 'DirectoryFds':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class SharedDirectoryFds(DirectoryFds):
+    """
+    DirectoryFds for a thread pool: each thread keeps its own descriptors.
+
+    The limit is split between the threads, so renames never take a lock
+    and a thread never closes a descriptor another one is still using.
+    """
+
+    def __init__(self, workers: int, limit: Optional[int] = None):
+        super().__init__(limit)
+        self._thread_limit = max(2, self.limit // max(1, workers))
+        self._local = threading.local()
+        self._threads: List[DirectoryFds] = []
+        self._lock = threading.Lock()  # only taken when a thread first opens a directory
+
+    def acquire(self, src_dir: str, dst_dir: str) -> Optional[Tuple[int, int]]:
+        dir_fds = getattr(self._local, 'dir_fds', None)
+        if dir_fds is None:
+            dir_fds = self._local.dir_fds = DirectoryFds(self._thread_limit)
+            with self._lock:
+                self._threads.append(dir_fds)
+        return dir_fds.acquire(src_dir, dst_dir)
+
+    def close(self) -> None:
+        with self._lock:
+            for dir_fds in self._threads:
+                dir_fds.close()
+            self._threads.clear()
+        self._local = threading.local()
+
+def _copy_file_range(src_fd: int, dst_fd: int, offset: int, size: int) -> int:
+    """Copy with copy_file_range (in-kernel, may be a reflink); returns the new offset."""
+    while offset < size:
+        copied = os.copy_file_range(src_fd, dst_fd, min(COPY_CHUNK, size - offset), offset, offset)
+        if copied == 0:
+            break
+        offset += copied
+    return offset
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int, size: int) -> int:
+    """Copy with sendfile (in-kernel, no user space buffers); returns the new offset."""
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, min(COPY_CHUNK, size - offset))
+        if sent == 0:
+            break
+        offset += sent
+    return offset
+
+def _read_write(src_fd: int, dst_fd: int, offset: int) -> int:
+    """Copy through user space buffers as a last resort; returns the new offset."""
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while True:
+        chunk = os.read(src_fd, 1024 * 1024)
+        if not chunk:
+            return offset
+        os.write(dst_fd, chunk)
+        offset += len(chunk)
+
+def copy_data(src_fd: int, dst_fd: int, size: int) -> None:
+    """
+    Copy size bytes between two open files using the fastest available method.
+
+    Tries copy_file_range, then sendfile, then plain read/write. Each method
+    carries on from where the previous one stopped.
+
+    Args:
+        src_fd: File descriptor to read from
+        dst_fd: File descriptor to write to
+        size: Number of bytes to copy
+    """
+    methods = []
+    if hasattr(os, 'copy_file_range'):
+        methods.append(_copy_file_range)
+    if hasattr(os, 'sendfile'):
+        methods.append(_sendfile)
+
+    offset = 0
+    for copy in methods:
+        try:
+            offset = copy(src_fd, dst_fd, offset, size)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+            continue
+        if offset >= size:
+            return
+    _read_write(src_fd, dst_fd, offset)
+
+def _copy_across(src: str, dst: str) -> None:
+    """Copy src next to dst under a temporary name, then rename it into place and remove src."""
+    dst_dir, name = os.path.split(dst)
+    tmp = os.path.join(dst_dir, f".{name}.{os.getpid()}.partial")  # hidden, so cleaners skip it
+    try:
+        if os.path.islink(src):
+            os.symlink(os.readlink(src), tmp)
+        else:
+            st = os.stat(src)
+            binary = getattr(os, 'O_BINARY', 0)
+            src_fd = os.open(src, os.O_RDONLY | binary)
+            try:
+                dst_fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL | binary, st.st_mode & 0o7777)
+                try:
+                    copy_data(src_fd, dst_fd, st.st_size)
+                finally:
+                    os.close(dst_fd)
+            finally:
+                os.close(src_fd)
+            try:
+                os.chown(tmp, st.st_uid, st.st_gid)
+            except (AttributeError, PermissionError):  # not supported, or not allowed for this user
+                pass
+            shutil.copystat(src, tmp)  # after chown, which would clear setuid/setgid bits
+        rename_noreplace(tmp, dst)  # atomic on the destination filesystem
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        raise
+    os.remove(src)
+
+def move_file(src: str, dst: str, dir_fds: Optional[DirectoryFds] = None) -> None:
+    """
+    Move a file, falling back to a copy when src and dst are on different filesystems.
+
+    A rename that never replaces an existing dst (see rename_noreplace) is
+    tried first, relative to the open parent directories when dir_fds is
+    given, or by path if no more descriptors can be opened. When it fails
+    with EXDEV, the data is copied in the kernel (copy_file_range, then
+    sendfile) into a temporary file beside dst. Metadata is copied over,
+    the temporary file is renamed into place atomically, and finally src
+    is removed.
+
+    Args:
+        src: Path of the file to move
+        dst: Destination path
+        dir_fds: Optional open directories to rename relative to
+
+    Raises:
+        FileExistsError: dst already exists
+    """
+    stats.count('rename')
+    start = time.perf_counter()
+    try:
+        fds = None
+        if dir_fds is not None:
+            # cheaper than os.path.split; dir_fds are only used on POSIX, where the separator is '/'
+            src_cut = src.rfind('/') + 1
+            dst_cut = dst.rfind('/') + 1
+            fds = dir_fds.acquire(src[:src_cut] or os.curdir, dst[:dst_cut] or os.curdir)
+        if fds is None:
+            rename_noreplace(src, dst)
+        else:
+            rename_noreplace(src[src_cut:], dst[dst_cut:], fds[0], fds[1])
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        stats.count('cross_device_copy')
+        _copy_across(src, dst)
+    stats.observe('rename', time.perf_counter() - start)
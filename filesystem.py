@@ -0,0 +1,407 @@
+"""
+Module abstracting the filesystem calls of the cleaner, so whole runs can be
+simulated in memory.
+
+The scanner, name index, mover, change logger, planner and revert go through
+the current backend instead of calling os directly. The default backend is
+the real filesystem; a MemoryBackend can be swapped in with use_backend() to
+clean, plan and revert huge synthetic trees without touching the disk, e.g.
+to test policies or profile the Python side of a run separately from disk
+latency. Features that read file contents, wait on the real clock or talk to
+other systems or processes (content sniffing, deduplication, the stability
+filter, scan state, compressed logs, the catalog, the watcher, the asyncio
+pipeline and process shards) always use the real filesystem.
+"""
+
+import errno
+import io
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from file_ops import SUPPORTS_DIR_FD, move_file
+
+
+class OSBackend:
+    """The real filesystem: every call is the corresponding os function."""
+
+    native = True
+    supports_dir_fd = SUPPORTS_DIR_FD
+
+    scandir = staticmethod(os.scandir)
+    stat = staticmethod(os.stat)
+    exists = staticmethod(os.path.exists)
+    isdir = staticmethod(os.path.isdir)
+    mkdir = staticmethod(os.mkdir)
+    makedirs = staticmethod(os.makedirs)
+    rmdir = staticmethod(os.rmdir)
+    remove = staticmethod(os.remove)
+    open = staticmethod(open)
+    move = staticmethod(move_file)
+    copy = staticmethod(shutil.copy2)
+    replace = staticmethod(os.replace)
+
+    @staticmethod
+    def fsync(f: io.IOBase) -> None:
+        os.fsync(f.fileno())
+
+
+def _error(code: int, path: str) -> OSError:
+    """Build the OSError subclass the real filesystem would raise (FileNotFoundError, ...)."""
+    return OSError(code, os.strerror(code), path)
+
+class _File:
+    __slots__ = ('data', 'mtime_ns', 'ino')
+
+    def __init__(self, data: bytearray, mtime_ns: int, ino: int):
+        self.data = data
+        self.mtime_ns = mtime_ns
+        self.ino = ino
+
+class _Dir:
+    __slots__ = ('entries', 'mtime_ns', 'ino')
+
+    def __init__(self, mtime_ns: int, ino: int):
+        self.entries: Dict[str, Union[_File, '_Dir']] = {}
+        self.mtime_ns = mtime_ns
+        self.ino = ino
+
+class MemoryStat:
+    """The subset of os.stat_result the cleaner reads."""
+
+    __slots__ = ('st_mode', 'st_ino', 'st_nlink', 'st_size', 'st_mtime_ns')
+
+    def __init__(self, node: Union[_File, _Dir]):
+        is_dir = type(node) is _Dir
+        self.st_mode = 0o40755 if is_dir else 0o100644
+        self.st_ino = node.ino
+        self.st_nlink = 1
+        self.st_size = 0 if is_dir else len(node.data)
+        self.st_mtime_ns = node.mtime_ns
+
+    @property
+    def st_mtime(self) -> float:
+        return self.st_mtime_ns / 1e9
+
+class MemoryDirEntry:
+    """In-memory counterpart of os.DirEntry."""
+
+    __slots__ = ('name', 'path', '_node')
+
+    def __init__(self, name: str, path: str, node: Union[_File, _Dir]):
+        self.name = name
+        self.path = path
+        self._node = node
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        return type(self._node) is _File
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return type(self._node) is _Dir
+
+    def is_symlink(self) -> bool:
+        return False
+
+    def inode(self) -> int:
+        return self._node.ino
+
+    def stat(self, follow_symlinks: bool = True) -> MemoryStat:
+        return MemoryStat(self._node)
+
+class _ScandirIterator:
+    """Snapshot of a directory's entries that, like os.scandir, is also a context manager."""
+
+    __slots__ = ('_entries',)
+
+    def __init__(self, entries: List[MemoryDirEntry]):
+        # one iterator, so a loop that breaks off can resume where it stopped
+        self._entries = iter(entries)
+
+    def __iter__(self) -> Iterator[MemoryDirEntry]:
+        return self._entries
+
+    def __next__(self) -> MemoryDirEntry:
+        return next(self._entries)
+
+    def close(self) -> None:
+        self._entries = iter(())
+
+    def __enter__(self) -> '_ScandirIterator':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class _MemoryIO(io.RawIOBase):
+    """Raw handle reading and writing the bytearray of an in-memory file."""
+
+    def __init__(self, node: _File, mode: str):
+        self._node = node
+        self._readable = 'r' in mode or '+' in mode
+        self._writable = 'r' not in mode or '+' in mode
+        self._position = len(node.data) if 'a' in mode else 0
+
+    def readable(self) -> bool:
+        return self._readable
+
+    def writable(self) -> bool:
+        return self._writable
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self._node.data[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def write(self, data) -> int:
+        end = self._position + len(data)
+        self._node.data[self._position:end] = data
+        self._position = end
+        self._node.mtime_ns = time.time_ns()
+        return len(data)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += len(self._node.data)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+class MemoryBackend:
+    """
+    A filesystem kept in dictionaries.
+
+    Every directory is indexed by its path, so lookups never walk the tree.
+    Renames never replace an existing file, like the real mover, and only
+    files can be renamed. There are no links, permissions or devices, and
+    open() supports the binary and text modes the logs use.
+    """
+
+    native = False
+    supports_dir_fd = False
+
+    def __init__(self):
+        self._dirs: Dict[str, _Dir] = {}
+        self._next_ino = 1
+        self._root(os.sep)
+
+    def _new_ino(self) -> int:
+        ino = self._next_ino
+        self._next_ino += 1
+        return ino
+
+    def _root(self, path: str) -> None:
+        self._dirs[path] = _Dir(time.time_ns(), self._new_ino())
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        # the cleaner passes absolute paths, so only others pay for abspath
+        if path[:1] == os.sep and path[-1:] != os.sep and os.sep + '.' not in path:
+            return path
+        return os.path.abspath(path)
+
+    def _parent(self, path: str) -> tuple:
+        """Return (parent directory node, name) of a normalized path."""
+        head, _, name = path.rpartition(os.sep)
+        parent = self._dirs.get(head or os.sep)
+        if parent is None:
+            raise _error(errno.ENOENT, path)
+        return parent, name
+
+    def _node(self, path: str) -> Union[_File, _Dir]:
+        path = self._normalize(path)
+        node = self._dirs.get(path)
+        if node is not None:
+            return node
+        parent, name = self._parent(path)
+        node = parent.entries.get(name)
+        if node is None:
+            raise _error(errno.ENOENT, path)
+        return node
+
+    # ------------------------------ os-like interface ------------------------------
+
+    def scandir(self, path: str) -> _ScandirIterator:
+        directory = self._normalize(path)
+        node = self._dirs.get(directory)
+        if node is None:
+            self._node(directory)  # raises FileNotFoundError if it doesn't exist at all
+            raise _error(errno.ENOTDIR, path)
+        prefix = directory + os.sep if directory != os.sep else directory
+        return _ScandirIterator([MemoryDirEntry(name, prefix + name, child) for name, child in node.entries.items()])
+
+    def stat(self, path: str, *, dir_fd: Optional[int] = None, follow_symlinks: bool = True) -> MemoryStat:
+        return MemoryStat(self._node(path))
+
+    def exists(self, path: str) -> bool:
+        try:
+            self._node(path)
+        except OSError:
+            return False
+        return True
+
+    def isdir(self, path: str) -> bool:
+        return self._normalize(path) in self._dirs
+
+    def mkdir(self, path: str, mode: int = 0o777) -> None:
+        path = self._normalize(path)
+        parent, name = self._parent(path)
+        if name in parent.entries:
+            raise _error(errno.EEXIST, path)
+        node = _Dir(time.time_ns(), self._new_ino())
+        parent.entries[name] = node
+        self._dirs[path] = node
+
+    def makedirs(self, path: str, mode: int = 0o777, exist_ok: bool = False) -> None:
+        path = self._normalize(path)
+        if path in self._dirs:
+            if not exist_ok:
+                raise _error(errno.EEXIST, path)
+            return
+        head = path.rpartition(os.sep)[0] or os.sep
+        if head not in self._dirs:
+            self.makedirs(head, exist_ok=True)
+        self.mkdir(path)
+
+    def rmdir(self, path: str) -> None:
+        path = self._normalize(path)
+        node = self._dirs.get(path)
+        if node is None:
+            self._node(path)
+            raise _error(errno.ENOTDIR, path)
+        if node.entries:
+            raise _error(errno.ENOTEMPTY, path)
+        parent, name = self._parent(path)
+        del parent.entries[name]
+        del self._dirs[path]
+
+    def remove(self, path: str) -> None:
+        path = self._normalize(path)
+        parent, name = self._parent(path)
+        node = parent.entries.get(name)
+        if node is None:
+            raise _error(errno.ENOENT, path)
+        if type(node) is _Dir:
+            raise _error(errno.EISDIR, path)
+        del parent.entries[name]
+
+    def move(self, src: str, dst: str, dir_fds: None = None) -> None:
+        """Rename a file, failing with FileExistsError instead of replacing dst."""
+        src = self._normalize(src)
+        dst = self._normalize(dst)
+        src_parent, src_name = self._parent(src)
+        dst_parent, dst_name = self._parent(dst)
+        node = src_parent.entries.get(src_name)
+        if node is None:
+            raise _error(errno.ENOENT, src)
+        if type(node) is _Dir:
+            raise _error(errno.EISDIR, src)
+        if dst_name in dst_parent.entries:
+            raise _error(errno.EEXIST, dst)
+        del src_parent.entries[src_name]
+        dst_parent.entries[dst_name] = node
+
+    def replace(self, src: str, dst: str) -> None:
+        """Rename a file, replacing dst if it is a file, like os.replace."""
+        src = self._normalize(src)
+        dst = self._normalize(dst)
+        src_parent, src_name = self._parent(src)
+        dst_parent, dst_name = self._parent(dst)
+        node = src_parent.entries.get(src_name)
+        if node is None:
+            raise _error(errno.ENOENT, src)
+        if type(node) is _Dir:
+            raise _error(errno.EISDIR, src)
+        if type(dst_parent.entries.get(dst_name)) is _Dir:
+            raise _error(errno.EISDIR, dst)
+        del src_parent.entries[src_name]
+        dst_parent.entries[dst_name] = node
+
+    def copy(self, src: str, dst: str) -> str:
+        """Copy a file's data and modification time to dst, replacing a file there, like shutil.copy2."""
+        node = self._node(src)
+        if type(node) is _Dir:
+            raise _error(errno.EISDIR, src)
+        dst = self._normalize(dst)
+        parent, name = self._parent(dst)
+        if type(parent.entries.get(name)) is _Dir:
+            raise _error(errno.EISDIR, dst)
+        parent.entries[name] = _File(bytearray(node.data), node.mtime_ns, self._new_ino())
+        return dst
+
+    def open(self, path: str, mode: str = 'r', encoding: Optional[str] = None,
+             newline: Optional[str] = None) -> io.IOBase:
+        path = self._normalize(path)
+        parent, name = self._parent(path)
+        node = parent.entries.get(name)
+        if type(node) is _Dir:
+            raise _error(errno.EISDIR, path)
+        if 'r' in mode:
+            if node is None:
+                raise _error(errno.ENOENT, path)
+        elif node is None or 'w' in mode:
+            if 'x' in mode and node is not None:
+                raise _error(errno.EEXIST, path)
+            node = parent.entries[name] = _File(bytearray(), time.time_ns(), self._new_ino())
+
+        raw = _MemoryIO(node, mode)
+        if raw.readable() and raw.writable():
+            handle = io.BufferedRandom(raw)
+        elif raw.readable():
+            handle = io.BufferedReader(raw)
+        else:
+            handle = io.BufferedWriter(raw)
+        if 'b' in mode:
+            return handle
+        return io.TextIOWrapper(handle, encoding=encoding or 'utf-8', newline=newline)
+
+    def fsync(self, f: io.IOBase) -> None:
+        pass
+
+    # ------------------------------ populating ------------------------------
+
+    def add_files(self, directory: str, names: Iterable[str], size: int = 0,
+                  mtime_ns: Optional[int] = None) -> None:
+        """Create a directory (with its parents) holding empty files of the given size."""
+        self.makedirs(directory, exist_ok=True)
+        entries = self._dirs[self._normalize(directory)].entries
+        mtime_ns = time.time_ns() if mtime_ns is None else mtime_ns
+        for name in names:
+            entries[name] = _File(bytearray(size), mtime_ns, self._new_ino())
+
+    def walk_files(self, top: str) -> Iterator[str]:
+        """Yield the paths of all files below top."""
+        top = self._normalize(top)
+        for path, node in list(self._dirs.items()):
+            if path == top or path.startswith(top + os.sep):
+                for name, child in node.entries.items():
+                    if type(child) is _File:
+                        yield os.path.join(path, name)
+
+
+# the backend used by the cleaner; replaced with set_backend or use_backend
+backend: Union[OSBackend, MemoryBackend] = OSBackend()
+
+def set_backend(new_backend: Union[OSBackend, MemoryBackend]) -> Union[OSBackend, MemoryBackend]:
+    """Make new_backend the current backend and return the previous one."""
+    global backend
+    previous, backend = backend, new_backend
+    return previous
+
+@contextmanager
+def use_backend(new_backend: Union[OSBackend, MemoryBackend]):
+    """Use a backend for the duration of a with block."""
+    previous = set_backend(new_backend)
+    try:
+        yield new_backend
+    finally:
+        set_backend(previous)
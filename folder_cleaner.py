@@ -6,14 +6,27 @@ directories based on their file extensions. It can handle various file types
 including audio, video, documents, images, archives, and installers.
 
 Usage:
-    python folder_cleaner.py [--path PATH] [--recursive] [recursionDepth]
+    python folder_cleaner.py [--path PATH] [--recursive] [--depth DEPTH] [--workers N] [--settle SECONDS]
 """
 
 import argparse
 import os
 import sys
-from typing import Dict, List, Optional
-from change_logger_singleton import initialize_logger, get_logger
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from change_logger import ChangeLogger
+from change_logger_singleton import get_logger
+from name_index import NameIndex
+from move_executor import execute_moves
+from scan_state import ScanState
+from content_sniffer import ContentSniffer
+from deduplicator import deduplicate
+from stability import StabilityFilter
+from subfolders import SCHEMES, DEFAULT_LIMIT, SubfolderLayout
+from rules import RuleSet, load_rules
+from exclusions import ExclusionRules, load_exclusions
+from catalog import default_catalog_path
+import filesystem
+import stats
 
 
 # maps of file extensions to categories
@@ -25,35 +38,72 @@ ARCHIVE_EXTENSIONS = {'.zip', '.rar', '.tar', '.gz', '.7z'}
 INSTALLER_EXTENSIONS = {'.exe', '.msi', '.dmg', '.pkg'}
 # Everything else goes into 'Others'
 
+# the built-in categories compiled into one extension lookup table
+DEFAULT_RULES = RuleSet({
+    **{ext: 'Audio' for ext in AUDIO_EXTENSIONS},
+    **{ext: 'Video' for ext in VIDEO_EXTENSIONS},
+    **{ext: 'Documents' for ext in DOCUMENT_EXTENSIONS},
+    **{ext: 'Images' for ext in IMAGE_EXTENSIONS},
+    **{ext: 'Archives' for ext in ARCHIVE_EXTENSIONS},
+    **{ext: 'Installers' for ext in INSTALLER_EXTENSIONS},
+})
+
 download_path = os.path.join(os.path.expanduser("~"), "Downloads")
 
-def create_directories(base_path: str) -> Dict[str, str]:
+# files classified and moved at once; bounds memory use in very large directories
+BATCH_SIZE = 10000
+
+def create_directories(base_path: str, rules: Optional[RuleSet] = None,
+                       logger: Optional[ChangeLogger] = None) -> Dict[str, str]:
     """
     Create category directories if they don't exist.
 
     Args:
         base_path: The root path where directories should be created
+        rules: Rules defining the categories (defaults to the built-in ones)
+        logger: Change logger of the run (defaults to the global one)
 
     Returns:
         Dict mapping category names to their full directory paths
     """
-    directories = {
-        'Audio': os.path.join(base_path, 'Audio'),
-        'Video': os.path.join(base_path, 'Video'),
-        'Documents': os.path.join(base_path, 'Documents'),
-        'Images': os.path.join(base_path, 'Images'),
-        'Archives': os.path.join(base_path, 'Archives'),
-        'Installers': os.path.join(base_path, 'Installers'),
-        'Others': os.path.join(base_path, 'Others')
-    }
+    categories = (rules or DEFAULT_RULES).categories
+    directories = {category: os.path.join(base_path, category) for category in categories}
 
     for dir_path in directories.values():
-        if not os.path.exists(dir_path):
-            os.makedirs(dir_path)
-            get_logger().log_folder_creation(dir_path)
+        stats.count('stat')
+        if not filesystem.backend.exists(dir_path):
+            filesystem.backend.makedirs(dir_path)
+            (logger or get_logger()).log_folder_creation(dir_path)
 
     return directories
 
+def scan_directory(base_path: str) -> Tuple[List[os.DirEntry], List[os.DirEntry]]:
+    """
+    Scan a directory once and split its entries into files and subdirectories.
+
+    Uses os.scandir so the file type comes from the cached directory entry
+    (d_type) instead of a separate stat call per entry.
+
+    Args:
+        base_path: Directory path to scan
+
+    Returns:
+        Tuple of (file entries, subdirectory entries)
+    """
+    files = []
+    subdirs = []
+    stats.count('listdir')
+    with filesystem.backend.scandir(base_path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    files.append(entry)
+                elif entry.is_dir():
+                    subdirs.append(entry)
+            except OSError:  # entry vanished or is unreadable, skip it
+                continue
+    return files, subdirs
+
 def get_files(base_path: str) -> List[str]:
     """
     Get list of files in the specified directory (excluding directories).
@@ -64,110 +114,333 @@ def get_files(base_path: str) -> List[str]:
     Returns:
         List of filenames found in the directory
     """
-    # skip folders and get a list of each file name in the base path (skipping any folders)
-    return [file for file in os.listdir(base_path) if os.path.isfile(os.path.join(base_path, file))]
+    files, _ = scan_directory(base_path)
+    return [entry.name for entry in files]
 
-def map_file_to_category(file: str, file_map: Dict[str, List[str]]) -> None:
+def map_file_to_category(file: str, file_map: Dict[str, List[str]], rules: Optional[RuleSet] = None,
+                         size: Optional[int] = None) -> None:
     """
     Map a file to its appropriate category based on extension.
 
     Args:
         file: Name of the file to categorize
         file_map: Dictionary to store categorized files
+        rules: Rules to classify with (defaults to the built-in extension sets)
+        size: File size in bytes, only needed for size-based rules
 
     Note:
         Hidden files (starting with '.') are ignored
     """
     if (file.startswith('.')): # skip hidden files
         return
-    
-    ext = os.path.splitext(file)[1].lower()
-    if ext in AUDIO_EXTENSIONS:
-        file_map['Audio'].append(file)
-    elif ext in VIDEO_EXTENSIONS:
-        file_map['Video'].append(file)
-    elif ext in DOCUMENT_EXTENSIONS:
-        file_map['Documents'].append(file)
-    elif ext in IMAGE_EXTENSIONS:
-        file_map['Images'].append(file)
-    elif ext in ARCHIVE_EXTENSIONS:
-        file_map['Archives'].append(file)
-    elif ext in INSTALLER_EXTENSIONS:
-        file_map['Installers'].append(file)
-    else:
-        file_map['Others'].append(file)
+
+    file_map[(rules or DEFAULT_RULES).classify(file, size)].append(file)
     return
 
-def get_unique_filename(dst: str) -> str:
+def categorize_files(files: Iterable[str], rules: Optional[RuleSet] = None,
+                     base_path: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Map a batch of filenames to their categories.
+
+    Args:
+        files: Names of the files to categorize
+        rules: Rules to classify with (defaults to the built-in extension sets)
+        base_path: Directory the files live in, needed when the rules
+            contain size thresholds
+
+    Returns:
+        Dictionary of category name to list of filenames (hidden files are left out)
+    """
+    rules = rules or DEFAULT_RULES
+    file_map = {category: [] for category in rules.categories}
+    if rules.needs_size and base_path is not None:
+        for file in files:
+            stats.count('stat')
+            try:
+                size = filesystem.backend.stat(os.path.join(base_path, file)).st_size
+            except OSError:
+                size = None
+            map_file_to_category(file, file_map, rules, size)
+    else:
+        for file in files:
+            map_file_to_category(file, file_map, rules)
+    return file_map
+
+def get_unique_filename(dst: str, name_index: Optional[NameIndex] = None) -> str:
     """
     Generate a unique filename by appending a number if file exists.
 
     Args:
         dst: Destination path to check
+        name_index: Optional index of taken names; when given, the result is
+            resolved in memory and reserved in the index instead of probing
+            the filesystem
 
     Returns:
         Modified path that doesn't conflict with existing files
     """
     # if dst already exists, append a number to the filename
     # e.g., file.txt -> file(1).txt
+    if name_index is not None:
+        return name_index.reserve(dst)
 
     base, ext = os.path.splitext(dst)
     counter = 1
     new_dst = dst
-    while os.path.exists(new_dst):
+    stats.count('stat')
+    while filesystem.backend.exists(new_dst):
         new_dst = f"{base}({counter}){ext}"
         counter += 1
+        stats.count('stat')
+    if counter > 1:
+        stats.count('collisions')
     return new_dst
 
 
-def main(base_path: Optional[str] = None, recursive: bool = False, recursionDepth: int = -1) -> None:
+def move_files(base_path: str, file_map: Dict[str, List[str]], directories: Dict[str, str],
+               workers: int = 1, logger: Optional[ChangeLogger] = None,
+               name_index: Optional[NameIndex] = None, layout: Optional[SubfolderLayout] = None) -> int:
+    """
+    Move categorized files into their category directories and log each move.
+
+    Destination names are reserved up front against a name index, so the
+    renames themselves are independent and may run on a thread pool. Renames
+    never replace an existing file: if the kernel reports that a reserved
+    name was taken after the index was built, the next free name is
+    reserved and the move retried.
+
+    Args:
+        base_path: Directory the files currently live in
+        file_map: Category name to list of filenames
+        directories: Category name to category directory path
+        workers: Number of threads performing renames (1 for serial)
+        logger: Change logger of the run (defaults to the global one)
+        name_index: Index of taken names to reserve in, shared when one
+            directory is moved in several batches
+        layout: Optional layout placing files in subfolders of their
+            category folder (see subfolders.SubfolderLayout)
+
+    Returns:
+        Number of files that could not be moved
+    """
+    # resolve name conflicts against an index built from one scan per category folder
+    name_index = name_index or NameIndex()
+    logger = logger or get_logger()
+    failed = 0
+    moves = []
+    with stats.timer('conflicts'):
+        for category, files in file_map.items():
+            category_dir = directories[category]
+            for file in files:
+                src = os.path.join(base_path, file)
+                target_dir = category_dir
+                if layout is not None:
+                    try:
+                        target_dir = layout.directory(category_dir, src)
+                    except OSError as e:
+                        print(f"Error moving {file}: {e}")
+                        failed += 1
+                        continue
+                dst = get_unique_filename(os.path.join(target_dir, file), name_index)  # ensure no overwriting
+                moves.append((src, dst))
+    if layout is not None:
+        layout.create(sorted({os.path.dirname(dst) for _, dst in moves}), logger)
+
+    while moves:
+        logger.log_intents(moves)
+        with stats.timer('rename'):
+            errors = execute_moves(moves, workers)
+
+        # log in plan order so the change log is the same regardless of worker count
+        retry = []
+        for (src, dst), error in zip(moves, errors):
+            if error is None:
+                logger.log_move(src, dst)
+            elif isinstance(error, FileExistsError):
+                # created by someone else since the index was built; dst stays taken
+                stats.count('collisions')
+                retry.append((src, name_index.reserve(dst)))
+            else:
+                name_index.release(dst)
+                print(f"Error moving {os.path.basename(src)}: {error}")
+                failed += 1
+        moves = retry
+    return failed
+
+def _scan_batches(base_path: str, batch_size: int, subdirs: List[str]) -> Iterator[List[str]]:
+    """
+    Stream the file names of a directory in batches of at most batch_size.
+
+    Names of subdirectories are appended to subdirs along the way.
+    """
+    stats.count('listdir')
+    with filesystem.backend.scandir(base_path) as entries:
+        exhausted = False
+        while not exhausted:
+            batch = []
+            with stats.timer('scan'):
+                exhausted = True
+                for entry in entries:
+                    try:
+                        if entry.is_file():
+                            batch.append(entry.name)
+                        elif entry.is_dir():
+                            subdirs.append(entry.name)
+                    except OSError:  # entry vanished or is unreadable, skip it
+                        continue
+                    if len(batch) >= batch_size:
+                        exhausted = False
+                        break
+            if batch:
+                yield batch
+
+def _create_needed_directories(file_map: Dict[str, List[str]], directories: Dict[str, str],
+                               ready: Set[str], logger: ChangeLogger) -> None:
+    """Create the category folders a batch moves files into, once per directory."""
+    for category, files in file_map.items():
+        if files and category not in ready:
+            ready.add(category)
+            try:
+                filesystem.backend.mkdir(directories[category])
+                logger.log_folder_creation(directories[category])
+            except FileExistsError:
+                pass
+
+def clean_directory(base_path: str, logger: ChangeLogger, workers: int = 1,
+                    sniffer: Optional[ContentSniffer] = None, dedupe: Optional[str] = None,
+                    rules: Optional[RuleSet] = None, batch_size: int = BATCH_SIZE,
+                    stability: Optional[StabilityFilter] = None,
+                    layout: Optional[SubfolderLayout] = None,
+                    exclusions: Optional[ExclusionRules] = None) -> Tuple[List[str], bool]:
+    """
+    Clean the files directly inside one directory.
+
+    Entries are streamed from the directory and classified and moved in
+    batches, so memory does not grow with the number of files. Only the
+    category folders that files are actually moved into are created, and
+    one name index per directory is shared by all batches.
+
+    Args:
+        base_path: Directory to clean
+        logger: Change logger of the run
+        workers: Number of threads performing renames and processes hashing duplicates
+        sniffer: Optional content sniffer for files with unknown extensions
+        dedupe: Optional duplicate handling (see deduplicator.deduplicate)
+        rules: Categorization rules (defaults to the built-in extension sets)
+        batch_size: Maximum number of files classified and moved at once
+        stability: Optional filter leaving files that are still being
+            downloaded in place
+        layout: Optional layout placing files in subfolders of their
+            category folder
+        exclusions: Optional rules whose excluded files are left alone
+            without being classified
+
+    Returns:
+        Tuple of (paths of the subdirectories that aren't category folders,
+        whether the directory was left untouched)
+    """
+    rules = rules or DEFAULT_RULES
+    directories = {category: os.path.join(base_path, category) for category in rules.categories}
+    changes_before = len(logger.changes)
+    name_index = NameIndex()
+    ready: Set[str] = set()
+    subdirs: List[str] = []
+    failed = 0
+
+    for files in _scan_batches(base_path, batch_size, subdirs):
+        if exclusions is not None:
+            files = exclusions.filter_files(base_path, files)
+        with stats.timer('classify'):
+            file_map = categorize_files(files, rules, base_path)
+        stats.count('files', len(files))
+        if stability is not None:
+            with stats.timer('stability'):
+                # skipped files must be looked at again, so the directory isn't clean
+                failed += stability.filter(base_path, file_map)
+        if sniffer is not None:
+            with stats.timer('sniff'):
+                sniffer.reclassify(base_path, file_map, rules.default)
+        _create_needed_directories(file_map, directories, ready, logger)
+        if dedupe is not None:
+            with stats.timer('dedupe'):
+                deduplicate(base_path, file_map, directories, dedupe, workers, logger, layout is not None)
+        failed += move_files(base_path, file_map, directories, workers, logger, name_index, layout)
+
+    # subdirectories are unaffected by moving files, so the scan is still valid
+    category_names = tuple(directories)
+    subdir_paths = [os.path.join(base_path, name) for name in subdirs if not name.endswith(category_names)]
+    return subdir_paths, failed == 0 and len(logger.changes) == changes_before
+
+def main(base_path: Optional[str] = None, recursive: bool = False, recursionDepth: int = -1,
+         workers: int = 1, scan_state: Optional[ScanState] = None,
+         sniffer: Optional[ContentSniffer] = None, dedupe: Optional[str] = None,
+         rules: Optional[RuleSet] = None, logger: Optional[ChangeLogger] = None,
+         batch_size: int = BATCH_SIZE, stability: Optional[StabilityFilter] = None,
+         layout: Optional[SubfolderLayout] = None, exclusions: Optional[ExclusionRules] = None) -> None:
     """
     Main function to organize files into categories.
 
+    The tree is walked with an explicit stack in the same order a recursive
+    walk would take, so depth is not limited by Python's recursion limit.
+    The log is saved once, at the end. With a jsonl log every finished
+    directory is also checkpointed in the journal, and a logger resumed from
+    that journal (ChangeLogger.resume) skips those directories without
+    listing them again.
+
     Args:
         base_path: Directory to organize (defaults to user's Downloads)
         recursive: Whether to process subdirectories
         recursionDepth: How deep to recurse (-1 for infinite)
+        workers: Number of threads performing renames and processes hashing
+            duplicates (1 for serial)
+        scan_state: Optional state from previous runs; directories left clean
+            and unchanged since then are skipped without being listed
+        sniffer: Optional content sniffer used to classify files whose
+            extension is unknown
+        dedupe: Optional duplicate handling before moving: 'report',
+            'hardlink' or 'skip' (see deduplicator.deduplicate)
+        rules: Categorization rules (defaults to the built-in extension sets)
+        logger: Change logger of the run (defaults to the global one set up
+            with change_logger_singleton.initialize_logger)
+        batch_size: Maximum number of files classified and moved at once
+        stability: Optional filter leaving files that are still being
+            downloaded in place
+        layout: Optional layout placing files in subfolders of their
+            category folder
+        exclusions: Optional gitignore-style rules; excluded files are
+            left alone and excluded subdirectories are never listed
     """
     if base_path is None:
         base_path = download_path
-    
-    if get_logger() is None:
-        initialize_logger(base_path)
 
-    directories = create_directories(base_path)  # create dirs
-    files = get_files(base_path)
+    if logger is None:
+        logger = get_logger()
 
-    file_map = {
-        'Audio': [], 'Video': [], 'Documents': [],
-        'Images': [], 'Archives': [], 'Installers': [], 'Others': []
-    }
+    stack = [(base_path, recursionDepth if recursive else 0)]
+    while stack:
+        directory, remaining = stack.pop()
+        # directories checkpointed by an interrupted run that is being resumed
+        subdir_paths = logger.finished.get(directory)
+        if subdir_paths is None and scan_state is not None:
+            subdir_paths = scan_state.unchanged_subdirs(directory)
+        if subdir_paths is None:
+            try:
+                subdir_paths, clean = clean_directory(directory, logger, workers, sniffer, dedupe, rules,
+                                                      batch_size, stability, layout, exclusions)
+            except OSError as e:
+                print(f"Error cleaning {directory}: {e}")
+                continue
+            logger.log_checkpoint(directory, subdir_paths)
+            if scan_state is not None:
+                scan_state.record(directory, subdir_paths, clean)
 
-    # map files to categories
-    for file in files:
-        map_file_to_category(file, file_map)
+        if remaining != 0:
+            if exclusions is not None:
+                subdir_paths = exclusions.prune(subdir_paths)
+            # pushed in reverse so subdirectories are visited in scan order
+            stack.extend((path, remaining - 1) for path in reversed(subdir_paths))
 
-    # move files
-    for category, files in file_map.items():
-        for file in files:
-            src = os.path.join(base_path, file)
-            dst = os.path.join(directories[category], file)
-            dst = get_unique_filename(dst)  # ensure no overwriting
-            try:
-                os.rename(src, dst)
-                get_logger().log_move(src, dst)
-            except Exception as e:
-                print(f"Error moving {file}: {e}")
-    
-    if recursive and (recursionDepth != 0):
-        for item in os.listdir(base_path):
-            item_path = os.path.join(base_path, item)
-            if os.path.isdir(item_path) and not item.endswith(tuple(directories.keys())):
-                main(item_path, recursive=True, recursionDepth = recursionDepth - 1)
-
-    log_file = get_logger().save_log()
-    print(f"Changes logged to: {log_file}")
-    
+    print(f"Changes logged to: {logger.save_log()}")
 
 
 if __name__ == "__main__":
@@ -176,7 +449,167 @@ if __name__ == "__main__":
     parser.add_argument('--recursive', action='store_true', help='Clean subdirectories recursively')
     parser.add_argument('--depth', type=int, default=-1, 
                        help='Maximum recursion depth (-1 for infinite, 0 for no recursion, 1 for immediate subdirectories only)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of threads performing renames (useful on network shares, default 1)')
+    parser.add_argument('--log-format', choices=['json', 'jsonl'], default='json',
+                       help='json rewrites one document per save, jsonl appends one record per change')
+    parser.add_argument('--flush-interval', type=int, default=1000,
+                       help='(jsonl) number of records buffered before the journal is flushed')
+    parser.add_argument('--fsync-batch', type=int, default=0,
+                       help='(jsonl) fsync the journal after this many records (0 disables fsync)')
+    parser.add_argument('--compress-log', choices=['gzip', 'lzma'], default=None,
+                       help='Compress the change log file')
+    parser.add_argument('--resume', type=str, default=None, metavar='JOURNAL',
+                       help='Continue an interrupted run from its jsonl journal, finishing half-done moves first')
+    parser.add_argument('--catalog', nargs='?', const='', default=None, metavar='PATH',
+                       help='Also index every change in a SQLite catalog (default: logs/catalog.sqlite3)')
+    parser.add_argument('--state-file', type=str, default=None,
+                       help='Remember directory state between runs and skip directories unchanged since the last run')
+    parser.add_argument('--watch', action='store_true',
+                       help='Keep running and clean new files as they arrive (Linux inotify)')
+    parser.add_argument('--debounce', type=float, default=2.0,
+                       help='(watch) seconds without new events before a batch is cleaned')
+    parser.add_argument('--sniff', action='store_true',
+                       help='Classify files with unknown or missing extensions by their content')
+    parser.add_argument('--dedupe', choices=['report', 'hardlink', 'skip'], default=None,
+                       help='Detect duplicate files before moving and report them, hardlink them or leave them in place')
+    parser.add_argument('--settle', type=float, default=None, metavar='SECONDS',
+                       help='Skip partial downloads and files whose size or mtime changes within SECONDS')
+    parser.add_argument('--rules', type=str, default=None,
+                       help='JSON file with extra categorization rules (extensions, name patterns, size thresholds)')
+    parser.add_argument('--exclude', action='append', default=[], metavar='PATTERN',
+                       help='Leave files and folders matching a gitignore-style pattern alone (repeatable)')
+    parser.add_argument('--include', action='append', default=[], metavar='PATTERN',
+                       help='Re-include what an exclude pattern matched, like !PATTERN in .gitignore (repeatable)')
+    parser.add_argument('--exclude-from', action='append', default=[], metavar='FILE',
+                       help='Read exclude patterns in .gitignore syntax from FILE (repeatable)')
+    parser.add_argument('--subfolders', choices=SCHEMES, default=None,
+                       help='Spread category folders over subfolders by modification month, name hash or count')
+    parser.add_argument('--subfolder-size', type=int, default=DEFAULT_LIMIT,
+                       help='(subfolders count) maximum number of entries per subfolder')
+    parser.add_argument('--dry-run', action='store_true',
+                       help='Only print the moves that would be made')
+    parser.add_argument('--plan-out', type=str, default=None,
+                       help='Write the planned moves to a file for review instead of moving anything')
+    parser.add_argument('--apply-plan', type=str, default=None,
+                       help='Apply a plan written by --plan-out without rescanning')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                       help='Maximum number of files classified and moved at once (bounds memory in huge folders)')
+    parser.add_argument('--pipeline', action='store_true',
+                       help='Scan, classify and move concurrently with bounded memory (asyncio pipeline)')
+    parser.add_argument('--queue-size', type=int, default=64,
+                       help='(pipeline) capacity of the queues between the stages')
+    parser.add_argument('--roots', nargs='+', default=None, metavar='PATH',
+                       help='Clean several folders in parallel processes, merged into one change log')
+    parser.add_argument('--shard', action='store_true',
+                       help='(recursive) clean the top-level subfolders of --path in parallel processes')
+    parser.add_argument('--processes', type=int, default=None,
+                       help='(roots/shard) number of worker processes (default: CPU count)')
+    parser.add_argument('--stats', action='store_true',
+                       help='Print phase timings, syscall counters and rename latencies at the end')
+    parser.add_argument('--stats-json', type=str, default=None, metavar='PATH',
+                       help='Write phase timings, syscall counters and rename latencies as JSON to PATH')
     args = parser.parse_args()
-    initialize_logger(args.path if args.path else download_path)
-    main(args.path, args.recursive, args.depth)
+    if args.stats or args.stats_json:
+        stats.enable_stats()
+    base_path = args.path if args.path else download_path
+    if args.roots:
+        from sharding import normalize_roots
+        try:
+            args.roots = normalize_roots(args.roots)
+        except ValueError as e:
+            parser.error(f"--roots: {e}")
+    sniffer = ContentSniffer() if args.sniff else None
+    stability = StabilityFilter(args.settle) if args.settle is not None else None
+    layout = SubfolderLayout(args.subfolders, args.subfolder_size) if args.subfolders else None
+    rules = load_rules(args.rules, DEFAULT_RULES) if args.rules else None
+    excluding = args.exclude or args.include or args.exclude_from
+    exclusions = load_exclusions(args.exclude_from, args.exclude, args.include,
+                                 args.roots or [base_path]) if excluding else None
+
+    if args.plan_out or args.dry_run:
+        from planner import build_plan
+        plan = build_plan(base_path, args.recursive, args.depth, rules=rules, sniffer=sniffer,
+                          stability=stability, layout=layout, exclusions=exclusions)
+        if args.plan_out:
+            plan.save(args.plan_out)
+            print(f"Plan with {len(plan.moves)} moves written to: {args.plan_out}")
+        else:
+            for src, dst in plan.moves:
+                print(f"{src} -> {dst}")
+        for category, count in plan.summary().items():
+            print(f"{category}: {count}")
+        if exclusions is not None:
+            print(exclusions.summary())
+        stats.finish(args.stats, args.stats_json)
+        sys.exit(0)
+
+    if args.apply_plan:
+        from planner import MovePlan, execute_plan
+        plan = MovePlan.load(args.apply_plan)
+        base_path = plan.base_path
+
+    if args.roots:
+        try:
+            base_path = os.path.commonpath(args.roots)
+        except ValueError:  # roots on different drives
+            base_path = args.roots[0]
+
+    catalog = None if args.catalog is None else args.catalog or default_catalog_path()
+    if args.resume:
+        if args.apply_plan or args.roots or args.shard or args.pipeline:
+            parser.error("--resume can't be combined with --apply-plan, --roots, --shard or --pipeline")
+        from resume import reconcile
+        logger = ChangeLogger.resume(args.resume, flush_interval=args.flush_interval,
+                                     fsync_batch=args.fsync_batch, catalog=catalog)
+        base_path = logger.base_path
+        if excluding:  # anchored patterns are relative to the journal's root
+            exclusions = load_exclusions(args.exclude_from, args.exclude, args.include, [base_path])
+        completed, not_done = reconcile(logger)
+        print(f"Resuming {args.resume}: {len(logger.finished)} directories already done, "
+              f"{completed} interrupted moves completed, {not_done} left to redo")
+    else:
+        logger = ChangeLogger(base_path, log_format=args.log_format,
+                              flush_interval=args.flush_interval, fsync_batch=args.fsync_batch,
+                              compression=args.compress_log, catalog=catalog)
+
+    if args.apply_plan:
+        failed = execute_plan(plan, args.workers, logger)
+        print(f"Changes logged to: {logger.save_log()}")
+        print(f"Applied {len(plan.moves) - failed} of {len(plan.moves)} planned moves")
+        stats.finish(args.stats, args.stats_json)
+        sys.exit(0)
+
+    scan_state = ScanState(args.state_file) if args.state_file else None
+    if args.roots or args.shard:
+        if scan_state is not None or args.pipeline or args.watch:
+            parser.error("--roots/--shard can't be combined with --state-file, --pipeline or --watch")
+        from sharding import clean_sharded
+        roots = args.roots or [base_path]
+        log_file = clean_sharded(roots, logger, args.recursive, args.depth, auto_shard=args.shard,
+                                 processes=args.processes, workers=args.workers, rules=rules,
+                                 sniff=args.sniff, dedupe=args.dedupe, settle=args.settle, layout=layout,
+                                 exclusions=exclusions)
+        print(f"Changes logged to: {log_file}")
+    elif args.pipeline:
+        if scan_state is not None or sniffer is not None or args.dedupe or stability is not None or layout:
+            parser.error("--pipeline can't be combined with --state-file, --sniff, --dedupe, --settle or --subfolders")
+        from pipeline import run_pipeline
+        run_pipeline(base_path, args.recursive, args.depth, workers=args.workers, rules=rules,
+                     queue_size=args.queue_size, logger=logger, exclusions=exclusions)
+    else:
+        main(base_path, args.recursive, args.depth, workers=args.workers, scan_state=scan_state, sniffer=sniffer,
+             dedupe=args.dedupe, rules=rules, logger=logger, batch_size=args.batch_size, stability=stability,
+             layout=layout, exclusions=exclusions)
+    if scan_state is not None:
+        scan_state.save()
+        print(f"Skipped {scan_state.skipped} unchanged directories")
+    if exclusions is not None:
+        print(exclusions.summary())
+    if args.watch:
+        from watcher import Watcher
+        Watcher(base_path, args.recursive, args.depth, debounce=args.debounce, workers=args.workers,
+                sniffer=sniffer, rules=rules, logger=logger, stability=stability, layout=layout,
+                exclusions=exclusions).run()
     print("Finished Cleaning!")
+    stats.finish(args.stats, args.stats_json)
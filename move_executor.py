@@ -0,0 +1,47 @@
+"""Module for performing batches of file moves, optionally on a thread pool."""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
+from typing import List, Optional, Tuple
+
+import filesystem
+from file_ops import DirectoryFds, SharedDirectoryFds
+
+
+def _move(move: Tuple[str, str], dir_fds: Optional[DirectoryFds]) -> Optional[Exception]:
+    """Move a single file and return the error instead of raising it."""
+    src, dst = move
+    try:
+        filesystem.backend.move(src, dst, dir_fds)
+    except Exception as e:
+        return e
+    return None
+
+def execute_moves(moves: List[Tuple[str, str]], workers: int = 1) -> List[Optional[Exception]]:
+    """
+    Perform a batch of (source, destination) renames.
+
+    Destinations must already be unique (reserved up front), so the renames
+    are independent of each other and can run concurrently. This mainly pays
+    off on high-latency filesystems such as NFS or SMB shares. The source
+    and destination directories are opened once for the batch and renames
+    are made relative to them. An existing destination is never replaced;
+    such a move fails with FileExistsError.
+
+    Args:
+        moves: List of (source, destination) paths
+        workers: Number of threads to use (1 runs the renames serially)
+
+    Returns:
+        List aligned with moves holding None for each successful rename
+        or the exception that made it fail
+    """
+    if workers <= 1 or len(moves) <= 1:
+        with DirectoryFds() if filesystem.backend.supports_dir_fd else nullcontext() as dir_fds:
+            return [_move(move, dir_fds) for move in moves]
+
+    with SharedDirectoryFds(workers) if filesystem.backend.supports_dir_fd else nullcontext() as dir_fds:
+        with ThreadPoolExecutor(max_workers=min(workers, len(moves))) as pool:
+            # map yields results in submission order, which keeps logging deterministic
+            return list(pool.map(_move, moves, repeat(dir_fds)))
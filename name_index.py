@@ -0,0 +1,82 @@
+"""Module keeping an in-memory index of taken file names per destination directory."""
+
+import os
+from typing import Dict, Set, Tuple
+
+import filesystem
+import stats
+
+
+class NameIndex:
+    """
+    Index of names already used in destination directories.
+
+    Each directory is scanned once, the first time a name is reserved in it.
+    After that, collisions are resolved with dictionary lookups and a
+    next-free counter per base name instead of probing the filesystem.
+    """
+
+    def __init__(self):
+        self._taken: Dict[str, Set[str]] = {}
+        self._counters: Dict[str, Dict[Tuple[str, str], int]] = {}
+
+    def _names(self, directory: str) -> Set[str]:
+        """Return the set of taken names for a directory, scanning it on first use."""
+        names = self._taken.get(directory)
+        if names is None:
+            names = set()
+            stats.count('listdir')
+            try:
+                with filesystem.backend.scandir(directory) as entries:
+                    for entry in entries:
+                        names.add(os.path.normcase(entry.name))
+            except (FileNotFoundError, NotADirectoryError):  # not created yet (or blocked by a file): nothing is taken
+                pass
+            self._taken[directory] = names
+            self._counters[directory] = {}
+        return names
+
+    def reserve(self, dst: str) -> str:
+        """
+        Reserve a unique path for dst, appending a number if the name is taken.
+
+        Args:
+            dst: Desired destination path
+
+        Returns:
+            Path that was free and is now marked as taken,
+            e.g. file.txt -> file(1).txt
+        """
+        directory, name = os.path.split(dst)
+        names = self._names(directory)
+        key = os.path.normcase(name)
+        if key not in names:
+            names.add(key)
+            return dst
+
+        stats.count('collisions')
+        base, ext = os.path.splitext(name)
+        counters = self._counters[directory]
+        counter = counters.get((base, ext), 1)
+        new_name = f"{base}({counter}){ext}"
+        while os.path.normcase(new_name) in names:
+            counter += 1
+            new_name = f"{base}({counter}){ext}"
+        names.add(os.path.normcase(new_name))
+        counters[(base, ext)] = counter + 1
+        return os.path.join(directory, new_name)
+
+    def release(self, dst: str) -> None:
+        """
+        Mark a previously reserved path as free again (e.g. after a failed move).
+
+        Args:
+            dst: Path returned by reserve
+        """
+        directory, name = os.path.split(dst)
+        names = self._taken.get(directory)
+        if names is None:
+            return
+        names.discard(os.path.normcase(name))
+        # restart the counters so the freed slot can be handed out again
+        self._counters[directory].clear()
@@ -0,0 +1,257 @@
+"""
+Module running a clean as an asyncio producer/consumer pipeline.
+
+A scanner streams directory entries in small chunks, a classifier turns
+them into moves and mover tasks perform the renames, all at the same time
+and connected by bounded queues. Blocking filesystem calls run on thread
+pools, so the disk is kept busy while names are classified and the scanner
+keeps reading while files are moved. Memory is bounded by the queue sizes,
+not by the size of the largest directory.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+
+import stats
+from change_logger import ChangeLogger
+from change_logger_singleton import get_logger
+from move_executor import execute_moves
+from exclusions import ExclusionRules
+from folder_cleaner import DEFAULT_RULES
+from name_index import NameIndex
+from rules import RuleSet
+
+# directory entries read per executor call
+SCAN_CHUNK = 256
+
+# marks the end of a queue's input
+_DONE = None
+
+def _make_category_dirs(directory: str, categories: List[str]) -> List[str]:
+    """Create the missing category folders of a directory and return the ones created."""
+    created = []
+    for category in categories:
+        path = os.path.join(directory, category)
+        try:
+            os.mkdir(path)
+            created.append(path)
+        except FileExistsError:
+            pass
+    return created
+
+def _read_chunk(entries: Iterator[os.DirEntry]) -> List[Tuple[str, bool]]:
+    """Read the next chunk of a directory as (name, is_dir) pairs."""
+    chunk = []
+    for entry in islice(entries, SCAN_CHUNK):
+        try:
+            if entry.is_file():
+                chunk.append((entry.name, False))
+            elif entry.is_dir():
+                chunk.append((entry.name, True))
+        except OSError:  # entry vanished or is unreadable, skip it
+            continue
+    return chunk
+
+def _file_sizes(directory: str, files: List[str]) -> List[Optional[int]]:
+    """Stat a chunk of files for size rules, with None for files that can't be read."""
+    sizes = []
+    for file in files:
+        stats.count('stat')
+        try:
+            sizes.append(os.stat(os.path.join(directory, file)).st_size)
+        except OSError:
+            sizes.append(None)
+    return sizes
+
+class Pipeline:
+    """
+    Scanner -> classifier -> movers, connected by bounded asyncio queues.
+
+    Only the event loop thread touches the change logger; worker threads
+    perform the filesystem calls, including the one listing of each category
+    folder that the name index needs before its first reservation. Moves are logged as
+    they complete, so with several movers the log order may differ between
+    runs (reverting is unaffected, as destinations are unique).
+    """
+
+    def __init__(self, base_path: str, recursive: bool = False, recursionDepth: int = -1,
+                 workers: int = 1, rules: Optional[RuleSet] = None, queue_size: int = 64,
+                 logger: Optional[ChangeLogger] = None, exclusions: Optional[ExclusionRules] = None):
+        """
+        Args:
+            base_path: Directory to organize
+            recursive: Whether to process subdirectories
+            recursionDepth: How deep to recurse (-1 for infinite)
+            workers: Number of concurrent movers
+            rules: Categorization rules (defaults to the built-in extension sets)
+            queue_size: Capacity of each queue, in chunks of up to SCAN_CHUNK
+                entries (the move queue holds this many per mover)
+            logger: Change logger of the run (defaults to the global one)
+            exclusions: Optional gitignore-style rules; excluded files are
+                never queued and excluded subdirectories are never listed
+        """
+        self.base_path = base_path
+        self.max_depth = recursionDepth if recursive else 0
+        self.workers = max(1, workers)
+        self.rules = rules or DEFAULT_RULES
+        self.queue_size = queue_size
+        self.name_index = NameIndex()
+        self.logger = logger or get_logger()
+        self.exclusions = exclusions
+        self.moved = 0
+        self.failed = 0
+
+    async def _scan(self, loop: asyncio.AbstractEventLoop, pool: ThreadPoolExecutor,
+                    chunks: 'asyncio.Queue') -> None:
+        """Walk the tree, streaming each directory's file names in chunks."""
+        categories = list(self.rules.categories)
+        category_names = tuple(categories)
+        logger = self.logger
+        exclusions = self.exclusions
+        stack = [(self.base_path, self.max_depth)]
+        while stack:
+            directory, remaining = stack.pop()
+            try:
+                for path in await loop.run_in_executor(pool, _make_category_dirs, directory, categories):
+                    logger.log_folder_creation(path)
+                stats.count('listdir')
+                entries = await loop.run_in_executor(pool, os.scandir, directory)
+            except OSError as e:
+                print(f"Error scanning {directory}: {e}")
+                continue
+            subdirs = []
+            try:
+                while True:
+                    chunk = await loop.run_in_executor(pool, _read_chunk, entries)
+                    if not chunk:
+                        break
+                    files = [name for name, is_dir in chunk if not is_dir]
+                    if exclusions is not None:
+                        files = exclusions.filter_files(directory, files)
+                    if files:
+                        await chunks.put((directory, files))  # waits while the classifier is behind
+                    if remaining != 0:
+                        subdirs += [name for name, is_dir in chunk
+                                    if is_dir and not name.endswith(category_names)]
+            finally:
+                entries.close()
+            subdir_paths = [os.path.join(directory, name) for name in subdirs]
+            if exclusions is not None:
+                subdir_paths = exclusions.prune(subdir_paths)
+            for path in reversed(subdir_paths):
+                stack.append((path, remaining - 1))
+        await chunks.put(_DONE)
+
+    async def _classify(self, loop: asyncio.AbstractEventLoop, pool: ThreadPoolExecutor,
+                        chunks: 'asyncio.Queue', moves: 'asyncio.Queue') -> None:
+        """Classify streamed names and reserve a unique destination for each."""
+        name_index = self.name_index
+        classify = self.rules.classify
+        needs_size = self.rules.needs_size
+        primed = set()
+        unusable = set()
+        while True:
+            item = await chunks.get()
+            if item is _DONE:
+                break
+            directory, files = item
+            stats.count('files', len(files))
+            files = [file for file in files if not file.startswith('.')]  # skip hidden files
+            if needs_size:
+                sizes = await loop.run_in_executor(pool, _file_sizes, directory, files)
+            else:
+                sizes = [None] * len(files)
+            batch = []
+            for file, size in zip(files, sizes):
+                category_dir = os.path.join(directory, classify(file, size))
+                if category_dir in unusable:
+                    self.failed += 1
+                    continue
+                try:
+                    if category_dir not in primed:
+                        # the first reservation lists the folder, so do it off the event loop
+                        dst = await loop.run_in_executor(pool, name_index.reserve, os.path.join(category_dir, file))
+                        primed.add(category_dir)
+                    else:
+                        dst = name_index.reserve(os.path.join(category_dir, file))
+                except OSError as e:  # e.g. a file is in the way of the category folder
+                    self.failed += 1
+                    unusable.add(category_dir)
+                    print(f"Error moving {file}: {e}")
+                    continue
+                batch.append((os.path.join(directory, file), dst))
+            if batch:
+                await moves.put(batch)  # waits while the movers are behind
+        for _ in range(self.workers):
+            await moves.put(_DONE)
+
+    async def _move(self, loop: asyncio.AbstractEventLoop, pool: ThreadPoolExecutor,
+                    moves: 'asyncio.Queue') -> None:
+        """Perform queued batches of moves and log each one that succeeds."""
+        logger = self.logger
+        while True:
+            batch = await moves.get()
+            if batch is _DONE:
+                return
+            while batch:
+                logger.log_intents(batch)
+                errors = await loop.run_in_executor(pool, execute_moves, batch)
+                retry = []
+                for (src, dst), error in zip(batch, errors):
+                    if error is None:
+                        self.moved += 1
+                        logger.log_move(src, dst)
+                    elif isinstance(error, FileExistsError):
+                        # created by someone else since the index was built; dst stays taken
+                        retry.append((src, self.name_index.reserve(dst)))
+                    else:
+                        self.failed += 1
+                        self.name_index.release(dst)
+                        print(f"Error moving {os.path.basename(src)}: {error}")
+                batch = retry
+
+    async def run(self) -> None:
+        """Run all stages until every file has been processed."""
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        moves: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size * self.workers)
+        scan_pool = ThreadPoolExecutor(max_workers=2)  # scanner and classifier
+        move_pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            await asyncio.gather(self._scan(loop, scan_pool, chunks),
+                                 self._classify(loop, scan_pool, chunks, moves),
+                                 *(self._move(loop, move_pool, moves) for _ in range(self.workers)))
+        finally:
+            scan_pool.shutdown()
+            move_pool.shutdown()
+
+def run_pipeline(base_path: str, recursive: bool = False, recursionDepth: int = -1,
+                 workers: int = 1, rules: Optional[RuleSet] = None, queue_size: int = 64,
+                 logger: Optional[ChangeLogger] = None, exclusions: Optional[ExclusionRules] = None) -> int:
+    """
+    Clean a folder with the pipelined scanner/classifier/movers and save the log.
+
+    Args:
+        base_path: Directory to organize
+        recursive: Whether to process subdirectories
+        recursionDepth: How deep to recurse (-1 for infinite)
+        workers: Number of concurrent movers
+        rules: Categorization rules (defaults to the built-in extension sets)
+        queue_size: Capacity of each queue
+        logger: Change logger of the run (defaults to the global one)
+        exclusions: Optional gitignore-style rules of what to leave alone
+
+    Returns:
+        Number of files that could not be moved
+    """
+    pipeline = Pipeline(base_path, recursive, recursionDepth, workers, rules, queue_size, logger, exclusions)
+    try:
+        asyncio.run(pipeline.run())
+    finally:
+        # save whatever was moved, even if the run was interrupted
+        log_file = pipeline.logger.save_log()
+        print(f"Changes logged to: {log_file}")
+    return pipeline.failed
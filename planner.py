@@ -0,0 +1,217 @@
+"""
+Module separating the cleaner into a planning phase and an execution phase.
+
+The planner scans, classifies and resolves every name conflict in memory and
+produces a MovePlan that can be saved, reviewed, diffed and applied later.
+The executor applies a plan without rescanning the source tree.
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from change_logger import ChangeLogger
+from change_logger_singleton import get_logger
+from content_sniffer import ContentSniffer
+from exclusions import ExclusionRules
+import filesystem
+from folder_cleaner import DEFAULT_RULES, categorize_files, get_unique_filename, scan_directory
+from move_executor import execute_moves
+from name_index import NameIndex
+from rules import RuleSet
+from stability import StabilityFilter
+from subfolders import SubfolderLayout, move_category
+
+PLAN_VERSION = 1
+
+class MovePlan:
+    """Folders to create and (source, destination) moves, in execution order."""
+
+    def __init__(self, base_path: str, create_directories: Optional[List[str]] = None,
+                 moves: Optional[List[Tuple[str, str]]] = None, created: Optional[str] = None):
+        self.base_path = base_path
+        self.create_directories = create_directories if create_directories is not None else []
+        self.moves = moves if moves is not None else []
+        self.created = created or datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    def save(self, plan_file: str) -> None:
+        """
+        Write the plan as JSON with one move per line, so two plans diff cleanly.
+
+        Args:
+            plan_file: Path of the file to write
+        """
+        with open(plan_file, 'w') as f:
+            f.write('{\n')
+            f.write(f'  "version": {PLAN_VERSION},\n')
+            f.write(f'  "base_path": {json.dumps(self.base_path)},\n')
+            f.write(f'  "created": {json.dumps(self.created)},\n')
+            f.write('  "create_directories": [')
+            f.write(','.join(f'\n    {json.dumps(path)}' for path in self.create_directories))
+            f.write('\n  ],\n' if self.create_directories else '],\n')
+            f.write('  "moves": [')
+            f.write(','.join(f'\n    {json.dumps([src, dst])}' for src, dst in self.moves))
+            f.write('\n  ]\n}\n' if self.moves else ']\n}\n')
+
+    @classmethod
+    def load(cls, plan_file: str) -> 'MovePlan':
+        """
+        Read a plan written by save.
+
+        Args:
+            plan_file: Path of the plan file
+
+        Returns:
+            The loaded plan
+        """
+        with open(plan_file, 'r') as f:
+            data = json.load(f)
+        if data.get("version") != PLAN_VERSION:
+            raise ValueError(f"Unsupported plan version: {data.get('version')}")
+        return cls(data["base_path"], data["create_directories"],
+                   [(src, dst) for src, dst in data["moves"]], data["created"])
+
+    def summary(self) -> Dict[str, int]:
+        """Count planned moves per destination folder name."""
+        counts: Dict[str, int] = {}
+        for src, dst in self.moves:
+            category = move_category(src, dst)
+            counts[category] = counts.get(category, 0) + 1
+        return counts
+
+def build_plan(base_path: str, recursive: bool = False, recursionDepth: int = -1,
+               rules: Optional[RuleSet] = None, sniffer: Optional[ContentSniffer] = None,
+               stability: Optional[StabilityFilter] = None,
+               layout: Optional[SubfolderLayout] = None,
+               exclusions: Optional[ExclusionRules] = None) -> MovePlan:
+    """
+    Scan a folder and plan every move without touching the filesystem.
+
+    Category folders that don't exist yet are planned for creation, and name
+    conflicts are resolved against an in-memory index that also contains
+    the destinations planned so far.
+
+    Args:
+        base_path: Directory to organize
+        recursive: Whether to process subdirectories
+        recursionDepth: How deep to recurse (-1 for infinite)
+        rules: Categorization rules (defaults to the built-in extension sets)
+        sniffer: Optional content sniffer for files with unknown extensions
+        stability: Optional filter leaving files that are still being
+            downloaded out of the plan
+        layout: Optional layout placing files in subfolders of their
+            category folder
+        exclusions: Optional gitignore-style rules; excluded files are left
+            out of the plan and excluded subdirectories are never listed
+
+    Returns:
+        The plan
+    """
+    rules = rules or DEFAULT_RULES
+    category_names = tuple(rules.categories)
+    base_path = os.path.abspath(base_path)  # the plan may be applied from another working directory
+    plan = MovePlan(base_path)
+    name_index = NameIndex()
+
+    stack = [(base_path, recursionDepth if recursive else 0)]
+    while stack:
+        directory, remaining = stack.pop()
+        try:
+            files, subdirs = scan_directory(directory)
+        except OSError as e:
+            print(f"Error scanning {directory}: {e}")
+            continue
+        existing = {entry.name for entry in subdirs}
+        for category in category_names:
+            if category not in existing:
+                plan.create_directories.append(os.path.join(directory, category))
+
+        names = [entry.name for entry in files]
+        if exclusions is not None:
+            names = exclusions.filter_files(directory, names)
+        file_map = categorize_files(names, rules, directory)
+        if stability is not None:
+            stability.filter(directory, file_map)
+        if sniffer is not None:
+            sniffer.reclassify(directory, file_map, rules.default)
+        for category, names in file_map.items():
+            category_dir = os.path.join(directory, category)
+            for name in names:
+                src = os.path.join(directory, name)
+                target_dir = category_dir
+                if layout is not None:
+                    try:
+                        target_dir = layout.directory(category_dir, src)
+                    except OSError as e:
+                        print(f"Error planning {src}: {e}")
+                        continue
+                    if target_dir not in layout.ready:
+                        layout.ready.add(target_dir)
+                        if not filesystem.backend.isdir(target_dir):
+                            plan.create_directories.append(target_dir)
+                dst = get_unique_filename(os.path.join(target_dir, name), name_index)
+                plan.moves.append((src, dst))
+
+        if remaining != 0:
+            subdir_paths = [entry.path for entry in subdirs if not entry.name.endswith(category_names)]
+            if exclusions is not None:
+                subdir_paths = exclusions.prune(subdir_paths)
+            # reversed so subdirectories are planned in scan order
+            stack.extend((path, remaining - 1) for path in reversed(subdir_paths))
+    return plan
+
+def _taken_names(directories: Set[str]) -> Set[str]:
+    """List each destination folder once and return the paths of everything in them."""
+    taken = set()
+    for directory in directories:
+        try:
+            with filesystem.backend.scandir(directory) as entries:
+                taken.update(entry.path for entry in entries)
+        except FileNotFoundError:
+            continue
+    return taken
+
+def execute_plan(plan: MovePlan, workers: int = 1, logger: Optional[ChangeLogger] = None) -> int:
+    """
+    Apply a plan: create the planned folders, then perform the moves.
+
+    The source tree is not rescanned and sources are not probed one by one.
+    Each destination folder is listed once, so a plan applied some time
+    after it was made never overwrites a file that has appeared since;
+    such moves are reported and skipped.
+
+    Args:
+        plan: The plan to apply
+        workers: Number of threads performing renames
+        logger: Change logger of the run (defaults to the global one)
+
+    Returns:
+        Number of planned moves that were not performed
+    """
+    logger = logger or get_logger()
+    for directory in plan.create_directories:
+        try:
+            filesystem.backend.mkdir(directory)
+            logger.log_folder_creation(directory)
+        except FileExistsError:
+            pass
+
+    taken = _taken_names({os.path.dirname(dst) for _, dst in plan.moves})
+    moves = []
+    skipped = 0
+    for src, dst in plan.moves:
+        if dst in taken:
+            print(f"Skipping {src}: {dst} already exists")
+            skipped += 1
+        else:
+            moves.append((src, dst))
+
+    logger.log_intents(moves)
+    errors = execute_moves(moves, workers)
+    for (src, dst), error in zip(moves, errors):
+        if error is None:
+            logger.log_move(src, dst)
+        else:
+            print(f"Error moving {os.path.basename(src)}: {error}")
+    return skipped + sum(error is not None for error in errors)
@@ -0,0 +1,61 @@
+"""Module settling the moves an interrupted run left half done, so the run can be resumed."""
+
+import glob
+import os
+from typing import Tuple
+
+from change_logger import ChangeLogger
+
+def _same_file_data(src: str, dst: str) -> bool:
+    """Check whether dst is a finished copy of src (the copy fallback keeps size and mtime)."""
+    try:
+        src_stat, dst_stat = os.stat(src), os.stat(dst)
+    except OSError:
+        return False
+    return src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+
+def _remove_partial_copies(dst: str) -> None:
+    """Remove temporary files left by a cross-device copy to dst that was cut short."""
+    dst_dir, name = os.path.split(dst)
+    for tmp in glob.glob(os.path.join(glob.escape(dst_dir), f".{glob.escape(name)}.*.partial")):
+        try:
+            os.remove(tmp)
+        except OSError as e:
+            print(f"Error removing {tmp}: {e}")
+
+def reconcile(logger: ChangeLogger) -> Tuple[int, int]:
+    """
+    Settle the moves of a resumed journal that were intended but never confirmed.
+
+    For every pending move:
+    - only the destination exists: the rename happened, so it is logged
+    - both exist and the destination is a finished cross-device copy of the
+      source: the source is removed and the move is logged
+    - otherwise the move did not happen; the file stays where it is and is
+      picked up again when its directory is cleaned
+
+    Args:
+        logger: Logger returned by ChangeLogger.resume
+
+    Returns:
+        Tuple of (moves completed, moves that did not happen)
+    """
+    completed = not_done = 0
+    for src, dst in logger.pending.items():
+        _remove_partial_copies(dst)
+        if os.path.lexists(dst) and not os.path.lexists(src):
+            logger.log_move(src, dst)
+            completed += 1
+        elif os.path.lexists(dst) and _same_file_data(src, dst):
+            try:
+                os.remove(src)
+            except OSError as e:
+                print(f"Error finishing move of {os.path.basename(src)}: {e}")
+                not_done += 1
+                continue
+            logger.log_move(src, dst)
+            completed += 1
+        else:
+            not_done += 1
+    logger.pending = {}
+    return completed, not_done
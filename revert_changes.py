@@ -1,58 +1,262 @@
 """Script to revert changes made by the Download Folder Cleaner."""
 
-import json
 import os
 import argparse
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from catalog import Catalog, default_catalog_path
+from change_logger import Change, iter_changes
+from file_ops import DirectoryFds, SharedDirectoryFds
+import filesystem
+import stats
 
-def revert_changes(log_file: str) -> None:
-    """Revert changes from a log file."""
-    with open(log_file, 'r') as f:
-        data = json.load(f)
+# print a progress line every this many reverted records
+PROGRESS_INTERVAL = 10000
 
-    changes: List[Dict[str, str]] = data["changes"]
-    
-    # Revert in reverse order to handle any potential cascading moves
-    for change in reversed(changes):
-        src = change["source"]
-        dst = change["destination"]
-        type = change.get("Type")
+def _plan_waves(changes: Iterable[Change]) -> Tuple[List[List[Change]], List[str]]:
+    """
+    Split the file changes of a log (newest first) into waves of independent work.
+
+    A change goes into the wave after the last one that touched either of
+    its paths, so changes that share a path keep their reverse order while
+    everything else runs in the first wave.
 
+    Returns:
+        Tuple of (waves of move/hardlink changes, folders created by the run)
+    """
+    waves: List[List[Change]] = []
+    last_wave: Dict[str, int] = {}
+    folders: List[str] = []
+    for change in changes:
+        type, src, dst = change
         if type == "folder_creation":
-            # Remove the created folder if it's empty
-            if os.path.exists(dst) and os.path.isdir(dst) and not os.listdir(dst):
-                try:
-                    os.rmdir(dst)
-                    print(f"Removed empty folder: {dst}")
-                except Exception as e:
-                    print(f"Error removing folder {dst}: {e}")
-            continue  # Skip to next change
-
-        if type == "move" and os.path.exists(dst):
-            try:
-                # Ensure the original directory exists
-                os.makedirs(os.path.dirname(src), exist_ok=True)
-                os.rename(dst, src)
-                print(f"Reverted: {dst} -> {src}")
-            except Exception as e:
-                print(f"Error reverting {dst}: {e}")
+            folders.append(dst)
+            continue
+        if type not in ("move", "hardlink"):
+            continue  # e.g. duplicate_skipped: nothing was changed
+        paths = (src, dst) if type == "move" else (dst,)
+        wave = max((last_wave.get(path, -1) for path in paths), default=-1) + 1
+        for path in paths:
+            last_wave[path] = wave
+        if wave == len(waves):
+            waves.append([])
+        waves[wave].append(change)
+    return waves, folders
+
+def _existing_paths(directories: Set[str]) -> Set[str]:
+    """List each directory once and return the paths of all entries in them."""
+    existing = set()
+    for directory in directories:
+        stats.count('listdir')
+        try:
+            with filesystem.backend.scandir(directory) as entries:
+                existing.update(entry.path for entry in entries)
+        except OSError:
+            continue
+    return existing
+
+def _create_parents(changes: List[Change]) -> None:
+    """Ensure the original directory of every move exists, creating each one once."""
+    for parent in sorted({os.path.dirname(src) for type, src, _ in changes if type == "move"}):
+        try:
+            filesystem.backend.makedirs(parent, exist_ok=True)
+        except OSError as e:
+            print(f"Error creating folder {parent}: {e}")
+
+def _revert_one(change: Change, dir_fds: Optional[DirectoryFds] = None) -> str:
+    """Revert a single move or hardlink; returns an error message or an empty string."""
+    type, src, dst = change
+    try:
+        if type == "hardlink":
+            # Give the deduplicated file its own copy of the data again
+            stats.count('stat')
+            if filesystem.backend.stat(dst).st_nlink > 1:
+                tmp = dst + '.revert-tmp'
+                filesystem.backend.copy(dst, tmp)
+                filesystem.backend.replace(tmp, dst)
         else:
-            print(f"Warning: File not found: {dst}")
-        
+            filesystem.backend.move(dst, src, dir_fds)
+    except FileNotFoundError:
+        return f"Warning: File not found: {dst}"
+    except Exception as e:
+        return f"Error reverting {dst}: {e}"
+    return ""
+
+def _revert_waves(waves: List[List[Change]], workers: int = 1,
+                  done: Optional[List[Change]] = None) -> Tuple[int, int, int]:
+    """
+    Revert planned waves in order, each one concurrently on a thread pool.
+
+    Args:
+        waves: Output of _plan_waves
+        workers: Number of threads performing renames (1 for serial)
+        done: Optional list that successfully reverted changes are appended to
+
+    Returns:
+        Tuple of (reverted, missing, failed) counts
+    """
+    total = sum(len(wave) for wave in waves)
+    reverted = missing = failed = 0
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    dir_fds: Optional[DirectoryFds] = None
+    if filesystem.backend.supports_dir_fd:
+        dir_fds = SharedDirectoryFds(workers) if pool is not None else DirectoryFds()
+    try:
+        for i, wave in enumerate(waves):
+            todo = wave
+            if i == 0:
+                # later waves may need paths that earlier waves just recreated, so only the first is prechecked
+                with stats.timer('revert_precheck'):
+                    existing = _existing_paths({os.path.dirname(dst) for _, _, dst in wave})
+                todo = [change for change in wave if change[2] in existing]
+                missing += len(wave) - len(todo)
+            with stats.timer('revert_parents'):
+                _create_parents(todo)
+
+            with stats.timer('revert_rename'):
+                results = (pool.map(_revert_one, todo, repeat(dir_fds)) if pool is not None
+                           else map(_revert_one, todo, repeat(dir_fds)))
+                for change, message in zip(todo, results):
+                    if not message:
+                        reverted += 1
+                        if done is not None:
+                            done.append(change)
+                    elif message.startswith("Warning"):
+                        missing += 1
+                    else:
+                        failed += 1
+                        print(message)
+                    processed = reverted + missing + failed
+                    if processed % PROGRESS_INTERVAL == 0:
+                        print(f"Progress: {processed}/{total} changes processed")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if dir_fds is not None:
+            dir_fds.close()
+    return reverted, missing, failed
+
+def _mark_catalog(log_file: str, catalog_path: Optional[str], done: Optional[List[Change]]) -> None:
+    """Flag the reverted changes of a log in the catalog, if there is one (done=None for the whole run)."""
+    catalog_path = catalog_path or default_catalog_path()
+    if not os.path.exists(catalog_path):
+        return
+    try:
+        with Catalog(catalog_path) as catalog:
+            catalog.mark_run_reverted(log_file, done)
+    except Exception as e:
+        print(f"Error updating catalog {catalog_path}: {e}")
+
+def revert_changes(log_file: str, workers: int = 1, catalog_path: Optional[str] = None) -> None:
+    """
+    Revert changes from a log file (.json log or .jsonl journal, optionally compressed).
+
+    Moves are grouped so that each directory is listed once to check which
+    files are still there, every missing parent directory is created once,
+    and renames that don't share a path run concurrently on a thread pool.
+    Changes touching the same path are still reverted newest first. Progress
+    is reported as running totals rather than one line per file. When a
+    catalog exists, the run's changes are flagged as reverted in it.
+
+    Args:
+        log_file: Path to the change log
+        workers: Number of threads performing renames (1 for serial)
+        catalog_path: Catalog to update (defaults to logs/catalog.sqlite3)
+    """
+    # Revert in reverse order to handle any potential cascading moves
+    with stats.timer('revert_read_log'):
+        waves, folders = _plan_waves(iter_changes(log_file, reverse=True))
+    total = sum(len(wave) for wave in waves)
+    done: List[Change] = []
+    reverted, missing, failed = _revert_waves(waves, workers, done)
+
+    # Remove the created folders if they're empty, deepest first; rmdir itself refuses non-empty ones
+    removed = 0
+    with stats.timer('revert_cleanup'):
+        for folder in sorted(set(folders), key=lambda path: path.count(os.sep), reverse=True):
+            try:
+                filesystem.backend.rmdir(folder)
+                removed += 1
+            except OSError:
+                continue
+
+    print(f"Reverted {reverted} of {total} changes ({missing} files not found, {failed} errors), "
+          f"removed {removed} empty folders")
+
+    # a fully reverted run is flagged as a whole, so rows of files that were already gone go too
+    _mark_catalog(log_file, catalog_path, done if failed else None)
+
     # Auto delete log file if reverted successfully
+    if failed:
+        print(f"Log file {log_file} kept because some changes could not be reverted.")
+        return
     try:
-        os.remove(log_file)
+        filesystem.backend.remove(log_file)
         print(f"Log file {log_file} deleted after successful reversion.")
     except Exception as e:
         print(f"Error deleting log file {log_file}: {e}")
-    
 
+def revert_selection(catalog_path: Optional[str] = None, pattern: Optional[str] = None,
+                     directory: Optional[str] = None, category: Optional[str] = None,
+                     since: Optional[str] = None, until: Optional[str] = None, workers: int = 1) -> None:
+    """
+    Revert only the catalogued changes matching a filter, across all runs.
+
+    The matching changes are found with indexed catalog queries (see
+    Catalog.select for the filters) instead of loading whole logs, and are
+    flagged as reverted in the catalog afterwards. Log files and category
+    folders are left in place, since other changes may still need them.
+
+    Args:
+        catalog_path: Catalog file (defaults to logs/catalog.sqlite3)
+        pattern: Glob matched against file names or full source paths
+        directory: Only files that came from this directory
+        category: Only files moved into this category
+        since: Only runs at or after YYYYMMDD[_HHMMSS]
+        until: Only runs at or before YYYYMMDD[_HHMMSS]
+        workers: Number of threads performing renames (1 for serial)
+    """
+    with Catalog(catalog_path) as catalog:
+        rows = catalog.select(pattern, directory, category, since, until)
+        row_ids: Dict[Change, List[int]] = {}
+        for row_id, change_type, src, dst, _ in rows:
+            row_ids.setdefault((change_type, src, dst), []).append(row_id)
+
+        waves, _ = _plan_waves((change_type, src, dst) for _, change_type, src, dst, _ in rows)
+        done: List[Change] = []
+        reverted, missing, failed = _revert_waves(waves, workers, done)
+        catalog.mark_reverted(row_ids[change].pop() for change in done)
 
+    print(f"Reverted {reverted} of {len(rows)} matching changes ({missing} files not found, {failed} errors)")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Revert changes made by Download Folder Cleaner")
-    parser.add_argument('log_file', type=str, help='Path to the change log file')
+    parser.add_argument('log_file', type=str, nargs='?', default=None, help='Path to the change log file')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of threads performing renames (useful on network shares, default 1)')
+    parser.add_argument('--catalog', type=str, default=None,
+                        help='Catalog to revert matching changes from, or to update after reverting a whole log '
+                             '(default: logs/catalog.sqlite3)')
+    parser.add_argument('--glob', type=str, default=None,
+                        help='(catalog) Glob matched against file names, or full source paths if it contains a separator')
+    parser.add_argument('--directory', type=str, default=None, help='(catalog) Only files that came from this directory')
+    parser.add_argument('--category', type=str, default=None, help='(catalog) Only files moved into this category')
+    parser.add_argument('--since', type=str, default=None, help='(catalog) Only runs at or after YYYYMMDD[_HHMMSS]')
+    parser.add_argument('--until', type=str, default=None, help='(catalog) Only runs at or before YYYYMMDD[_HHMMSS]')
+    parser.add_argument('--stats', action='store_true', help='Print phase timings and syscall counters at the end')
+    parser.add_argument('--stats-json', type=str, default=None, metavar='PATH',
+                        help='Write phase timings and syscall counters as JSON to PATH')
     args = parser.parse_args()
+    if args.stats or args.stats_json:
+        stats.enable_stats()
 
-    revert_changes(args.log_file)
+    if args.log_file:
+        revert_changes(args.log_file, args.workers, args.catalog)
+    elif args.catalog or args.glob or args.directory or args.category or args.since or args.until:
+        revert_selection(args.catalog, args.glob, args.directory, args.category, args.since, args.until,
+                         args.workers)
+    else:
+        parser.error("give a log file, or catalog filters to revert a selection")
+    stats.finish(args.stats, args.stats_json)
     print("Reversion complete!")
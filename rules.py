@@ -0,0 +1,416 @@
+"""Module compiling categorization rules into a single lookup table."""
+
+import fnmatch
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_CATEGORY = 'Others'
+
+# a glob such as "*.epub" that only constrains the extension
+_EXTENSION_GLOB = re.compile(r'^\*(\.[^*?\[\]./\\]+)$')
+
+# pattern groups at or below this size are matched with a single combined regex
+_LEAF_SIZE = 8
+_REGEX_SPECIAL = set('.^$*+?{}[]|()')
+_QUANTIFIERS = set('*+?{')
+
+# the only characters outside ASCII that a case-insensitive re pattern matches with an ASCII
+# character (dotted and dotless I, long s, Kelvin sign), mapped to that character
+_CASE_TWINS = {'\u0130': 'i', '\u0131': 'i', '\u017f': 's', '\u212a': 'k'}
+_FOLD_TABLE = str.maketrans(_CASE_TWINS)
+# length of the substrings rules that can match anywhere in a name are indexed by
+_GRAM = 3
+# leading parts of a pattern that let its literal start anywhere in the name
+_ANYWHERE = ('(?>.*?', '.*?', '.*', '.+?', '.+')
+
+def _literal_prefix(regex: str) -> str:
+    """
+    Return the literal text every match of regex must start with.
+
+    Conservative: stops at the first construct it doesn't understand, so the
+    result may be shorter than the true prefix but never wrong.
+    """
+    if '|' in re.sub(r'\\.', '', regex):  # an alternation may match without the prefix
+        return ''
+    if regex.startswith('(?s:'):  # the wrapper fnmatch.translate puts around globs
+        regex = regex[4:]
+    prefix = []
+    i = 0
+    while i < len(regex):
+        char = regex[i]
+        if char == '\\':
+            if i + 1 >= len(regex) or regex[i + 1].isalnum():  # \d, \w, \1 ... are not literals
+                break
+            char = regex[i + 1]
+            i += 2
+        elif char in _REGEX_SPECIAL:
+            break
+        else:
+            i += 1
+        if i < len(regex) and regex[i] in _QUANTIFIERS:  # the last literal is optional or repeated
+            break
+        prefix.append(char)
+    return ''.join(prefix)
+
+def _rule_literal(regex: str) -> Tuple[str, bool, bool]:
+    """
+    Return the literal text every match of a pattern rule contains, and how.
+
+    Returns:
+        Tuple of (literal, ignore_case, anywhere): when ignore_case is set
+        the literal is lowercased and only holds ASCII characters;
+        when anywhere is set the literal may appear anywhere in the name
+        rather than at its start
+    """
+    ignore_case = regex.startswith('(?i:')  # the wrapper from_config puts around ignore_case rules
+    if ignore_case:
+        regex = regex[4:]
+    if regex.startswith('(?s:'):
+        regex = regex[4:]
+    anywhere = False
+    for lead in _ANYWHERE:
+        if regex.startswith(lead):
+            regex = regex[len(lead):]
+            anywhere = True
+            break
+    literal = _literal_prefix(regex)
+    if ignore_case:
+        safe = []
+        for char in literal:
+            if not char.isascii():
+                break
+            safe.append(char.lower())
+        literal = ''.join(safe)
+    return literal, ignore_case, anywhere
+
+class _PatternNode:
+    """
+    Node of a trie over the literal prefixes of the pattern rules.
+
+    Walking a filename down the trie narrows the rules to those that can
+    still match it, so each lookup only runs a small combined regex no
+    matter how many pattern rules exist. Every node keeps its rules in
+    priority order, so the first matching rule still wins.
+    """
+
+    __slots__ = ('regex', 'children', 'fallback', 'fold')
+
+    def __init__(self, rules: List[Tuple[int, str, str]], depth: int = 0, fold: bool = False):
+        """
+        Args:
+            rules: (rule index, regex, literal prefix) in priority order
+            depth: Number of prefix characters already consumed by the parents
+            fold: Prefixes are lowercased, so filenames are walked lowercased too
+        """
+        self.children: Optional[Dict[str, '_PatternNode']] = None
+        self.fallback: Optional['_PatternNode'] = None
+        self.regex = None
+        self.fold = fold
+        longer = [rule for rule in rules if len(rule[2]) > depth]
+        if len(rules) <= _LEAF_SIZE or not longer:
+            if rules:
+                # the empty marker group closes last, so match.lastgroup names the rule that matched
+                self.regex = re.compile('|'.join(f'(?:{regex})(?P<r{i}>)' for i, regex, _ in rules))
+            return
+
+        shorter = [rule for rule in rules if len(rule[2]) <= depth]
+        self.children = {}
+        for char in dict.fromkeys(rule[2][depth] for rule in longer):
+            self.children[char] = _PatternNode(
+                [rule for rule in rules if len(rule[2]) <= depth or rule[2][depth] == char], depth + 1, fold)
+        self.fallback = _PatternNode(shorter, depth + 1, fold)
+
+    def match(self, file: str) -> Optional[int]:
+        """Return the index of the first rule matching file, or None."""
+        node = self
+        depth = 0
+        fold = self.fold
+        while node.children is not None:
+            if depth < len(file):
+                char = file[depth]
+                if fold:
+                    # prefixes are ASCII, so only ASCII letters and their few twins need folding
+                    char = _CASE_TWINS.get(char) or char.lower()
+                child = node.children.get(char)
+            else:
+                child = None
+            node = child if child is not None else node.fallback
+            depth += 1
+        if node.regex is None:
+            return None
+        match = node.regex.match(file)
+        return int(match.lastgroup[1:]) if match is not None else None
+
+class _LiteralIndex:
+    """
+    Index of pattern rules that can match anywhere in a name, such as "*tag*".
+
+    Each rule is filed under the rarest substring of _GRAM characters of
+    the literal it has to contain. A lookup collects the rules filed under
+    the substrings of the name and only runs their regexes, in priority
+    order, so its cost follows the number of plausible rules rather than
+    the number of rules.
+    """
+
+    def __init__(self, rules: List[Tuple[int, str, str, bool]]):
+        """
+        Args:
+            rules: (rule index, regex, literal, ignore_case) with literals of at least _GRAM characters
+        """
+        counts: Dict[Tuple[str, bool], int] = {}
+        for _, _, literal, ignore_case in rules:
+            for start in range(len(literal) - _GRAM + 1):
+                key = (literal[start:start + _GRAM], ignore_case)
+                counts[key] = counts.get(key, 0) + 1
+        self.exact: Dict[str, List[int]] = {}
+        self.folded: Dict[str, List[int]] = {}
+        self.regexes: Dict[int, 're.Pattern[str]'] = {}
+        for i, regex, literal, ignore_case in rules:
+            gram = min((literal[start:start + _GRAM] for start in range(len(literal) - _GRAM + 1)),
+                       key=lambda gram: counts[(gram, ignore_case)])
+            (self.folded if ignore_case else self.exact).setdefault(gram, []).append(i)
+            self.regexes[i] = re.compile(regex)
+
+    def match(self, file: str, before: Optional[int] = None) -> Optional[int]:
+        """Return the index of the first rule matching file, considering only rules before index before."""
+        candidates = set()
+        if self.exact:
+            exact = self.exact
+            for gram in exact.keys() & {file[start:start + _GRAM] for start in range(len(file) - _GRAM + 1)}:
+                candidates.update(exact[gram])
+        if self.folded:
+            folded = self.folded
+            lowered = file.translate(_FOLD_TABLE).lower()
+            if len(lowered) != len(file):  # a character lowercased into several; rare, so try them all
+                grams = folded.keys()
+            else:
+                grams = folded.keys() & {lowered[start:start + _GRAM] for start in range(len(lowered) - _GRAM + 1)}
+            for gram in grams:
+                candidates.update(folded[gram])
+        for i in sorted(candidates):
+            if before is not None and i >= before:
+                break
+            if self.regexes[i].match(file):
+                return i
+        return None
+
+class _PatternIndex:
+    """
+    All pattern rules, split by how their literal text can be indexed.
+
+    Rules with a literal prefix go into a prefix trie, case-sensitive or
+    lowercased; rules whose literal may appear anywhere go into a
+    _LiteralIndex; the rest share the case-sensitive trie's root. Each part
+    returns its first matching rule and the lowest index overall wins.
+    """
+
+    def __init__(self, rules: List[Tuple[int, str]]):
+        """
+        Args:
+            rules: (rule index, regex) in priority order
+        """
+        exact: List[Tuple[int, str, str]] = []
+        folded: List[Tuple[int, str, str]] = []
+        anywhere: List[Tuple[int, str, str, bool]] = []
+        for i, regex in rules:
+            literal, ignore_case, unanchored = _rule_literal(regex)
+            if unanchored:
+                if len(literal) >= _GRAM:
+                    anywhere.append((i, regex, literal, ignore_case))
+                else:
+                    exact.append((i, regex, ''))
+            elif ignore_case and literal:
+                folded.append((i, regex, literal))
+            else:
+                exact.append((i, regex, '' if ignore_case else _literal_prefix(regex)))
+        self.tries = [_PatternNode(part, fold=fold) for part, fold in ((exact, False), (folded, True)) if part]
+        self.literals = _LiteralIndex(anywhere) if anywhere else None
+
+    def match(self, file: str) -> Optional[int]:
+        """Return the index of the first rule matching file, or None."""
+        best = None
+        for trie in self.tries:
+            rule = trie.match(file)
+            if rule is not None and (best is None or rule < best):
+                best = rule
+        if self.literals is not None:
+            rule = self.literals.match(file, best)
+            if rule is not None:
+                best = rule
+        return best
+
+class RuleSet:
+    """
+    Compiled categorization rules.
+
+    Rules are checked in this order: name patterns (first matching rule
+    wins), size thresholds, extensions, and finally the default category.
+    Extension rules live in one dict. Glob patterns that only constrain the
+    extension and come after every other name pattern live in two more
+    (case-sensitive and case-insensitive), checked right after the other
+    patterns. The remaining name patterns are indexed by their literal
+    prefix (lowercased for case-insensitive rules) and compiled into
+    combined regexes, or, when they can match anywhere in the name, by a
+    substring of the literal they contain. Classifying a file therefore
+    costs a short trie walk, a few small regex matches and a few dict
+    lookups, however many rules are configured.
+    """
+
+    def __init__(self, extensions: Dict[str, str],
+                 patterns: Optional[List[Tuple[str, str]]] = None,
+                 size_rules: Optional[List[Tuple[int, Optional[int], str]]] = None,
+                 default: str = DEFAULT_CATEGORY,
+                 extension_patterns: Optional[List[Tuple[str, bool, str]]] = None):
+        """
+        Args:
+            extensions: Extension (with leading dot, any case) to category
+            patterns: (regex, category) pairs matched against the start of
+                the filename, in priority order
+            size_rules: (min size, max size or None, category) thresholds in bytes
+            default: Category for files no rule matches
+            extension_patterns: (extension, ignore case, category) of globs like
+                "*.pdf" that follow all patterns, in priority order
+        """
+        self.default = default
+        self.extensions = {ext.lower(): category for ext, category in extensions.items()}
+        self.size_rules = list(size_rules or [])
+        self.pattern_rules = list(patterns or [])
+        self._pattern_categories = [category for _, category in self.pattern_rules]
+        for regex, _ in self.pattern_rules:
+            re.compile(regex)  # report a broken rule on its own rather than inside a combined regex
+        self._patterns = _PatternIndex(list(enumerate(regex for regex, _ in self.pattern_rules)))
+        self.extension_patterns = list(extension_patterns or [])
+        # extension -> (priority, category); the earlier of an exact and a case-folded hit wins
+        self._exact_extensions: Dict[str, Tuple[int, str]] = {}
+        self._folded_extensions: Dict[str, Tuple[int, str]] = {}
+        for i, (ext, ignore_case, category) in enumerate(self.extension_patterns):
+            if ignore_case:
+                self._folded_extensions.setdefault(ext.lower(), (i, category))
+            else:
+                self._exact_extensions.setdefault(ext, (i, category))
+
+        categories = list(dict.fromkeys(self.extensions.values()))
+        categories += self._pattern_categories + [category for _, _, category in self.extension_patterns]
+        categories += [category for _, _, category in self.size_rules] + [default]
+        self.categories: List[str] = list(dict.fromkeys(categories))
+
+    @property
+    def needs_size(self) -> bool:
+        """Whether classification depends on file sizes."""
+        return bool(self.size_rules)
+
+    def classify(self, file: str, size: Optional[int] = None) -> str:
+        """
+        Return the category for a filename.
+
+        Args:
+            file: Name of the file
+            size: File size in bytes, required for size rules to apply
+
+        Returns:
+            Category name
+        """
+        if self.pattern_rules:
+            rule = self._patterns.match(file)
+            if rule is not None:
+                return self._pattern_categories[rule]
+        if self.extension_patterns:
+            # like the glob it came from, "*.pdf" also matches a file named just ".pdf"
+            dot = file.rfind('.')
+            if dot != -1:
+                ext = file[dot:]
+                exact = self._exact_extensions.get(ext)
+                folded = self._folded_extensions.get(ext.lower())
+                if exact is not None or folded is not None:
+                    return min(hit for hit in (exact, folded) if hit is not None)[1]
+        if size is not None:
+            for min_size, max_size, category in self.size_rules:
+                if size >= min_size and (max_size is None or size < max_size):
+                    return category
+        return self.extensions.get(os.path.splitext(file)[1].lower(), self.default)
+
+    @classmethod
+    def from_config(cls, data: dict, base: Optional['RuleSet'] = None) -> 'RuleSet':
+        """
+        Build a rule set from a parsed config.
+
+        Config layout::
+
+            {
+              "include_defaults": true,
+              "categories": {"Ebooks": [".epub", ".mobi"]},
+              "patterns": [
+                {"glob": "Screenshot*", "category": "Screenshots"},
+                {"regex": "invoice_\\\\d+", "category": "Invoices", "ignore_case": true}
+              ],
+              "size": [{"min_size": 1073741824, "category": "Large"}],
+              "default": "Others"
+            }
+
+        Args:
+            data: Parsed config
+            base: Rules to extend when "include_defaults" is true (the default)
+
+        Returns:
+            Compiled rule set
+        """
+        extensions: Dict[str, str] = {}
+        base_patterns: List[Tuple[str, str]] = []
+        base_extension_patterns: List[Tuple[str, bool, str]] = []
+        size_rules: List[Tuple[int, Optional[int], str]] = []
+        if base is not None and data.get("include_defaults", True):
+            extensions.update(base.extensions)
+            base_patterns = base.pattern_rules
+            base_extension_patterns = base.extension_patterns
+            size_rules.extend(base.size_rules)
+
+        for category, category_extensions in data.get("categories", {}).items():
+            for ext in category_extensions:
+                extensions[ext if ext.startswith('.') else '.' + ext] = category
+
+        for rule in data.get("size", []):
+            size_rules.append((int(rule.get("min_size", 0)), rule.get("max_size"), rule["category"]))
+
+        # (regex, category, extension or None) in priority order
+        rules: List[Tuple[str, str, Optional[str]]] = []
+        for rule in data.get("patterns", []):
+            ignore_case = bool(rule.get("ignore_case"))
+            extension = None
+            if "glob" in rule:
+                extension_only = _EXTENSION_GLOB.match(rule["glob"])
+                extension = extension_only.group(1) if extension_only else None
+                regex = fnmatch.translate(rule["glob"])
+            else:
+                regex = rule["regex"]
+            if ignore_case:
+                regex = f'(?i:{regex})'
+            rules.append((regex, rule["category"], extension and (extension, ignore_case)))
+
+        # extension globs at the end of the patterns can't be shadowed by a later
+        # pattern, so they become lookups; any earlier one stays a regex to keep its priority
+        extension_patterns: List[Tuple[str, bool, str]] = []
+        if not base_patterns:
+            while rules and rules[-1][2] is not None:
+                regex, category, (ext, ignore_case) = rules.pop()
+                extension_patterns.insert(0, (ext, ignore_case, category))
+        patterns = [(regex, category) for regex, category, _ in rules]
+
+        return cls(extensions, patterns + base_patterns, size_rules,
+                   data.get("default", base.default if base is not None else DEFAULT_CATEGORY),
+                   extension_patterns + base_extension_patterns)
+
+def load_rules(config_file: str, base: Optional[RuleSet] = None) -> RuleSet:
+    """
+    Load and compile rules from a JSON config file.
+
+    Args:
+        config_file: Path to the config file
+        base: Rules to extend unless the config sets "include_defaults" to false
+
+    Returns:
+        Compiled rule set
+    """
+    with open(config_file, 'r') as f:
+        return RuleSet.from_config(json.load(f), base)
@@ -0,0 +1,90 @@
+"""Module persisting per-directory scan state so unchanged subtrees can be skipped."""
+
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import stats
+
+STATE_VERSION = 1
+
+class ScanState:
+    """
+    Remembers each visited directory's inode and mtime together with the
+    outcome of the last run.
+
+    A directory whose entries are added, removed or renamed gets a new mtime,
+    so when the inode and mtime still match and the last run left the
+    directory clean (nothing moved, nothing failed) it can be skipped without
+    listing it. Its subdirectories are still visited from the stored list,
+    because changes inside them don't touch the parent's mtime.
+    """
+
+    def __init__(self, state_file: str):
+        self.state_file = state_file
+        self._previous: Dict[str, dict] = {}
+        self._current: Dict[str, dict] = {}
+        self._stats: Dict[str, Tuple[int, int]] = {}
+        self.skipped = 0
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as f:
+                data = json.load(f)
+            if data.get("version") == STATE_VERSION:
+                self._previous = data["directories"]
+
+    def unchanged_subdirs(self, path: str) -> Optional[List[str]]:
+        """
+        Check a directory against the previous run before it is listed.
+
+        Args:
+            path: Directory about to be cleaned
+
+        Returns:
+            Paths of the subdirectories recorded last run if the directory is
+            unchanged and was left clean, otherwise None (it must be scanned)
+        """
+        stats.count('stat')
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        self._stats[path] = (st.st_ino, st.st_mtime_ns)
+
+        previous = self._previous.get(path)
+        if (previous is None or previous["outcome"] != "clean"
+                or (previous["ino"], previous["mtime_ns"]) != self._stats[path]):
+            return None
+
+        self._current[path] = previous
+        self.skipped += 1
+        return [os.path.join(path, name) for name in previous["subdirs"]]
+
+    def record(self, path: str, subdirs: List[str], clean: bool) -> None:
+        """
+        Record the outcome of cleaning a directory.
+
+        The stat taken by unchanged_subdirs before the listing is stored, so
+        anything that lands in the directory after that point changes its
+        mtime and forces a rescan next time.
+
+        Args:
+            path: Directory that was cleaned
+            subdirs: Paths of the subdirectories to visit on later runs
+            clean: Whether the run left the directory untouched (no moves, no errors)
+        """
+        if path not in self._stats:
+            return
+        ino, mtime_ns = self._stats[path]
+        self._current[path] = {
+            "ino": ino,
+            "mtime_ns": mtime_ns,
+            "outcome": "clean" if clean else "changed",
+            "subdirs": [os.path.basename(subdir) for subdir in subdirs]
+        }
+
+    def save(self) -> None:
+        """Write the state of the directories visited this run, replacing the old file atomically."""
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({"version": STATE_VERSION, "directories": self._current}, f)
+        os.replace(tmp_file, self.state_file)
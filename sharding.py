@@ -0,0 +1,172 @@
+"""
+Module cleaning many roots, or the top-level subfolders of one root, on a
+process pool and merging the results into a single change log.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from change_logger import ChangeLogger, iter_changes
+from content_sniffer import ContentSniffer
+from exclusions import ExclusionRules
+from folder_cleaner import DEFAULT_RULES, main, scan_directory
+from rules import RuleSet
+from stability import StabilityFilter
+from subfolders import SubfolderLayout
+
+# (path, recursive, recursionDepth) of one unit of work
+Shard = Tuple[str, bool, int]
+
+def normalize_roots(roots: List[str]) -> List[str]:
+    """
+    Resolve roots to absolute real paths and drop repeated ones.
+
+    Args:
+        roots: Directories to clean
+
+    Returns:
+        The distinct roots, in their original order
+
+    Raises:
+        ValueError: If a root lies inside another one, as both shards would
+            then move the same files at the same time
+    """
+    normalized = []
+    seen = set()
+    for root in roots:
+        path = os.path.realpath(root)
+        key = os.path.normcase(path)
+        if key not in seen:
+            seen.add(key)
+            normalized.append(path)
+    # a root inside another sorts right after it, or after a root that is inside it too
+    ordered = sorted((os.path.join(os.path.normcase(path), ''), path) for path in normalized)
+    for (outer_key, outer), (inner_key, inner) in zip(ordered, ordered[1:]):
+        if inner_key.startswith(outer_key):
+            raise ValueError(f"Root {inner} is inside root {outer}")
+    return normalized
+
+def plan_shards(roots: List[str], recursive: bool = False, recursionDepth: int = -1,
+                auto_shard: bool = False, rules: Optional[RuleSet] = None,
+                exclusions: Optional[ExclusionRules] = None) -> List[Shard]:
+    """
+    Split the work into independent shards.
+
+    Each root is a shard. With auto_shard and a single recursive root, the
+    root's own files become one shard and every top-level subfolder becomes
+    another, cleaned with one level less of recursion, exactly as main
+    would have reached it.
+
+    Args:
+        roots: Directories to clean
+        recursive: Whether to process subdirectories
+        recursionDepth: How deep to recurse (-1 for infinite)
+        auto_shard: Shard the top-level subfolders of a single root
+        rules: Categorization rules, whose category folders are never shards
+        exclusions: Optional rules whose excluded folders are never shards
+
+    Returns:
+        Shards in the order their changes appear in the merged log
+
+    Raises:
+        ValueError: If a root lies inside another one
+    """
+    roots = normalize_roots(roots)
+    if not (auto_shard and len(roots) == 1 and recursive and recursionDepth != 0):
+        return [(root, recursive, recursionDepth) for root in roots]
+
+    root = roots[0]
+    category_names = tuple((rules or DEFAULT_RULES).categories)
+    _, subdirs = scan_directory(root)
+    subdir_paths = [entry.path for entry in sorted(subdirs, key=lambda entry: entry.name)
+                    if not entry.name.endswith(category_names)]
+    if exclusions is not None:
+        subdir_paths = exclusions.prune(subdir_paths)
+    return [(root, False, 0)] + [(path, True, recursionDepth - 1) for path in subdir_paths]
+
+def _clean_shard(shard: Shard, journal: str, workers: int, rules: Optional[RuleSet],
+                 sniff: bool, dedupe: Optional[str], settle: Optional[float],
+                 layout: Optional[SubfolderLayout], exclusions: Optional[ExclusionRules]) -> Tuple[int, int]:
+    """
+    Clean one shard in a worker process, logging to its own journal.
+
+    Returns:
+        Tuple of (files excluded, folders pruned) by the worker's copy of the exclusions
+    """
+    path, recursive, recursionDepth = shard
+    logger = ChangeLogger(path, log_format='jsonl', log_file=journal)
+    try:
+        main(path, recursive, recursionDepth, workers=workers, sniffer=ContentSniffer() if sniff else None,
+             dedupe=dedupe, rules=rules, logger=logger,
+             stability=StabilityFilter(settle) if settle is not None else None, layout=layout,
+             exclusions=exclusions)
+    finally:
+        logger.close()
+    if exclusions is None:
+        return 0, 0
+    return exclusions.excluded_files, exclusions.pruned_dirs
+
+def clean_sharded(roots: List[str], logger: ChangeLogger, recursive: bool = False, recursionDepth: int = -1,
+                  auto_shard: bool = False, processes: Optional[int] = None, workers: int = 1,
+                  rules: Optional[RuleSet] = None, sniff: bool = False, dedupe: Optional[str] = None,
+                  settle: Optional[float] = None, layout: Optional[SubfolderLayout] = None,
+                  exclusions: Optional[ExclusionRules] = None) -> str:
+    """
+    Clean shards in parallel processes and merge their changes into one log.
+
+    Every worker keeps its own ChangeLogger writing a jsonl journal next to
+    the run log, so nothing is shared between processes. Once all shards
+    are done the journals are appended to logger in shard order (not in
+    completion order), so the merged log is the same for every run of the
+    same tree, and then removed. If the run is interrupted before merging,
+    each shard journal can still be reverted on its own.
+
+    Args:
+        roots: Directories to clean
+        logger: Logger receiving the merged changes
+        recursive: Whether to process subdirectories
+        recursionDepth: How deep to recurse (-1 for infinite)
+        auto_shard: Shard the top-level subfolders of a single root
+        processes: Number of worker processes (defaults to the CPU count)
+        workers: Number of threads performing renames in each process
+        rules: Categorization rules (defaults to the built-in extension sets)
+        sniff: Classify files with unknown extensions by content
+        dedupe: Optional duplicate handling (see deduplicator.deduplicate)
+        settle: Optional delay in seconds of the in-flight download filter
+            (see stability.StabilityFilter)
+        layout: Optional layout placing files in subfolders of their
+            category folder; each process works on its own copy
+        exclusions: Optional gitignore-style rules of what to leave alone;
+            the counts of every process are added up in it
+
+    Returns:
+        Path of the merged log
+    """
+    shards = plan_shards(roots, recursive, recursionDepth, auto_shard, rules, exclusions)
+    journals = [os.path.join(logger.logs_dir, f"file_changes_{logger.timestamp}.shard{i}.jsonl")
+                for i in range(len(shards))]
+    os.makedirs(logger.logs_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(_clean_shard, shard, journal, workers, rules, sniff, dedupe, settle, layout,
+                               exclusions)
+                   for shard, journal in zip(shards, journals)]
+        for (path, _, _), future in zip(shards, futures):
+            try:
+                excluded_files, pruned_dirs = future.result()
+                if exclusions is not None:
+                    exclusions.excluded_files += excluded_files
+                    exclusions.pruned_dirs += pruned_dirs
+            except Exception as e:
+                print(f"Error cleaning {path}: {e}")
+
+    # merge whatever each shard logged, including shards that failed part way
+    for journal in journals:
+        if os.path.exists(journal):
+            logger.extend(iter_changes(journal))
+    log_file = logger.save_log()
+    for journal in journals:
+        if os.path.exists(journal):
+            os.remove(journal)
+    return log_file
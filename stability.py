@@ -0,0 +1,83 @@
+"""Module keeping files that are still being downloaded or written from being moved."""
+
+import os
+import time
+from typing import Dict, List, Tuple
+
+import stats
+
+# suffixes browsers and download managers use while a download is in progress
+PARTIAL_SUFFIXES = ('.crdownload', '.part', '.partial', '.download', '.opdownload',
+                    '.!ut', '.!qb', '.aria2', '.tmp')
+
+def is_partial_download(name: str) -> bool:
+    """Check whether a file name carries a known in-progress download suffix."""
+    return name.lower().endswith(PARTIAL_SUFFIXES)
+
+def _snapshot(base_path: str, names: List[str]) -> Dict[str, Tuple[int, int]]:
+    """Stat each file once and return its (size, mtime_ns); vanished files are left out."""
+    snapshot = {}
+    for name in names:
+        stats.count('stat')
+        try:
+            st = os.stat(os.path.join(base_path, name))
+        except OSError:
+            continue
+        snapshot[name] = (st.st_size, st.st_mtime_ns)
+    return snapshot
+
+class StabilityFilter:
+    """
+    Drops files from a file map that are probably still being written.
+
+    Files with a partial-download suffix are always skipped. The rest are
+    stat'ed once; files whose mtime is older than the delay have not been
+    written to for that long and are kept right away. The recently modified
+    ones are stat'ed again after a single sleep of the delay for the whole
+    batch, and only those whose size and mtime did not change are kept.
+    """
+
+    def __init__(self, delay: float = 2.0):
+        """
+        Args:
+            delay: Seconds a file must stay unchanged to be considered complete
+        """
+        self.delay = delay
+        self.skipped = 0
+
+    def filter(self, base_path: str, file_map: Dict[str, List[str]]) -> int:
+        """
+        Remove in-flight files from a file map before it is moved.
+
+        Args:
+            base_path: Directory the files live in
+            file_map: Category name to list of filenames, updated in place
+
+        Returns:
+            Number of files removed
+        """
+        unstable = set()
+        candidates = []
+        for files in file_map.values():
+            for file in files:
+                if is_partial_download(file):
+                    unstable.add(file)
+                else:
+                    candidates.append(file)
+
+        first = _snapshot(base_path, candidates)
+        cutoff = time.time_ns() - int(self.delay * 1e9)
+        recent = [name for name, (_, mtime_ns) in first.items() if mtime_ns > cutoff]
+        if recent:
+            time.sleep(self.delay)
+            second = _snapshot(base_path, recent)
+            unstable.update(name for name in recent if second.get(name) != first[name])
+
+        if unstable:
+            for category, files in file_map.items():
+                file_map[category] = [file for file in files if file not in unstable]
+            for file in sorted(unstable):
+                print(f"Skipping file still being downloaded: {os.path.join(base_path, file)}")
+        stats.count('unstable', len(unstable))
+        self.skipped += len(unstable)
+        return len(unstable)
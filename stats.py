@@ -0,0 +1,124 @@
+"""
+Module collecting optional runtime statistics: phase timings, syscall
+counters, bytes written to logs and rename latency histograms.
+
+Collection is off by default. The module-level helpers check a single
+global and return immediately while it is unset, so instrumented code
+pays one function call per event when stats are disabled.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, Optional
+
+class Stats:
+    """Counters, accumulated phase times and log2-bucketed latency histograms."""
+
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+        self.phases: Dict[str, float] = {}
+        # histogram name -> bucket -> count; bucket b holds latencies below 2**b microseconds
+        self.histograms: Dict[str, Dict[int, int]] = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()  # renames are counted from worker threads
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def observe(self, name: str, seconds: float) -> None:
+        bucket = int(seconds * 1e6).bit_length()
+        with self._lock:
+            histogram = self.histograms.setdefault(name, {})
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+
+    def to_dict(self) -> dict:
+        """Everything collected so far, in a JSON-serializable form."""
+        return {
+            "elapsed_seconds": time.perf_counter() - self.started,
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+            "histograms": {name: {f"<{2 ** bucket}us": count for bucket, count in sorted(histogram.items())}
+                           for name, histogram in self.histograms.items()},
+        }
+
+    def report(self) -> str:
+        """Human-readable summary."""
+        data = self.to_dict()
+        lines = [f"Elapsed: {data['elapsed_seconds']:.3f}s"]
+        if data["phases"]:
+            lines.append("Phases:")
+            lines += [f"  {phase:<20} {seconds:>10.3f}s" for phase, seconds in data["phases"].items()]
+        if data["counters"]:
+            lines.append("Counters:")
+            lines += [f"  {name:<20} {count:>10,}" for name, count in sorted(data["counters"].items())]
+        for name, histogram in data["histograms"].items():
+            lines.append(f"{name} latency:")
+            lines += [f"  {bucket:>12} {count:>10,}" for bucket, count in histogram.items()]
+        return '\n'.join(lines)
+
+_stats: Optional[Stats] = None
+
+def enable_stats() -> Stats:
+    """Start collecting statistics and return the collector."""
+    global _stats
+    _stats = Stats()
+    return _stats
+
+def disable_stats() -> None:
+    """Stop collecting statistics."""
+    global _stats
+    _stats = None
+
+def get_stats() -> Optional[Stats]:
+    """Get the active collector, or None when statistics are disabled."""
+    return _stats
+
+def count(name: str, n: int = 1) -> None:
+    """Add n to a counter (e.g. 'stat', 'listdir', 'rename', 'log_bytes')."""
+    if _stats is not None:
+        _stats.count(name, n)
+
+def observe(name: str, seconds: float) -> None:
+    """Record a latency sample in a histogram."""
+    if _stats is not None:
+        _stats.observe(name, seconds)
+
+@contextmanager
+def _timed(stats: Stats, phase: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_time(phase, time.perf_counter() - start)
+
+_NO_TIMER = nullcontext()
+
+def timer(phase: str):
+    """Context manager adding the time spent inside it to a phase."""
+    if _stats is None:
+        return _NO_TIMER
+    return _timed(_stats, phase)
+
+def finish(human: bool = False, json_path: Optional[str] = None) -> None:
+    """
+    Output the collected statistics, if any.
+
+    Args:
+        human: Print the human-readable report
+        json_path: Write the statistics as JSON to this file
+    """
+    if _stats is None:
+        return
+    if human:
+        print(_stats.report())
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(_stats.to_dict(), f, indent=2)
+        print(f"Statistics written to: {json_path}")
@@ -0,0 +1,111 @@
+"""Module spreading category folders over bounded-size subfolders."""
+
+import os
+import time
+import zlib
+from typing import Dict, Iterable, List, Set
+
+import filesystem
+import stats
+from change_logger import ChangeLogger
+
+SCHEMES = ('date', 'hash', 'count')
+# number of subfolders names are hashed into
+HASH_BUCKETS = 256
+# default number of entries per subfolder with the count scheme
+DEFAULT_LIMIT = 10000
+
+def move_category(src: str, dst: str) -> str:
+    """Category folder a file was moved into, also when it went into a subfolder of it."""
+    prefix = os.path.join(os.path.dirname(src), '')
+    if dst.startswith(prefix):
+        return dst[len(prefix):].split(os.sep, 1)[0]
+    return os.path.basename(os.path.dirname(dst))
+
+class SubfolderLayout:
+    """
+    Places files in subfolders of their category folder instead of the folder itself.
+
+    - date: by the month the file was last modified, e.g. Images/2026-10/photo.jpg
+    - hash: by a stable hash of the name, e.g. Images/3f/photo.jpg, so the
+      same name always lands in the same subfolder
+    - count: in numbered subfolders holding at most limit entries each,
+      e.g. Images/0004/photo.jpg, filling the highest-numbered one first
+
+    Files already in the category folder itself are left alone. Subfolders
+    are created by create() and logged like category folders, so reverting
+    a run removes the ones that end up empty.
+    """
+
+    def __init__(self, scheme: str, limit: int = DEFAULT_LIMIT):
+        """
+        Args:
+            scheme: 'date', 'hash' or 'count'
+            limit: (count) maximum number of entries per subfolder
+        """
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown subfolder scheme: {scheme}")
+        self.scheme = scheme
+        self.limit = max(1, limit)
+        self.ready: Set[str] = set()
+        # category folder -> [number of the subfolder being filled, entries in it]
+        self._fill: Dict[str, List[int]] = {}
+
+    def directory(self, category_dir: str, src: str) -> str:
+        """
+        Return the subfolder of category_dir the file at src goes into.
+
+        Args:
+            category_dir: Category folder the file is moved into
+            src: Current path of the file
+
+        Returns:
+            Path of the subfolder, which may not exist yet
+        """
+        if self.scheme == 'date':
+            stats.count('stat')
+            month = time.strftime('%Y-%m', time.localtime(filesystem.backend.stat(src).st_mtime))
+            return os.path.join(category_dir, month)
+        if self.scheme == 'hash':
+            name = os.path.normcase(os.path.basename(src))  # names equal to the filesystem share a bucket
+            bucket = zlib.crc32(name.encode('utf-8', 'surrogateescape')) % HASH_BUCKETS
+            return os.path.join(category_dir, f"{bucket:02x}")
+
+        fill = self._fill.get(category_dir)
+        if fill is None:
+            fill = self._fill[category_dir] = self._last_subfolder(category_dir)
+        if fill[1] >= self.limit:
+            fill[0] += 1
+            fill[1] = 0
+        fill[1] += 1
+        return os.path.join(category_dir, f"{fill[0]:04d}")
+
+    def _last_subfolder(self, category_dir: str) -> List[int]:
+        """Find the highest-numbered subfolder of a category folder and count its entries."""
+        number = 1
+        stats.count('listdir')
+        try:
+            with filesystem.backend.scandir(category_dir) as entries:
+                numbers = [int(entry.name) for entry in entries if entry.name.isdigit() and entry.is_dir()]
+        except OSError:  # not created yet
+            return [number, 0]
+        if numbers:
+            number = max(numbers)
+        stats.count('listdir')
+        try:
+            with filesystem.backend.scandir(os.path.join(category_dir, f"{number:04d}")) as entries:
+                return [number, sum(1 for _ in entries)]
+        except OSError:
+            return [number, 0]
+
+    def create(self, directories: Iterable[str], logger: ChangeLogger) -> None:
+        """Create the subfolders that don't exist yet, logging each one created."""
+        for directory in directories:
+            if directory in self.ready:
+                continue
+            self.ready.add(directory)
+            try:
+                filesystem.backend.mkdir(directory)
+                logger.log_folder_creation(directory)
+            except FileExistsError:
+                pass
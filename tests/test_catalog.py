@@ -0,0 +1,104 @@
+import os
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import Catalog
+from change_logger import ChangeLogger
+from revert_changes import revert_changes, revert_selection
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+CATALOG_FILE = os.path.join(TEST_PATH, 'catalog.sqlite3')
+
+@pytest.fixture
+def test_dir():
+    """Create a temporary test directory holding the catalog."""
+    os.makedirs(TEST_PATH, exist_ok=True)
+    yield TEST_PATH
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+
+def make_run(base: str, timestamp: str, moves, **options) -> ChangeLogger:
+    """Move files from base into category folders, logging each move to a catalogued log."""
+    logger = ChangeLogger(base, catalog=CATALOG_FILE, **options)
+    logger.timestamp = timestamp
+    logger.log_file = os.path.join(base, f"file_changes_{timestamp}.{logger.log_format}")
+    for name, category in moves:
+        os.makedirs(os.path.join(base, category), exist_ok=True)
+        with open(os.path.join(base, name), 'w') as f:
+            f.write(name)
+        os.rename(os.path.join(base, name), os.path.join(base, category, name))
+        logger.log_move(os.path.join(base, name), os.path.join(base, category, name))
+    logger.save_log()
+    return logger
+
+# ------------------------------ Test indexing ------------------------------
+
+def test_logger_indexes_saved_changes(test_dir):
+    """Test that save_log adds only the changes not catalogued yet."""
+    logger = make_run(test_dir, "20260101_120000", [("report.pdf", "Documents")])
+    logger.log_move(os.path.join(test_dir, "x.mp3"), os.path.join(test_dir, "Audio", "x.mp3"))
+    logger.save_log()
+
+    with Catalog(CATALOG_FILE) as catalog:
+        rows = catalog.select()
+        assert [row[2] for row in rows] == [os.path.join(test_dir, "x.mp3"), os.path.join(test_dir, "report.pdf")]
+        assert catalog.select("report.pdf")[0][3] == os.path.join(test_dir, "Documents", "report.pdf")
+
+def test_import_log(test_dir):
+    """Test importing an existing journal once."""
+    logger = ChangeLogger(test_dir, log_format='jsonl')
+    logger.log_file = os.path.join(test_dir, "old.jsonl")
+    logger.log_move("/a/song.mp3", "/a/Audio/song.mp3")
+    logger.log_folder_creation("/a/Audio")
+    logger.close()
+
+    with Catalog(CATALOG_FILE) as catalog:
+        assert catalog.import_log(logger.log_file) == 2
+        assert catalog.import_log(logger.log_file) == 0
+        assert catalog.select(category="Audio")[0][1:4] == ("move", "/a/song.mp3", "/a/Audio/song.mp3")
+
+def test_select_filters(test_dir):
+    """Test the directory, category and time range filters."""
+    with Catalog(CATALOG_FILE) as catalog:
+        catalog.add_changes("one.json", "/a", "20260101_090000", [
+            ("move", "/a/x.pdf", "/a/Documents/x.pdf"),
+            ("move", "/ab/y.pdf", "/ab/Documents/y.pdf"),
+        ])
+        catalog.add_changes("two.json", "/a", "20260203_090000", [
+            ("move", "/a/z.png", "/a/Images/z.png"),
+        ])
+        assert [row[2] for row in catalog.select(directory="/a")] == ["/a/z.png", "/a/x.pdf"]
+        assert [row[2] for row in catalog.select(category="Documents", directory="/ab")] == ["/ab/y.pdf"]
+        assert [row[2] for row in catalog.select(until="20260101")] == ["/ab/y.pdf", "/a/x.pdf"]
+        assert [row[2] for row in catalog.select(since="202602")] == ["/a/z.png"]
+        assert [row[2] for row in catalog.select("/a/*.pdf")] == ["/a/x.pdf"]
+
+# ------------------------------ Test selective revert ------------------------------
+
+def test_revert_selection(test_dir):
+    """Test reverting only the matching moves and flagging them in the catalog."""
+    make_run(test_dir, "20260101_120000", [("report.pdf", "Documents"), ("song.mp3", "Audio")])
+    make_run(test_dir, "20260301_120000", [("notes.pdf", "Documents")])
+
+    revert_selection(CATALOG_FILE, pattern="*.pdf", until="20260201")
+
+    assert os.path.exists(os.path.join(test_dir, "report.pdf"))
+    assert os.path.exists(os.path.join(test_dir, "Audio", "song.mp3"))
+    assert os.path.exists(os.path.join(test_dir, "Documents", "notes.pdf"))
+    with Catalog(CATALOG_FILE) as catalog:
+        assert catalog.select("report.pdf") == []
+
+def test_revert_changes_flags_run(test_dir):
+    """Test that reverting a whole log flags its run in the catalog, so it isn't found or reverted again."""
+    first = make_run(test_dir, "20260101_120000", [("report.pdf", "Documents"), ("song.mp3", "Audio")])
+    make_run(test_dir, "20260301_120000", [("notes.pdf", "Documents")])
+    os.remove(os.path.join(test_dir, "Audio", "song.mp3"))  # already gone, but still flagged with its run
+
+    revert_changes(first.log_file, catalog_path=CATALOG_FILE)
+
+    assert os.path.exists(os.path.join(test_dir, "report.pdf"))
+    with Catalog(CATALOG_FILE) as catalog:
+        assert [row[2] for row in catalog.select()] == [os.path.join(test_dir, "notes.pdf")]
@@ -1,13 +1,16 @@
+import io
 import os
 import json
 import shutil
 import pytest
 import sys
+import errno
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from change_logger import ChangeLogger
-from revert_changes import revert_changes
+import file_ops
+from change_logger import ChangeLogger, ChangeTable, iter_changes, _parse_document, _read_lines_reversed
+from revert_changes import revert_changes, _plan_waves
 
 TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
 
@@ -19,6 +22,28 @@ def test_dir():
     if os.path.exists(TEST_PATH):
         shutil.rmtree(TEST_PATH)
 
+@pytest.fixture
+def open_dirs(monkeypatch):
+    """Track the directory descriptors file_ops keeps open, failing with EMFILE past 'max' of them."""
+    state = {'fds': set(), 'peak': 0, 'max': None}
+    real_open, real_close = os.open, os.close
+
+    def fake_open(path, flags, *args, **kwargs):
+        if flags & getattr(os, 'O_DIRECTORY', 0) and state['max'] is not None and len(state['fds']) >= state['max']:
+            raise OSError(errno.EMFILE, os.strerror(errno.EMFILE))
+        fd = real_open(path, flags, *args, **kwargs)
+        if flags & getattr(os, 'O_DIRECTORY', 0):
+            state['fds'].add(fd)
+            state['peak'] = max(state['peak'], len(state['fds']))
+        return fd
+
+    def fake_close(fd):
+        state['fds'].discard(fd)
+        real_close(fd)
+    monkeypatch.setattr(file_ops.os, 'open', fake_open)
+    monkeypatch.setattr(file_ops.os, 'close', fake_close)
+    return state
+
 @pytest.fixture
 def logger(test_dir):
     """Create a ChangeLogger instance for testing."""
@@ -65,6 +90,86 @@ def test_save_log(logger, test_dir):
     # Cleanup
     os.remove(log_file)
 
+def test_save_log_jsonl(test_dir):
+    """Test that the jsonl journal holds a header and one compact record per change."""
+    logger = ChangeLogger(test_dir, log_format='jsonl', flush_interval=1)
+    src = os.path.join(test_dir, "source.txt")
+    dst = os.path.join(test_dir, "dest.txt")
+    logger.log_move(src, dst)
+
+    # records are appended as they are logged, before save_log is called
+    with open(logger.log_file, 'r') as f:
+        lines = f.read().splitlines()
+    assert json.loads(lines[0])["base_path"] == test_dir
+    assert json.loads(lines[1]) == {"Type": "move", "source": src, "destination": dst}
+
+    logger.log_folder_creation(test_dir)
+    assert logger.save_log() == logger.log_file
+    assert [change[0] for change in iter_changes(logger.log_file)] == ["move", "folder_creation"]
+
+    logger.close()
+    os.remove(logger.log_file)
+
+def test_iter_changes_reverse(test_dir):
+    """Test that both log formats are read back newest first."""
+    for log_format in ('json', 'jsonl'):
+        logger = ChangeLogger(test_dir, log_format=log_format)
+        for i in range(50):
+            logger.log_move(f"src{i}", f"dst{i}")
+        log_file = logger.save_log()
+        logger.close()
+
+        changes = list(iter_changes(log_file, reverse=True))
+        assert [change[1] for change in changes] == [f"src{i}" for i in reversed(range(50))]
+        os.remove(log_file)
+
+def test_iter_changes_compressed(test_dir):
+    """Test that compressed logs in both formats are read back in either order."""
+    for log_format in ('json', 'jsonl'):
+        for compression in ('gzip', 'lzma'):
+            logger = ChangeLogger(test_dir, log_format=log_format, compression=compression)
+            for i in range(20):
+                logger.log_move(f"/a/src{i}", f"/b/dst{i}")
+            log_file = logger.save_log()
+            logger.close()
+
+            assert list(iter_changes(log_file)) == list(logger.changes.records())
+            assert list(iter_changes(log_file, reverse=True)) == list(logger.changes.records(reverse=True))
+            os.remove(log_file)
+
+def test_parse_document_small_blocks(test_dir):
+    """Test that JSON log documents are parsed record by record across block boundaries."""
+    changes = [{"Type": "move", "source": f"/a \"changes\" [{i}]/x,y", "destination": f"/b/{i}\u00e9"} for i in range(30)]
+    for document in (json.dumps({"base_path": '/"changes" [', "timestamp": "t", "changes": changes}, indent=4),
+                     json.dumps({"base_path": "/x", "timestamp": "t", "changes": changes})):
+        parsed = list(_parse_document(io.StringIO(document), block_size=7))
+        assert parsed == [(c["Type"], c["source"], c["destination"]) for c in changes]
+    assert list(_parse_document(io.StringIO('{"base_path": "/x", "changes": []}'), block_size=3)) == []
+    with pytest.raises(ValueError):
+        list(_parse_document(io.StringIO(document[:len(document) // 2])))
+
+def test_change_table_interns_directories():
+    """Test that records share directory table entries and round-trip exactly."""
+    table = ChangeTable()
+    table.append("folder_creation", "", "/downloads/Audio")
+    table.append("move", "/downloads/song.mp3", "/downloads/Audio/song.mp3")
+    table.append("move", "/downloads/other.mp3", "/downloads/Audio/other.mp3")
+
+    assert sorted(table.directories) == ["", "/downloads/", "/downloads/Audio/"]
+    assert len(table) == 3
+    assert table[-1] == {"Type": "move", "source": "/downloads/other.mp3",
+                         "destination": "/downloads/Audio/other.mp3"}
+    assert list(table.records(reverse=True))[0] == ("move", "/downloads/other.mp3", "/downloads/Audio/other.mp3")
+
+def test_read_lines_reversed_small_blocks(test_dir):
+    """Test that lines spanning block boundaries are reassembled."""
+    path = os.path.join(test_dir, "lines.txt")
+    lines = [f"line number {i}".encode() for i in range(100)]
+    with open(path, 'wb') as f:
+        f.write(b'\n'.join(lines) + b'\n')
+    result = [line for line in _read_lines_reversed(path, block_size=7) if line]
+    assert result == list(reversed(lines))
+
 # ------------------------------ Test reverting changes ------------------------------
 
 def test_revert_changes(test_dir):
@@ -103,3 +208,105 @@ def test_revert_changes(test_dir):
     assert os.path.exists(src)
     with open(src, 'r') as f:
         assert f.read() == "test content"
+
+def test_revert_changes_jsonl(test_dir):
+    """Test reverting file changes from a jsonl journal."""
+    src = os.path.join(test_dir, "original.txt")
+    dst_folder = os.path.join(test_dir, "category")
+    dst = os.path.join(dst_folder, "original.txt")
+    with open(src, 'w') as f:
+        f.write("test content")
+
+    logger = ChangeLogger(test_dir, log_format='jsonl')
+    os.makedirs(dst_folder)
+    logger.log_folder_creation(dst_folder)
+    shutil.move(src, dst)
+    logger.log_move(src, dst)
+    log_file = logger.save_log()
+    logger.close()
+
+    revert_changes(log_file)
+
+    assert not os.path.exists(dst_folder)
+    assert not os.path.exists(log_file)
+    with open(src, 'r') as f:
+        assert f.read() == "test content"
+
+def test_plan_waves():
+    """Test that only changes sharing a path are ordered after each other."""
+    changes = [  # newest first, as read from the log
+        ("move", "/b/file", "/c/file"),
+        ("move", "/x/other", "/y/other"),
+        ("move", "/a/file", "/b/file"),
+        ("folder_creation", "", "/c"),
+        ("duplicate_skipped", "/x/kept", "/x/dup"),
+    ]
+    waves, folders = _plan_waves(changes)
+    assert waves == [[changes[0], changes[1]], [changes[2]]]
+    assert folders == ["/c"]
+
+def test_revert_changes_parallel(test_dir):
+    """Test reverting many moves, including a chained one, on a worker pool."""
+    src_folder = os.path.join(test_dir, "downloads")
+    mid_folder = os.path.join(test_dir, "category")
+    end_folder = os.path.join(mid_folder, "nested")
+    os.makedirs(end_folder)
+
+    logger = ChangeLogger(test_dir)
+    logger.log_folder_creation(mid_folder)
+    logger.log_folder_creation(end_folder)
+    for i in range(50):
+        with open(os.path.join(mid_folder, f"file{i}.txt"), 'w') as f:
+            f.write(str(i))
+        logger.log_move(os.path.join(src_folder, f"file{i}.txt"), os.path.join(mid_folder, f"file{i}.txt"))
+    # file0 was later moved again
+    shutil.move(os.path.join(mid_folder, "file0.txt"), os.path.join(end_folder, "file0.txt"))
+    logger.log_move(os.path.join(mid_folder, "file0.txt"), os.path.join(end_folder, "file0.txt"))
+    logger.log_move(os.path.join(src_folder, "gone.txt"), os.path.join(mid_folder, "gone.txt"))
+
+    log_file = logger.save_log()
+    revert_changes(log_file, workers=4)
+
+    assert sorted(os.listdir(src_folder)) == sorted(f"file{i}.txt" for i in range(50))
+    with open(os.path.join(src_folder, "file0.txt")) as f:
+        assert f.read() == "0"
+    assert not os.path.exists(mid_folder)
+    assert not os.path.exists(log_file)
+
+@pytest.mark.skipif(not file_ops.SUPPORTS_DIR_FD, reason="renames relative to directories unsupported")
+def test_revert_changes_more_directories_than_fd_limit(test_dir, open_dirs, monkeypatch):
+    """Test that reverting moves between many directories keeps few descriptors open."""
+    monkeypatch.setattr(file_ops, 'DIR_FD_LIMIT', 8)
+    logger = ChangeLogger(test_dir)
+    for i in range(40):
+        src = os.path.join(test_dir, "downloads", f"dir{i}", "file.txt")
+        dst = os.path.join(test_dir, "sorted", f"dir{i}", "file.txt")
+        os.makedirs(os.path.dirname(dst))
+        with open(dst, 'w') as f:
+            f.write(str(i))
+        logger.log_move(src, dst)
+
+    log_file = logger.save_log()
+    revert_changes(log_file, workers=4)
+
+    assert all(os.path.exists(os.path.join(test_dir, "downloads", f"dir{i}", "file.txt")) for i in range(40))
+    assert not os.path.exists(log_file)
+    assert open_dirs['peak'] <= 8
+    assert not open_dirs['fds']
+
+@pytest.mark.skipif(not file_ops.SUPPORTS_DIR_FD, reason="renames relative to directories unsupported")
+def test_revert_changes_out_of_descriptors(test_dir, open_dirs):
+    """Test that renames fall back to plain paths when no directory can be opened."""
+    open_dirs['max'] = 0
+    logger = ChangeLogger(test_dir)
+    dst = os.path.join(test_dir, "sorted", "file.txt")
+    os.makedirs(os.path.dirname(dst))
+    with open(dst, 'w') as f:
+        f.write("data")
+    logger.log_move(os.path.join(test_dir, "file.txt"), dst)
+
+    log_file = logger.save_log()
+    revert_changes(log_file)
+
+    assert os.path.exists(os.path.join(test_dir, "file.txt"))
+    assert not os.path.exists(log_file)
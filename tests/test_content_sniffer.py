@@ -0,0 +1,74 @@
+import os
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_sniffer import ContentSniffer, sniff_category
+from folder_cleaner import categorize_files
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+
+@pytest.fixture
+def test_dir():
+    """Create a temporary test directory with extensionless files."""
+    os.makedirs(TEST_PATH, exist_ok=True)
+    files = {
+        'download': b'%PDF-1.7 rest of document',
+        'picture.bin': b'\x89PNG\r\n\x1a\n image data',
+        'clip.dat': b'\x00\x00\x00\x18ftypisom video data',
+        'notes': b'just some plain text',
+        'song.mp3': b'not really an mp3',
+    }
+    for name, content in files.items():
+        with open(os.path.join(TEST_PATH, name), 'wb') as f:
+            f.write(content)
+    yield TEST_PATH
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+
+# ------------------------------ Test signature matching ------------------------------
+
+def test_sniff_category():
+    """Test matching headers against magic signatures."""
+    assert sniff_category(b'%PDF-1.4') == 'Documents'
+    assert sniff_category(b'\x00\x00\x00\x20ftypM4A ') == 'Audio'
+    assert sniff_category(b'\x00\x00\x00\x20ftypmp42') == 'Video'
+    assert sniff_category(b'\x00' * 257 + b'ustar\x00') == 'Archives'
+    assert sniff_category(b'hello world') is None
+    assert sniff_category(b'') is None
+
+# ------------------------------ Test reclassification ------------------------------
+
+def test_reclassify(test_dir):
+    """Test that only files without a known extension are moved out of Others."""
+    file_map = categorize_files(os.listdir(test_dir))
+    ContentSniffer().reclassify(test_dir, file_map)
+
+    assert file_map['Documents'] == ['download']
+    assert file_map['Images'] == ['picture.bin']
+    assert file_map['Video'] == ['clip.dat']
+    assert file_map['Audio'] == ['song.mp3']  # the extension stays the fast path
+    assert file_map['Others'] == ['notes']
+
+def test_cache_avoids_rereading(test_dir):
+    """Test that unchanged files are classified from the cache."""
+    sniffer = ContentSniffer(workers=1)
+    paths = [os.path.join(test_dir, name) for name in ('download', 'notes')]
+    first = sniffer.classify(paths)
+    assert sniffer.headers_read == 2
+
+    assert sniffer.classify(paths) == first
+    assert sniffer.headers_read == 2
+
+    with open(paths[1], 'wb') as f:
+        f.write(b'GIF89a changed content')
+    assert sniffer.classify(paths)[paths[1]] == 'Images'
+    assert sniffer.headers_read == 3
+
+def test_cache_is_bounded(test_dir):
+    """Test that the cache evicts the least recently used entries."""
+    sniffer = ContentSniffer(cache_size=2, workers=1)
+    sniffer.classify([os.path.join(test_dir, name) for name in sorted(os.listdir(test_dir))])
+    assert len(sniffer._cache) == 2
@@ -0,0 +1,84 @@
+import os
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deduplicator import find_duplicates, BLOCK_SIZE
+from folder_cleaner import main
+from change_logger_singleton import initialize_logger, get_logger
+from revert_changes import revert_changes
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+
+def write(path: str, content: bytes) -> str:
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+@pytest.fixture
+def test_dir():
+    """Create a test directory with duplicate downloads and a pre-existing copy."""
+    os.makedirs(os.path.join(TEST_PATH, 'Documents'), exist_ok=True)
+    initialize_logger(TEST_PATH)
+    write(os.path.join(TEST_PATH, 'report.pdf'), b'report contents')
+    write(os.path.join(TEST_PATH, 'report(1).pdf'), b'report contents')
+    write(os.path.join(TEST_PATH, 'other.pdf'), b'report content!')  # same size, different content
+    write(os.path.join(TEST_PATH, 'Documents', 'invoice.pdf'), b'invoice')
+    write(os.path.join(TEST_PATH, 'invoice(2).pdf'), b'invoice')
+    yield TEST_PATH
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+    if os.path.exists(get_logger().log_file):
+        os.remove(get_logger().log_file)
+
+# ------------------------------ Test duplicate detection ------------------------------
+
+def test_find_duplicates(test_dir):
+    """Test that only files with identical content are grouped."""
+    paths = sorted(os.path.join(test_dir, name) for name in os.listdir(test_dir) if name.endswith('.pdf'))
+    paths.append(os.path.join(test_dir, 'Documents', 'invoice.pdf'))
+    groups = find_duplicates(paths)
+    assert sorted(map(sorted, groups)) == [
+        sorted([os.path.join(test_dir, 'invoice(2).pdf'), os.path.join(test_dir, 'Documents', 'invoice.pdf')]),
+        sorted([os.path.join(test_dir, 'report(1).pdf'), os.path.join(test_dir, 'report.pdf')]),
+    ]
+
+def test_find_duplicates_large_files(test_dir):
+    """Test that files differing only in the middle are told apart by the full hash."""
+    a = write(os.path.join(test_dir, 'a.bin'), b'x' * BLOCK_SIZE * 3)
+    b = write(os.path.join(test_dir, 'b.bin'), b'x' * BLOCK_SIZE + b'y' + b'x' * (BLOCK_SIZE * 2 - 1))
+    c = write(os.path.join(test_dir, 'c.bin'), b'x' * BLOCK_SIZE * 3)
+    assert find_duplicates([a, b, c], workers=2) == [[a, c]]
+
+def test_find_duplicates_ignores_empty_files(test_dir):
+    """Test that empty files are never reported as duplicates."""
+    a = write(os.path.join(test_dir, 'a.txt'), b'')
+    b = write(os.path.join(test_dir, 'b.txt'), b'')
+    assert find_duplicates([a, b]) == []
+
+# ------------------------------ Test dedupe actions ------------------------------
+
+def test_dedupe_skip(test_dir):
+    """Test that skipped duplicates stay in place and the originals are moved."""
+    main(test_dir, dedupe='skip')
+    assert os.path.exists(os.path.join(test_dir, 'Documents', 'report.pdf'))
+    assert os.path.exists(os.path.join(test_dir, 'report(1).pdf'))
+    assert os.path.exists(os.path.join(test_dir, 'invoice(2).pdf'))
+    assert os.path.exists(os.path.join(test_dir, 'Documents', 'other.pdf'))
+    skipped = [change["destination"] for change in get_logger().changes if change["Type"] == "duplicate_skipped"]
+    assert sorted(skipped) == [os.path.join(test_dir, 'invoice(2).pdf'), os.path.join(test_dir, 'report(1).pdf')]
+
+def test_dedupe_hardlink_and_revert(test_dir):
+    """Test that hardlinked duplicates are moved and get their own copy back on revert."""
+    main(test_dir, dedupe='hardlink')
+    original = os.stat(os.path.join(test_dir, 'Documents', 'report.pdf'))
+    duplicate = os.stat(os.path.join(test_dir, 'Documents', 'report(1).pdf'))
+    assert original.st_ino == duplicate.st_ino
+
+    revert_changes(get_logger().log_file)
+    assert os.stat(os.path.join(test_dir, 'report(1).pdf')).st_nlink == 1
+    assert os.stat(os.path.join(test_dir, 'invoice(2).pdf')).st_nlink == 1
+    with open(os.path.join(test_dir, 'report(1).pdf'), 'rb') as f:
+        assert f.read() == b'report contents'
@@ -0,0 +1,95 @@
+import os
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stats
+from exclusions import ExclusionRules, load_exclusions
+from folder_cleaner import main
+from change_logger import ChangeLogger
+from planner import build_plan
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+LOGS_PATH = os.path.join(os.path.dirname(__file__), 'test_logs')
+
+def write(path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(os.path.basename(path))
+
+@pytest.fixture
+def test_dir():
+    """Create a project-like tree with dependency and build folders next to regular downloads."""
+    for path in ('photo.jpg', 'notes.tmp', 'keep.tmp', 'report.pdf',
+                 'node_modules/pkg/index.js', 'node_modules/pkg/logo.png',
+                 'build/out.zip', 'sub/build/song.mp3', 'sub/movie.mp4'):
+        write(os.path.join(TEST_PATH, *path.split('/')))
+    yield TEST_PATH
+    stats.disable_stats()
+    for path in (TEST_PATH, LOGS_PATH):
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+@pytest.fixture
+def logger(test_dir):
+    return ChangeLogger(test_dir, log_file=os.path.join(LOGS_PATH, 'log.json'))
+
+# ------------------------------ Test the matcher ------------------------------
+
+def test_gitignore_semantics():
+    """Test anchoring, folder-only patterns, ** and negation with the last match winning."""
+    root = os.path.join(os.sep, 'root')
+    rules = ExclusionRules(['# comment', '', 'node_modules/', '*.tmp', '!keep.tmp',
+                            '/build', 'docs/**/draft?.txt'], roots=[root])
+    assert rules.excluded(os.path.join(root, 'a', 'node_modules'), is_dir=True)
+    assert not rules.excluded(os.path.join(root, 'node_modules'))  # a file, not a folder
+    assert rules.excluded(os.path.join(root, 'a', 'notes.tmp'))
+    assert not rules.excluded(os.path.join(root, 'a', 'keep.tmp'))
+    assert rules.excluded(os.path.join(root, 'build'), is_dir=True)
+    assert not rules.excluded(os.path.join(root, 'a', 'build'), is_dir=True)  # anchored to the root
+    assert rules.excluded(os.path.join(root, 'docs', 'x', 'y', 'draft1.txt'))
+    assert not rules.excluded(os.path.join(root, 'docs', 'final.txt'))
+    assert rules.patterns == ['node_modules/', '*.tmp', '!keep.tmp', '/build', 'docs/**/draft?.txt']
+
+def test_load_exclusions(tmp_path):
+    """Test that pattern files come first and includes override excludes."""
+    pattern_file = tmp_path / '.cleanignore'
+    pattern_file.write_text('*.log\n# drafts\ndraft*\n')
+    rules = load_exclusions([str(pattern_file)], excludes=['*.iso'], includes=['important.log'])
+    assert rules.excluded(os.path.join(str(tmp_path), 'debug.log'))
+    assert rules.excluded(os.path.join(str(tmp_path), 'draft1.pdf'))
+    assert rules.excluded(os.path.join(str(tmp_path), 'ubuntu.iso'))
+    assert not rules.excluded(os.path.join(str(tmp_path), 'important.log'))
+
+# ------------------------------ Test pruning during a run ------------------------------
+
+def test_main_prunes_and_skips(test_dir, logger):
+    """Test that excluded folders are never listed and excluded files are never moved."""
+    stats.enable_stats()
+    exclusions = ExclusionRules(['node_modules/', '*.tmp', '!keep.tmp', '/build'], roots=[test_dir])
+    main(test_dir, recursive=True, logger=logger, exclusions=exclusions)
+
+    assert os.path.exists(os.path.join(test_dir, 'notes.tmp'))
+    assert os.path.exists(os.path.join(test_dir, 'Others', 'keep.tmp'))
+    assert os.path.exists(os.path.join(test_dir, 'node_modules', 'pkg', 'logo.png'))
+    assert os.path.exists(os.path.join(test_dir, 'build', 'out.zip'))
+    # only the top-level build folder is anchored, sub/build is cleaned
+    assert os.path.exists(os.path.join(test_dir, 'sub', 'build', 'Audio', 'song.mp3'))
+    assert os.path.exists(os.path.join(test_dir, 'sub', 'Video', 'movie.mp4'))
+
+    assert (exclusions.excluded_files, exclusions.pruned_dirs) == (1, 2)
+    assert exclusions.summary() == "Excluded 1 files and pruned 2 folders"
+    assert stats.get_stats().to_dict()["counters"]["pruned"] == 2
+    # pruned folders were never cleaned, so no category folders appeared in them
+    assert sorted(os.listdir(os.path.join(test_dir, 'node_modules'))) == ['pkg']
+    assert sorted(os.listdir(os.path.join(test_dir, 'node_modules', 'pkg'))) == ['index.js', 'logo.png']
+
+def test_plan_respects_exclusions(test_dir):
+    """Test that the planner leaves excluded files and folders out of the plan."""
+    exclusions = ExclusionRules(['node_modules/', '*.tmp', 'build/'], roots=[test_dir])
+    plan = build_plan(test_dir, recursive=True, exclusions=exclusions)
+    planned = {os.path.relpath(src, test_dir) for src, _ in plan.moves}
+    assert planned == {'photo.jpg', 'report.pdf', os.path.join('sub', 'movie.mp4')}
+    assert exclusions.pruned_dirs == 3
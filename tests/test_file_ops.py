@@ -0,0 +1,144 @@
+import os
+import errno
+import shutil
+import pytest
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_ops
+from file_ops import DirectoryFds, SharedDirectoryFds, move_file, copy_data, rename_noreplace
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+
+@pytest.fixture
+def test_dir():
+    """Create a temporary test directory."""
+    os.makedirs(os.path.join(TEST_PATH, 'dest'), exist_ok=True)
+    yield TEST_PATH
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+
+@pytest.fixture
+def cross_device(monkeypatch):
+    """Make plain renames of non-temporary files fail as if crossing filesystems."""
+    real_rename = file_ops.rename_noreplace
+
+    def rename(src, dst, src_dir_fd=None, dst_dir_fd=None):
+        if not os.path.basename(src).endswith('.partial'):
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+        real_rename(src, dst, src_dir_fd, dst_dir_fd)
+    monkeypatch.setattr(file_ops, 'rename_noreplace', rename)
+
+def write(path: str, content: bytes) -> str:
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+# ------------------------------ Test moving files ------------------------------
+
+def test_move_file_same_filesystem(test_dir):
+    """Test that a normal move is a rename."""
+    src = write(os.path.join(test_dir, 'file.txt'), b'content')
+    inode = os.stat(src).st_ino
+    dst = os.path.join(test_dir, 'dest', 'file.txt')
+    move_file(src, dst)
+    assert not os.path.exists(src)
+    assert os.stat(dst).st_ino == inode
+
+def test_move_file_across_filesystems(test_dir, cross_device):
+    """Test that EXDEV falls back to copying data and metadata."""
+    content = os.urandom(3 * 1024 * 1024 + 17)
+    src = write(os.path.join(test_dir, 'big.bin'), content)
+    os.chmod(src, 0o640)
+    os.utime(src, ns=(1_000_000_000, 2_000_000_000))
+    dst = os.path.join(test_dir, 'dest', 'big.bin')
+
+    move_file(src, dst)
+
+    assert not os.path.exists(src)
+    with open(dst, 'rb') as f:
+        assert f.read() == content
+    st = os.stat(dst)
+    assert st.st_mode & 0o777 == 0o640
+    assert st.st_mtime_ns == 2_000_000_000
+    assert os.listdir(os.path.join(test_dir, 'dest')) == ['big.bin']  # no temporary file left behind
+
+def test_move_file_other_errors(test_dir):
+    """Test that errors other than EXDEV are raised."""
+    with pytest.raises(FileNotFoundError):
+        move_file(os.path.join(test_dir, 'missing.txt'), os.path.join(test_dir, 'dest', 'missing.txt'))
+
+def test_move_file_never_replaces(test_dir):
+    """Test that an existing destination is reported instead of overwritten."""
+    src = write(os.path.join(test_dir, 'file.txt'), b'new')
+    dst = write(os.path.join(test_dir, 'dest', 'file.txt'), b'old')
+    with pytest.raises(FileExistsError):
+        move_file(src, dst)
+    with open(dst, 'rb') as f:
+        assert f.read() == b'old'
+    assert os.path.exists(src)
+
+def test_move_file_relative_to_directory_fds(test_dir):
+    """Test renaming relative to open directories, with and without renameat2."""
+    src = write(os.path.join(test_dir, 'a.txt'), b'a')
+    dst = os.path.join(test_dir, 'dest', 'a.txt')
+    with DirectoryFds() as dir_fds:
+        move_file(src, dst, dir_fds)
+        assert os.path.exists(dst)
+        dest_fd, _ = dir_fds.acquire(os.path.join(test_dir, 'dest'), os.path.join(test_dir, 'dest'))
+        with pytest.raises(FileExistsError):
+            rename_noreplace('a.txt', 'a.txt', dest_fd, dest_fd)
+
+def test_directory_fds_limit(test_dir):
+    """Test that the least recently used descriptor is closed, and that threads share the limit."""
+    dirs = [os.path.join(test_dir, name) for name in ('a', 'b', 'c')]
+    for directory in dirs:
+        os.makedirs(directory)
+    with DirectoryFds(limit=2) as dir_fds:
+        dir_fds.acquire(dirs[0], dirs[1])
+        dir_fds.acquire(dirs[2], dirs[0])
+        assert list(dir_fds._fds) == [dirs[2], dirs[0]]
+
+    with SharedDirectoryFds(workers=2, limit=5) as dir_fds:
+        def acquire_all(_):
+            for directory in dirs:
+                dir_fds.acquire(directory, directory)
+            return dict(dir_fds._local.dir_fds._fds)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            opened = list(pool.map(acquire_all, range(2)))
+        assert all(len(fds) == 2 for fds in opened)
+    assert not dir_fds._threads
+
+def test_rename_noreplace_without_renameat2(test_dir, monkeypatch):
+    """Test the check-then-rename fallback used where renameat2 is unavailable."""
+    monkeypatch.setattr(file_ops, '_renameat2', None)
+    src = write(os.path.join(test_dir, 'b.txt'), b'b')
+    dst = write(os.path.join(test_dir, 'dest', 'b.txt'), b'old')
+    with pytest.raises(FileExistsError):
+        rename_noreplace(src, dst)
+    os.remove(dst)
+    rename_noreplace(src, dst)
+    assert not os.path.exists(src)
+
+def test_copy_data_fallbacks(test_dir, monkeypatch):
+    """Test that copying continues with the next method when one isn't supported."""
+    content = os.urandom(100000)
+    src = write(os.path.join(test_dir, 'src.bin'), content)
+    dst = os.path.join(test_dir, 'dst.bin')
+
+    def unsupported(*args):
+        raise OSError(errno.ENOSYS, os.strerror(errno.ENOSYS))
+    monkeypatch.setattr(file_ops.os, 'copy_file_range', unsupported, raising=False)
+    monkeypatch.setattr(file_ops.os, 'sendfile', unsupported, raising=False)
+
+    src_fd = os.open(src, os.O_RDONLY)
+    dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT)
+    try:
+        copy_data(src_fd, dst_fd, len(content))
+    finally:
+        os.close(src_fd)
+        os.close(dst_fd)
+    with open(dst, 'rb') as f:
+        assert f.read() == content
@@ -0,0 +1,132 @@
+import os
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import filesystem
+from filesystem import MemoryBackend, OSBackend, use_backend
+from folder_cleaner import main
+from change_logger import ChangeLogger, iter_changes
+from planner import build_plan, execute_plan
+from revert_changes import revert_changes
+
+# never created on disk: everything below lives in the memory backend
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_memory_folder')
+LOG_FILE = os.path.join(TEST_PATH + '_logs', 'log.jsonl')
+
+@pytest.fixture
+def memory_fs():
+    """Put a small download folder with a subfolder into a fresh memory backend."""
+    fs = MemoryBackend()
+    fs.add_files(TEST_PATH, ['a.jpg', 'b.pdf', 'c.mp3', 'd.zip', 'e.txt'], size=3)
+    fs.add_files(os.path.join(TEST_PATH, 'sub'), ['f.png', 'g.mp4'])
+    fs.add_files(os.path.join(TEST_PATH, 'Images'), ['a.jpg'])
+    with use_backend(fs):
+        yield fs
+    assert isinstance(filesystem.backend, OSBackend)
+    assert not os.path.exists(TEST_PATH)
+
+# ------------------------------ Test the memory backend ------------------------------
+
+def test_memory_operations(memory_fs):
+    """Test that the memory backend behaves like os for the calls the cleaner makes."""
+    with memory_fs.scandir(TEST_PATH) as entries:
+        listed = {entry.name: entry.is_dir() for entry in entries}
+    assert listed == {'a.jpg': False, 'b.pdf': False, 'c.mp3': False, 'd.zip': False,
+                      'e.txt': False, 'sub': True, 'Images': True}
+    assert memory_fs.stat(os.path.join(TEST_PATH, 'a.jpg')).st_size == 3
+
+    src, dst = os.path.join(TEST_PATH, 'a.jpg'), os.path.join(TEST_PATH, 'Images', 'a.jpg')
+    with pytest.raises(FileExistsError):
+        memory_fs.move(src, dst)  # never replaces, like the real mover
+    with pytest.raises(FileNotFoundError):
+        memory_fs.move(src, os.path.join(TEST_PATH, 'Missing', 'a.jpg'))
+    with pytest.raises(OSError):
+        memory_fs.rmdir(os.path.join(TEST_PATH, 'sub'))  # not empty
+    memory_fs.move(src, os.path.join(TEST_PATH, 'sub', 'a.jpg'))
+    assert not memory_fs.exists(src)
+
+def test_memory_open(memory_fs):
+    """Test that files can be written, appended to, read back and truncated."""
+    path = os.path.join(TEST_PATH, 'notes', 'log.txt')
+    memory_fs.makedirs(os.path.dirname(path))
+    with memory_fs.open(path, 'w') as f:
+        f.write('one\n')
+    with memory_fs.open(path, 'ab') as f:
+        f.write(b'two\n')
+    with memory_fs.open(path, 'r') as f:
+        assert f.readlines() == ['one\n', 'two\n']
+    with memory_fs.open(path, 'wb') as f:
+        f.write(b'x')
+    assert memory_fs.stat(path).st_size == 1
+
+# ------------------------------ Test whole runs in memory ------------------------------
+
+def test_memory_copy_and_replace(memory_fs):
+    """Test the copy and replacing rename used to give a deduplicated file its own data back."""
+    src, dst = os.path.join(TEST_PATH, 'a.jpg'), os.path.join(TEST_PATH, 'Images', 'a.jpg')
+    memory_fs.copy(src, dst)  # replaces, like shutil.copy2
+    assert memory_fs.stat(dst).st_size == 3
+    assert memory_fs.stat(dst).st_ino != memory_fs.stat(src).st_ino
+    memory_fs.replace(dst, os.path.join(TEST_PATH, 'b.pdf'))
+    assert not memory_fs.exists(dst)
+    with pytest.raises(IsADirectoryError):
+        memory_fs.replace(src, os.path.join(TEST_PATH, 'sub'))
+
+def test_revert_hardlink_in_memory(memory_fs, monkeypatch):
+    """Test that reverting a deduplicated file never touches the real filesystem."""
+    duplicate = os.path.join(TEST_PATH, 'Images', 'a.jpg')
+    logger = ChangeLogger(TEST_PATH, log_format='jsonl', log_file=LOG_FILE)
+    logger.log_hardlink(os.path.join(TEST_PATH, 'a.jpg'), duplicate)
+    log_file = logger.save_log()
+    ino = memory_fs.stat(duplicate).st_ino
+
+    # the memory backend has no links, so pretend the duplicate still shares its data
+    real_stat = memory_fs.stat
+    def linked_stat(path, **kwargs):
+        result = real_stat(path, **kwargs)
+        result.st_nlink = 2
+        return result
+    monkeypatch.setattr(memory_fs, 'stat', linked_stat)
+    revert_changes(log_file)
+
+    assert real_stat(duplicate).st_ino != ino
+    assert not memory_fs.exists(duplicate + '.revert-tmp')
+    assert not memory_fs.exists(LOG_FILE)
+
+def test_clean_and_revert_in_memory(memory_fs):
+    """Test a recursive clean, its journal and its revert without touching the disk."""
+    before = sorted(memory_fs.walk_files(TEST_PATH))
+    logger = ChangeLogger(TEST_PATH, log_format='jsonl', log_file=LOG_FILE)
+    main(TEST_PATH, recursive=True, logger=logger)
+    logger.close()
+
+    images = os.path.join(TEST_PATH, 'Images')
+    with memory_fs.scandir(images) as entries:
+        assert sorted(entry.name for entry in entries) == ['a(1).jpg', 'a.jpg']
+    assert memory_fs.exists(os.path.join(TEST_PATH, 'sub', 'Video', 'g.mp4'))
+    moves = [change for change in iter_changes(LOG_FILE) if change[0] == "move"]
+    assert len(moves) == 7
+
+    revert_changes(LOG_FILE)
+    assert sorted(memory_fs.walk_files(TEST_PATH)) == before
+    assert not memory_fs.exists(LOG_FILE)
+    assert not memory_fs.exists(os.path.join(TEST_PATH, 'Documents'))
+
+def test_plan_in_memory(memory_fs):
+    """Test that a plan is built and applied against the memory backend."""
+    plan = build_plan(TEST_PATH, recursive=False)
+    assert plan.summary()['Images'] == 1
+    logger = ChangeLogger(TEST_PATH, log_format='jsonl', log_file=LOG_FILE)
+    assert execute_plan(plan, logger=logger) == 0
+    logger.close()
+    assert memory_fs.exists(os.path.join(TEST_PATH, 'Documents', 'b.pdf'))
+    assert memory_fs.exists(os.path.join(TEST_PATH, 'sub', 'f.png'))
+
+def test_compressed_logs_need_real_filesystem(memory_fs):
+    """Test that compressed logs are refused instead of silently written to disk."""
+    logger = ChangeLogger(TEST_PATH, log_format='jsonl', compression='gzip',
+                          log_file=LOG_FILE + '.gz')
+    with pytest.raises(ValueError):
+        logger.log_folder_creation(os.path.join(TEST_PATH, 'Images'))
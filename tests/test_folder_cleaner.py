@@ -5,6 +5,7 @@ This module contains comprehensive tests for the folder cleaning functionality,
 including tests for file categorization, recursion handling, and edge cases.
 """
 
+import inspect
 import pytest
 import os
 import sys
@@ -13,7 +14,9 @@ from typing import Generator
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from folder_cleaner import create_directories, get_files, map_file_to_category, get_unique_filename, main
+from folder_cleaner import (create_directories, get_files, scan_directory, map_file_to_category, get_unique_filename,
+                            main, move_files)
+from name_index import NameIndex
 from change_logger_singleton import initialize_logger, get_logger
 
 TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
@@ -105,6 +108,13 @@ def test_get_files(setup_paths):
                       'installer.exe', 'unknown.xyz', '.hiddenfile']
     assert sorted(files) == sorted(expected_files)
 
+def test_scan_directory(setup_paths):
+    """Test that a single scan splits entries into files and subdirectories."""
+    files, subdirs = scan_directory(setup_paths)
+    assert sorted(entry.name for entry in files) == sorted(get_files(setup_paths))
+    assert sorted(entry.name for entry in subdirs) == ['Audio', 'subfolder']
+    assert all(entry.path == os.path.join(setup_paths, entry.name) for entry in files + subdirs)
+
 # --------------------------------------- Tests for map_file_to_category ----------------------------------------
 
 def test_map_file_to_category():
@@ -233,4 +243,79 @@ def test_main_function_recursive_limited_depth(setup_paths):
 
     # Check sub-subfolder files are NOT processed (due to depth=1)
     assert os.path.exists(os.path.join(setup_paths, 'subfolder', 'sub_subfolder', 'subsubfile.txt'))
-    assert not os.path.exists(os.path.join(setup_paths, 'subfolder', 'sub_subfolder', 'Documents', 'subsubfile.txt'))
\ No newline at end of file
+    assert not os.path.exists(os.path.join(setup_paths, 'subfolder', 'sub_subfolder', 'Documents', 'subsubfile.txt'))
+# --------------------------------------- Tests for main with workers ----------------------------------------
+def test_main_function_workers(setup_paths):
+    """Test that threaded moves give the same result and log order as serial moves."""
+    main(setup_paths, workers=4)
+
+    assert os.path.exists(os.path.join(setup_paths, 'Audio', 'song.mp3'))
+    assert os.path.exists(os.path.join(setup_paths, 'Audio', 'song(1).mp3'))
+    assert os.path.exists(os.path.join(setup_paths, 'Others', 'unknown.xyz'))
+    assert get_files(setup_paths) == ['.hiddenfile']
+
+    moved = [os.path.basename(change["destination"]) for change in get_logger().changes if change["Type"] == "move"]
+    assert moved == ['song(1).mp3', 'video.mp4', 'document.pdf', 'image.jpg',
+                     'archive.zip', 'installer.exe', 'unknown.xyz']
+
+def test_move_files_name_taken_after_indexing(setup_paths):
+    """Test that a file created at a reserved name is never overwritten and the move is retried."""
+    audio = os.path.join(setup_paths, 'Audio')
+    name_index = NameIndex()
+    name_index.reserve(os.path.join(audio, 'placeholder.mp3'))  # index built before the file below appears
+    with open(os.path.join(audio, 'late.mp3'), 'w') as f:
+        f.write('written by someone else')
+    with open(os.path.join(setup_paths, 'late.mp3'), 'w') as f:
+        f.write('download')
+
+    failed = move_files(setup_paths, {'Audio': ['late.mp3']}, {'Audio': audio}, name_index=name_index)
+
+    assert failed == 0
+    with open(os.path.join(audio, 'late.mp3')) as f:
+        assert f.read() == 'written by someone else'
+    with open(os.path.join(audio, 'late(1).mp3')) as f:
+        assert f.read() == 'download'
+    assert get_logger().changes[-1]["destination"] == os.path.join(audio, 'late(1).mp3')
+
+# --------------------------------------- Tests for batched, iterative traversal ----------------------------------------
+def test_main_function_batches(setup_paths):
+    """Test that a directory moved in small batches resolves conflicts across batches and saves the log once."""
+    for i in range(10):
+        with open(os.path.join(setup_paths, f'track{i % 3}.mp3' if i < 6 else f'notes{i}.txt'), 'a') as f:
+            f.write(str(i))
+    for i in range(3):
+        shutil.copy(os.path.join(setup_paths, f'track{i}.mp3'), os.path.join(TEST_SUBFOLDER, f'track{i}.mp3'))
+
+    main(setup_paths, batch_size=2)
+
+    assert len(os.listdir(os.path.join(setup_paths, 'Audio'))) == 5  # song.mp3, its duplicate and 3 tracks
+    assert len(os.listdir(os.path.join(setup_paths, 'Documents'))) == 5
+    assert get_files(setup_paths) == ['.hiddenfile']
+    # no category folders are created in the subfolder without recursion
+    assert sorted(os.listdir(TEST_SUBFOLDER)) == ['sub_subfolder', 'subfile.txt', 'track0.mp3', 'track1.mp3', 'track2.mp3']
+
+def test_main_creates_only_needed_directories(setup_paths):
+    """Test that only the category folders files are moved into get created."""
+    main(setup_paths, recursive=True)
+
+    assert sorted(os.listdir(TEST_SUBFOLDER)) == ['Documents', 'sub_subfolder']
+    created = [change["destination"] for change in get_logger().changes if change["Type"] == "folder_creation"]
+    assert os.path.join(TEST_SUBFOLDER, 'Documents') in created
+    assert os.path.join(TEST_SUBFOLDER, 'Audio') not in created
+
+def test_main_deeper_than_recursion_limit(setup_paths):
+    """Test that trees deeper than Python's recursion limit allows are cleaned."""
+    deepest = os.path.join(setup_paths, *(['d'] * 100))
+    os.makedirs(deepest)
+    with open(os.path.join(deepest, 'bottom.pdf'), 'w') as f:
+        f.write('deep')
+
+    # leave far fewer spare frames than the tree is deep
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(len(inspect.stack()) + 50)
+    try:
+        main(setup_paths, recursive=True)
+    finally:
+        sys.setrecursionlimit(limit)
+
+    assert os.path.exists(os.path.join(deepest, 'Documents', 'bottom.pdf'))
@@ -0,0 +1,55 @@
+import os
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from name_index import NameIndex
+from folder_cleaner import get_unique_filename
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+
+@pytest.fixture
+def test_dir():
+    """Create a temporary test directory."""
+    os.makedirs(TEST_PATH, exist_ok=True)
+    yield TEST_PATH
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+
+# ------------------------------ Test reserving names ------------------------------
+
+def test_reserve_free_name(test_dir):
+    """Test that a free name is returned unchanged."""
+    index = NameIndex()
+    dst = os.path.join(test_dir, "file.txt")
+    assert index.reserve(dst) == dst
+
+def test_reserve_matches_filesystem_probe(test_dir):
+    """Test that the index resolves names the same way as probing the filesystem."""
+    for name in ["file.txt", "file(1).txt", "file(3).txt"]:
+        with open(os.path.join(test_dir, name), 'w') as f:
+            f.write(name)
+
+    index = NameIndex()
+    dst = os.path.join(test_dir, "file.txt")
+    assert index.reserve(dst) == get_unique_filename(dst) == os.path.join(test_dir, "file(2).txt")
+    assert index.reserve(dst) == os.path.join(test_dir, "file(4).txt")
+    assert index.reserve(dst) == os.path.join(test_dir, "file(5).txt")
+
+def test_reserve_missing_directory(test_dir):
+    """Test reserving a name in a directory that doesn't exist yet."""
+    index = NameIndex()
+    dst = os.path.join(test_dir, "missing", "file.txt")
+    assert index.reserve(dst) == dst
+    assert index.reserve(dst) == os.path.join(test_dir, "missing", "file(1).txt")
+
+def test_release(test_dir):
+    """Test that a released name can be reserved again."""
+    index = NameIndex()
+    dst = os.path.join(test_dir, "file.txt")
+    index.reserve(dst)
+    first_copy = index.reserve(dst)
+    index.release(first_copy)
+    assert index.reserve(dst) == first_copy
@@ -0,0 +1,81 @@
+import os
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pipeline
+from pipeline import run_pipeline
+from change_logger_singleton import initialize_logger, get_logger
+from revert_changes import revert_changes
+from folder_cleaner import DEFAULT_RULES, main
+from rules import RuleSet
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+
+def write(path: str) -> None:
+    with open(path, 'w') as f:
+        f.write(os.path.basename(path))
+
+@pytest.fixture
+def test_dir():
+    """Create a test directory with many files, a subfolder and an existing category folder."""
+    os.makedirs(os.path.join(TEST_PATH, 'subfolder', 'deeper'), exist_ok=True)
+    os.makedirs(os.path.join(TEST_PATH, 'Audio'), exist_ok=True)
+    for i in range(40):
+        write(os.path.join(TEST_PATH, f'song{i}.mp3'))
+        write(os.path.join(TEST_PATH, f'doc{i}.pdf'))
+    write(os.path.join(TEST_PATH, '.hidden'))
+    write(os.path.join(TEST_PATH, 'Audio', 'song0.mp3'))
+    write(os.path.join(TEST_PATH, 'subfolder', 'notes.txt'))
+    write(os.path.join(TEST_PATH, 'subfolder', 'deeper', 'clip.mp4'))
+    initialize_logger(TEST_PATH)
+    yield TEST_PATH
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+    if os.path.exists(get_logger().log_file):
+        os.remove(get_logger().log_file)
+
+# ------------------------------ Test the pipeline ------------------------------
+
+def test_run_pipeline(test_dir, monkeypatch):
+    """Test that streamed chunks through tiny queues end up where main would put them."""
+    monkeypatch.setattr(pipeline, 'SCAN_CHUNK', 7)
+    failed = run_pipeline(test_dir, recursive=True, recursionDepth=1, workers=3, queue_size=1)
+
+    assert failed == 0
+    assert len(os.listdir(os.path.join(test_dir, 'Documents'))) == 40
+    assert len(os.listdir(os.path.join(test_dir, 'Audio'))) == 41
+    assert os.path.exists(os.path.join(test_dir, 'Audio', 'song0(1).mp3'))
+    assert os.path.exists(os.path.join(test_dir, '.hidden'))
+    assert os.path.exists(os.path.join(test_dir, 'subfolder', 'Documents', 'notes.txt'))
+    # depth 1 stops before 'deeper'
+    assert os.path.exists(os.path.join(test_dir, 'subfolder', 'deeper', 'clip.mp4'))
+
+    moves = [change for change in get_logger().changes if change["Type"] == "move"]
+    assert len(moves) == 81
+
+def test_run_pipeline_revert(test_dir):
+    """Test that a pipelined run can be reverted completely."""
+    before = sorted(os.listdir(test_dir))
+    run_pipeline(test_dir, recursive=True, workers=2)
+    revert_changes(get_logger().log_file)
+    assert sorted(os.listdir(test_dir)) == before
+
+def test_run_pipeline_size_rules(test_dir):
+    """Test that size rules sort files the same way as main does."""
+    rules = RuleSet.from_config({"size": [{"min_size": 1000, "category": "Large"}]}, DEFAULT_RULES)
+    with open(os.path.join(test_dir, 'big.pdf'), 'w') as f:
+        f.write('x' * 2000)
+
+    run_pipeline(test_dir, rules=rules)
+    piped = {folder: sorted(os.listdir(os.path.join(test_dir, folder)))
+             for folder in ('Large', 'Documents', 'Audio')}
+    revert_changes(get_logger().log_file)
+
+    initialize_logger(test_dir)
+    main(test_dir, rules=rules)
+    assert piped == {folder: sorted(os.listdir(os.path.join(test_dir, folder)))
+                     for folder in ('Large', 'Documents', 'Audio')}
+    assert piped['Large'] == ['big.pdf']
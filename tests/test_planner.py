@@ -0,0 +1,81 @@
+import os
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from planner import MovePlan, build_plan, execute_plan
+from change_logger_singleton import initialize_logger, get_logger
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+PLAN_FILE = os.path.join(os.path.dirname(__file__), 'test_plan.json')
+
+def write(path: str) -> None:
+    with open(path, 'w') as f:
+        f.write(os.path.basename(path))
+
+@pytest.fixture
+def test_dir():
+    """Create a test directory with a subfolder and an existing category folder."""
+    os.makedirs(os.path.join(TEST_PATH, 'subfolder'), exist_ok=True)
+    os.makedirs(os.path.join(TEST_PATH, 'Audio'), exist_ok=True)
+    for name in ('song.mp3', 'doc.pdf', '.hidden'):
+        write(os.path.join(TEST_PATH, name))
+    write(os.path.join(TEST_PATH, 'Audio', 'song.mp3'))
+    write(os.path.join(TEST_PATH, 'subfolder', 'song.mp3'))
+    initialize_logger(TEST_PATH)
+    yield TEST_PATH
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+    if os.path.exists(PLAN_FILE):
+        os.remove(PLAN_FILE)
+    if os.path.exists(get_logger().log_file):
+        os.remove(get_logger().log_file)
+
+# ------------------------------ Test planning ------------------------------
+
+def test_build_plan_touches_nothing(test_dir):
+    """Test that planning resolves conflicts in memory without moving or creating anything."""
+    before = sorted(os.listdir(test_dir))
+    plan = build_plan(test_dir, recursive=True)
+
+    assert sorted(os.listdir(test_dir)) == before
+    assert (os.path.join(test_dir, 'song.mp3'), os.path.join(test_dir, 'Audio', 'song(1).mp3')) in plan.moves
+    assert (os.path.join(test_dir, 'subfolder', 'song.mp3'),
+            os.path.join(test_dir, 'subfolder', 'Audio', 'song.mp3')) in plan.moves
+    assert os.path.join(test_dir, 'Documents') in plan.create_directories
+    assert os.path.join(test_dir, 'Audio') not in plan.create_directories
+    assert plan.summary() == {'Audio': 2, 'Documents': 1}
+
+def test_plan_round_trip(test_dir):
+    """Test that a saved plan loads back unchanged."""
+    plan = build_plan(test_dir, recursive=True)
+    plan.save(PLAN_FILE)
+    loaded = MovePlan.load(PLAN_FILE)
+    assert loaded.moves == plan.moves
+    assert loaded.create_directories == plan.create_directories
+    assert loaded.base_path == plan.base_path
+
+# ------------------------------ Test executing ------------------------------
+
+def test_execute_plan(test_dir):
+    """Test that executing a plan performs and logs every move."""
+    plan = build_plan(test_dir, recursive=True)
+    assert execute_plan(plan, workers=2) == 0
+
+    assert os.path.exists(os.path.join(test_dir, 'Audio', 'song(1).mp3'))
+    assert os.path.exists(os.path.join(test_dir, 'Documents', 'doc.pdf'))
+    assert os.path.exists(os.path.join(test_dir, 'subfolder', 'Audio', 'song.mp3'))
+    assert os.path.exists(os.path.join(test_dir, '.hidden'))
+    moves = [(change["source"], change["destination"]) for change in get_logger().changes if change["Type"] == "move"]
+    assert moves == plan.moves
+
+def test_execute_plan_never_overwrites(test_dir):
+    """Test that a file appearing at a planned destination is not overwritten."""
+    plan = build_plan(test_dir)
+    write(os.path.join(test_dir, 'Audio', 'song(1).mp3'))
+
+    assert execute_plan(plan) == 1
+    assert os.path.exists(os.path.join(test_dir, 'song.mp3'))
+    assert os.path.exists(os.path.join(test_dir, 'Documents', 'doc.pdf'))
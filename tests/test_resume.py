@@ -0,0 +1,131 @@
+import json
+import os
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from change_logger import ChangeLogger, iter_changes
+from folder_cleaner import main
+from resume import reconcile
+from revert_changes import revert_changes
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+LOGS_PATH = os.path.join(os.path.dirname(__file__), 'test_logs')
+
+def write(path: str) -> None:
+    with open(path, 'w') as f:
+        f.write(os.path.basename(path))
+
+@pytest.fixture
+def test_dir():
+    """Create a root with loose files and a subfolder."""
+    os.makedirs(os.path.join(TEST_PATH, 'subfolder'), exist_ok=True)
+    for name in ('a.pdf', 'b.pdf', 'c.mp3', os.path.join('subfolder', 'd.pdf')):
+        write(os.path.join(TEST_PATH, name))
+    yield TEST_PATH
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+
+@pytest.fixture
+def journal(test_dir):
+    """Journal path outside the cleaned tree, so recursive runs don't move it."""
+    yield os.path.join(LOGS_PATH, 'run.jsonl')
+    if os.path.exists(LOGS_PATH):
+        shutil.rmtree(LOGS_PATH)
+
+# ------------------------------ Test the write-ahead journal ------------------------------
+
+def test_journal_records_intents_and_checkpoints(test_dir, journal):
+    """Test that moves are written ahead and directories checkpointed, invisibly to readers."""
+    logger = ChangeLogger(test_dir, log_format='jsonl', log_file=journal)
+    main(test_dir, recursive=True, logger=logger)
+    logger.close()
+
+    with open(journal, 'r') as f:
+        types = [json.loads(line).get("Type") for line in f]
+    assert types.count("intent") == types.count("move") == 4
+    assert types.index("intent") < types.index("move")
+    assert types.count("checkpoint") == 2
+    assert {change[0] for change in iter_changes(journal)} == {"move", "folder_creation"}
+
+    revert_changes(journal)
+    assert sorted(os.listdir(test_dir)) == ['a.pdf', 'b.pdf', 'c.mp3', 'subfolder']
+
+# ------------------------------ Test resume ------------------------------
+
+def test_resume_interrupted_run(test_dir, journal):
+    """Test resuming a run killed during a batch of moves."""
+    documents = os.path.join(test_dir, 'Documents')
+    audio = os.path.join(test_dir, 'Audio')
+    subfolder = os.path.join(test_dir, 'subfolder')
+    logger = ChangeLogger(test_dir, log_format='jsonl', log_file=journal)
+    # the subfolder was finished before the root, and its file stays behind on resume
+    logger.log_checkpoint(subfolder, [])
+    os.mkdir(documents)
+    os.mkdir(audio)
+    logger.log_intents([(os.path.join(test_dir, 'a.pdf'), os.path.join(documents, 'a.pdf')),
+                        (os.path.join(test_dir, 'b.pdf'), os.path.join(documents, 'b.pdf')),
+                        (os.path.join(test_dir, 'c.mp3'), os.path.join(audio, 'c.mp3'))])
+    # killed after renaming a.pdf and copying b.pdf across devices, before removing the original
+    os.rename(os.path.join(test_dir, 'a.pdf'), os.path.join(documents, 'a.pdf'))
+    shutil.copy2(os.path.join(test_dir, 'b.pdf'), os.path.join(documents, 'b.pdf'))
+    write(os.path.join(audio, '.c.mp3.1234.partial'))
+    logger._journal.close()
+
+    resumed = ChangeLogger.resume(journal)
+    assert resumed.timestamp == logger.timestamp
+    assert len(resumed.pending) == 3
+    assert resumed.finished == {subfolder: []}
+    assert reconcile(resumed) == (2, 1)
+    assert not os.path.exists(os.path.join(test_dir, 'b.pdf'))
+    assert os.listdir(audio) == []
+
+    main(test_dir, recursive=True, logger=resumed)
+    resumed.close()
+    assert os.path.exists(os.path.join(audio, 'c.mp3'))
+    assert sorted(os.listdir(documents)) == ['a.pdf', 'b.pdf']
+    assert os.path.exists(os.path.join(subfolder, 'd.pdf'))
+
+    revert_changes(journal)
+    assert sorted(os.listdir(test_dir)) == ['Audio', 'Documents', 'a.pdf', 'b.pdf', 'c.mp3', 'subfolder']
+
+def test_resume_after_torn_record(test_dir, journal):
+    """Test that a record torn by the kill doesn't swallow the records appended on resume."""
+    logger = ChangeLogger(test_dir, log_format='jsonl', log_file=journal)
+    logger.log_folder_creation(os.path.join(test_dir, 'Documents'))
+    logger.close()
+    with open(journal, 'a') as f:
+        f.write('{"Type":"move","sou')
+
+    resumed = ChangeLogger.resume(journal)
+    resumed.log_move(os.path.join(test_dir, 'a.pdf'), os.path.join(test_dir, 'Documents', 'a.pdf'))
+    resumed.close()
+    assert [change[0] for change in iter_changes(journal)] == ["folder_creation", "move"]
+
+def test_resume_cut_off_compressed_journal(test_dir, journal):
+    """Test that a gzip journal cut off by a crash resumes from its last complete record."""
+    logger = ChangeLogger(test_dir, log_format='jsonl', flush_interval=1, log_file=journal + '.gz')
+    logger.log_folder_creation(os.path.join(test_dir, 'Documents'))
+    logger.log_move(os.path.join(test_dir, 'b.pdf'), os.path.join(test_dir, 'Documents', 'b.pdf'))
+    with open(logger.log_file, 'rb') as f:
+        crashed = f.read()  # flushed records, but no end-of-stream marker
+    logger.close()
+    with open(logger.log_file, 'wb') as f:
+        f.write(crashed)
+
+    assert [change[0] for change in iter_changes(logger.log_file)] == ["folder_creation", "move"]
+    resumed = ChangeLogger.resume(logger.log_file)
+    assert len(resumed.changes) == 2
+    resumed.log_move(os.path.join(test_dir, 'a.pdf'), os.path.join(test_dir, 'Documents', 'a.pdf'))
+    resumed.close()
+    destinations = [dst for _, _, dst in iter_changes(logger.log_file, reverse=True)]
+    assert destinations == [os.path.join(test_dir, 'Documents', 'a.pdf'), os.path.join(test_dir, 'Documents', 'b.pdf'),
+                            os.path.join(test_dir, 'Documents')]
+
+def test_resume_rejects_json_log(test_dir):
+    """Test that only journals can be resumed."""
+    logger = ChangeLogger(test_dir, log_file=os.path.join(test_dir, 'run.json'))
+    with pytest.raises(ValueError):
+        ChangeLogger.resume(logger.save_log())
@@ -0,0 +1,167 @@
+import os
+import re
+import fnmatch
+import json
+import random
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rules import RuleSet, load_rules, _literal_prefix, _rule_literal, _CASE_TWINS
+from folder_cleaner import DEFAULT_RULES, main
+from change_logger_singleton import initialize_logger, get_logger
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+
+@pytest.fixture
+def test_dir():
+    """Create a temporary test directory."""
+    os.makedirs(TEST_PATH, exist_ok=True)
+    initialize_logger(TEST_PATH)
+    yield TEST_PATH
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+    if os.path.exists(get_logger().log_file):
+        os.remove(get_logger().log_file)
+
+# ------------------------------ Test rule priority ------------------------------
+
+def test_default_rules():
+    """Test that the built-in rules match the extension sets."""
+    assert DEFAULT_RULES.categories == ['Audio', 'Video', 'Documents', 'Images', 'Archives', 'Installers', 'Others']
+    assert DEFAULT_RULES.classify('song.MP3') == 'Audio'
+    assert DEFAULT_RULES.classify('noextension') == 'Others'
+
+def test_rule_priority():
+    """Test that patterns beat size rules, which beat extensions."""
+    rules = RuleSet.from_config({
+        "categories": {"Ebooks": [".epub", "mobi"]},
+        "patterns": [
+            {"glob": "Screenshot*.png", "category": "Screenshots"},
+            {"regex": r"invoice_\d+", "category": "Invoices", "ignore_case": True},
+        ],
+        "size": [{"min_size": 1000, "category": "Large"}],
+    }, DEFAULT_RULES)
+
+    assert rules.classify('Screenshot 2024.png', size=5000) == 'Screenshots'
+    assert rules.classify('INVOICE_42.pdf') == 'Invoices'
+    assert rules.classify('book.epub') == 'Ebooks'
+    assert rules.classify('book.mobi', size=5000) == 'Large'
+    assert rules.classify('photo.png') == 'Images'
+    assert rules.categories[-1] == 'Others'
+    assert {'Ebooks', 'Screenshots', 'Invoices', 'Large'} <= set(rules.categories)
+
+def test_extension_globs_become_lookups():
+    """Test that globs only constraining the extension are folded into the extension table."""
+    rules = RuleSet.from_config({"patterns": [{"glob": "*.epub", "category": "Ebooks"},
+                                              {"glob": "*.pdf", "category": "Papers"}]}, DEFAULT_RULES)
+    assert rules.pattern_rules == []
+    assert rules.classify('book.epub') == 'Ebooks'
+    assert rules.classify('paper.pdf') == 'Papers'
+
+def test_extension_globs_keep_pattern_order():
+    """Test that an extension glob followed by other patterns still wins when it comes first."""
+    patterns = [{"glob": "*.pdf", "category": "A"}, {"glob": "invoice*", "category": "B"},
+                {"glob": "*.PDF", "category": "C"}, {"glob": "*.txt", "category": "D", "ignore_case": True},
+                {"glob": "*.TXT", "category": "E"}]
+    rules = RuleSet.from_config({"include_defaults": False, "patterns": patterns,
+                                 "size": [{"min_size": 10, "category": "Large"}]}, DEFAULT_RULES)
+    assert [category for _, _, category in rules.extension_patterns] == ['C', 'D', 'E']
+
+    for name in ('invoice.pdf', 'invoice.PDF', 'x.Pdf', 'x.pdf', 'x.PDF', 'invoice.TXT', 'a.TxT', '.pdf',
+                 'x.pdf.zip', 'invoice'):
+        expected = next((rule["category"] for rule in patterns
+                         if re.match(fnmatch.translate(rule["glob"]), name,
+                                     re.IGNORECASE if rule.get("ignore_case") else 0)), None)
+        assert rules.classify(name, size=100) == (expected or 'Large'), name
+
+def test_without_defaults():
+    """Test that the built-in rules can be dropped."""
+    rules = RuleSet.from_config({"include_defaults": False, "categories": {"Music": [".mp3"]},
+                                 "default": "Misc"}, DEFAULT_RULES)
+    assert rules.categories == ['Music', 'Misc']
+    assert rules.classify('photo.png') == 'Misc'
+
+# ------------------------------ Test the compiled pattern index ------------------------------
+
+def test_literal_prefix():
+    """Test extraction of the literal text a pattern has to start with."""
+    assert _literal_prefix(r'report_\d+') == 'report_'
+    assert _literal_prefix(r'a\.b') == 'a.b'
+    assert _literal_prefix('abc?') == 'ab'
+    assert _literal_prefix('abc|def') == ''
+    assert _literal_prefix('(?i:abc)') == ''
+
+def test_many_patterns_match_first_rule():
+    """Test that the pattern index picks the same rule as checking every pattern in order."""
+    rng = random.Random(1)
+    patterns = []
+    for i in range(300):
+        prefix = ''.join(rng.choice('abc') for _ in range(rng.randrange(0, 4)))
+        patterns.append({"regex": f"{prefix}{rng.choice(['x', '.', 'y?'])}{i % 7}", "category": f"C{i}"})
+    patterns.append({"regex": "a|b", "category": "Alternation"})
+    rules = RuleSet.from_config({"patterns": patterns}, DEFAULT_RULES)
+
+    for _ in range(2000):
+        name = ''.join(rng.choice('abcxy0123456') for _ in range(rng.randrange(0, 7)))
+        expected = next((rule["category"] for rule in patterns if re.match(rule["regex"], name)), None)
+        expected = expected or DEFAULT_RULES.classify(name)
+        assert rules.classify(name) == expected, name
+
+def test_rule_literal():
+    """Test which literal a rule is indexed by, and whether it is folded or may appear anywhere."""
+    assert _rule_literal('(?i:(?s:Prefix.*)\\Z)') == ('prefix', True, False)
+    assert _rule_literal('(?s:(?>.*?tag12).*)\\Z') == ('tag12', False, True)
+    assert _rule_literal(r'.*report_\d+') == ('report_', False, True)
+    assert _rule_literal('(?i:Caf\u00e9)') == ('caf', True, False)
+
+def test_case_twins_complete():
+    """Test that _CASE_TWINS lists every non-ASCII character matching an ASCII letter case-insensitively."""
+    others = ''.join(chr(c) for c in range(0x80, sys.maxunicode + 1) if not 0xD800 <= c <= 0xDFFF)
+    twins = {}
+    for letter in 'abcdefghijklmnopqrstuvwxyz':
+        for char in re.findall(f'(?i){letter}', others):
+            twins[char] = letter
+    assert twins == _CASE_TWINS
+
+def test_folded_and_unanchored_patterns_match_first_rule():
+    """Test case-insensitive and unanchored rules against checking every pattern in order."""
+    rng = random.Random(2)
+    alphabet = 'aBiKsxY01_.'
+    patterns = []
+    for i in range(400):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randrange(1, 6)))
+        kind = rng.randrange(4)
+        if kind == 0:
+            patterns.append({"glob": f"*{text}*", "category": f"C{i}", "ignore_case": rng.random() < 0.5})
+        elif kind == 1:
+            patterns.append({"regex": f".*{re.escape(text)}", "category": f"C{i}", "ignore_case": rng.random() < 0.5})
+        else:
+            patterns.append({"regex": re.escape(text), "category": f"C{i}", "ignore_case": kind == 2})
+    rules = RuleSet.from_config({"include_defaults": False, "patterns": patterns}, DEFAULT_RULES)
+
+    for _ in range(3000):
+        name = ''.join(rng.choice(alphabet + 'AbIkSXy\u0130\u0131\u017f\u212a') for _ in range(rng.randrange(0, 10)))
+        expected = next((rule["category"] for rule in patterns
+                         if re.match(rule.get("regex") or fnmatch.translate(rule["glob"]), name,
+                                     re.IGNORECASE if rule["ignore_case"] else 0)), 'Others')
+        assert rules.classify(name) == expected, name
+
+# ------------------------------ Test loading rules ------------------------------
+
+def test_load_rules_and_clean(test_dir):
+    """Test cleaning a folder with rules loaded from a config file."""
+    config_file = os.path.join(test_dir, 'rules.json')
+    with open(config_file, 'w') as f:
+        json.dump({"patterns": [{"glob": "Screenshot*", "category": "Screenshots"}]}, f)
+    for name in ('Screenshot 1.png', 'photo.png'):
+        with open(os.path.join(test_dir, name), 'w') as f:
+            f.write(name)
+
+    main(test_dir, rules=load_rules(config_file, DEFAULT_RULES))
+
+    assert os.path.exists(os.path.join(test_dir, 'Screenshots', 'Screenshot 1.png'))
+    assert os.path.exists(os.path.join(test_dir, 'Images', 'photo.png'))
+    assert os.path.exists(os.path.join(test_dir, 'Others', 'rules.json'))
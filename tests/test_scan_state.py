@@ -0,0 +1,64 @@
+import os
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scan_state import ScanState
+from folder_cleaner import main
+from change_logger_singleton import initialize_logger, get_logger
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+STATE_FILE = os.path.join(os.path.dirname(__file__), 'test_scan_state.json')
+
+@pytest.fixture
+def test_dir():
+    """Create a temporary test directory with a nested subfolder."""
+    os.makedirs(os.path.join(TEST_PATH, 'subfolder'), exist_ok=True)
+    with open(os.path.join(TEST_PATH, 'song.mp3'), 'w') as f:
+        f.write('test audio')
+    with open(os.path.join(TEST_PATH, 'subfolder', 'doc.pdf'), 'w') as f:
+        f.write('test doc')
+    initialize_logger(TEST_PATH)
+    yield TEST_PATH
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+    if os.path.exists(STATE_FILE):
+        os.remove(STATE_FILE)
+    if os.path.exists(get_logger().log_file):
+        os.remove(get_logger().log_file)
+
+def run(path: str) -> ScanState:
+    """Run a recursive clean with the state file and save it."""
+    state = ScanState(STATE_FILE)
+    main(path, recursive=True, scan_state=state)
+    state.save()
+    return state
+
+# ------------------------------ Test skipping unchanged directories ------------------------------
+
+def test_unchanged_directories_are_skipped(test_dir):
+    """Test that directories are skipped once a run leaves them clean and unchanged."""
+    assert run(test_dir).skipped == 0  # first run moves files
+    assert run(test_dir).skipped == 0  # directories changed by the first run are rescanned
+    assert run(test_dir).skipped == 2  # nothing changed since the last clean run
+
+def test_changed_directories_are_rescanned(test_dir):
+    """Test that new files are still cleaned in skipped trees."""
+    for _ in range(3):
+        run(test_dir)
+
+    with open(os.path.join(test_dir, 'subfolder', 'new.mp3'), 'w') as f:
+        f.write('new audio')
+    state = run(test_dir)
+
+    assert state.skipped == 1  # only the root is skipped
+    assert os.path.exists(os.path.join(test_dir, 'subfolder', 'Audio', 'new.mp3'))
+
+def test_unknown_state_version(test_dir):
+    """Test that a state file from another version is ignored."""
+    with open(STATE_FILE, 'w') as f:
+        f.write('{"version": 0, "directories": {}}')
+    state = ScanState(STATE_FILE)
+    assert state.unchanged_subdirs(test_dir) is None
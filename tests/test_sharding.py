@@ -0,0 +1,87 @@
+import os
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sharding import clean_sharded, normalize_roots, plan_shards
+from change_logger import ChangeLogger, iter_changes
+from revert_changes import revert_changes
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+
+def write(path: str) -> None:
+    with open(path, 'w') as f:
+        f.write(os.path.basename(path))
+
+@pytest.fixture
+def test_dir():
+    """Create a root with loose files, two user folders and an existing category folder."""
+    for user in ('alice', 'bob'):
+        os.makedirs(os.path.join(TEST_PATH, user, 'nested'), exist_ok=True)
+        write(os.path.join(TEST_PATH, user, 'song.mp3'))
+        write(os.path.join(TEST_PATH, user, 'nested', 'doc.pdf'))
+    os.makedirs(os.path.join(TEST_PATH, 'Audio'), exist_ok=True)
+    write(os.path.join(TEST_PATH, 'setup.exe'))
+    yield TEST_PATH
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+
+@pytest.fixture
+def logger(test_dir):
+    """Logger receiving the merged changes, writing inside the test folder."""
+    logs = os.path.join(test_dir, 'logs')
+    return ChangeLogger(test_dir, log_file=os.path.join(logs, 'merged.json'))
+
+# ------------------------------ Test sharding ------------------------------
+
+def test_plan_shards(test_dir):
+    """Test that auto-sharding splits off top-level subfolders but not category folders."""
+    alice, bob = os.path.join(test_dir, 'alice'), os.path.join(test_dir, 'bob')
+    assert plan_shards([test_dir], recursive=True, recursionDepth=2, auto_shard=True) == [
+        (test_dir, False, 0), (alice, True, 1), (bob, True, 1)]
+    assert plan_shards([alice, bob], recursive=True) == [(alice, True, -1), (bob, True, -1)]
+    # nothing below the root to shard without recursion
+    assert plan_shards([test_dir], auto_shard=True) == [(test_dir, False, -1)]
+
+def test_nested_roots(test_dir):
+    """Test that repeated roots are dropped and roots inside other roots are rejected."""
+    alice, bob = os.path.join(test_dir, 'alice'), os.path.join(test_dir, 'bob')
+    assert normalize_roots([alice, os.path.join(bob, '..', 'alice', ''), bob]) == [alice, bob]
+    with pytest.raises(ValueError):
+        normalize_roots([os.path.join(alice, 'nested'), bob, alice])
+    with pytest.raises(ValueError):
+        plan_shards([test_dir, bob], recursive=True)
+    # a sibling sharing a name prefix is not nested
+    os.makedirs(alice + '2')
+    assert normalize_roots([alice, alice + '2']) == [alice, alice + '2']
+
+def test_clean_sharded_merges_in_shard_order(test_dir, logger):
+    """Test that shards cleaned in parallel end up in one log, ordered by shard."""
+    log_file = clean_sharded([test_dir], logger, recursive=True, auto_shard=True, processes=2)
+
+    assert os.path.exists(os.path.join(test_dir, 'Installers', 'setup.exe'))
+    assert os.path.exists(os.path.join(test_dir, 'alice', 'Audio', 'song.mp3'))
+    assert os.path.exists(os.path.join(test_dir, 'bob', 'nested', 'Documents', 'doc.pdf'))
+
+    sources = [src for change_type, src, _ in iter_changes(log_file) if change_type == "move"]
+    assert sources == [os.path.join(test_dir, 'setup.exe'),
+                       os.path.join(test_dir, 'alice', 'song.mp3'),
+                       os.path.join(test_dir, 'alice', 'nested', 'doc.pdf'),
+                       os.path.join(test_dir, 'bob', 'song.mp3'),
+                       os.path.join(test_dir, 'bob', 'nested', 'doc.pdf')]
+    # the per-shard journals are merged away
+    assert os.listdir(os.path.dirname(log_file)) == ['merged.json']
+
+def test_clean_sharded_roots_revert(test_dir, logger):
+    """Test cleaning several roots and reverting the merged log."""
+    roots = [os.path.join(test_dir, 'alice'), os.path.join(test_dir, 'bob')]
+    before = sorted(os.listdir(roots[0]))
+    log_file = clean_sharded(roots, logger, recursive=True, processes=2)
+    assert os.path.exists(os.path.join(test_dir, 'bob', 'Audio', 'song.mp3'))
+    assert os.path.exists(os.path.join(test_dir, 'setup.exe'))  # not one of the roots
+
+    revert_changes(log_file)
+    assert sorted(os.listdir(roots[0])) == before
+    assert os.path.exists(os.path.join(test_dir, 'bob', 'nested', 'doc.pdf'))
@@ -0,0 +1,95 @@
+import os
+import shutil
+import threading
+import time
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stability
+from stability import StabilityFilter, is_partial_download
+from folder_cleaner import main
+from change_logger import ChangeLogger
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+
+def write(path: str, data: str = 'x') -> None:
+    with open(path, 'w') as f:
+        f.write(data)
+
+def age(path: str, seconds: float = 60) -> None:
+    """Push a file's mtime into the past."""
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+@pytest.fixture
+def test_dir():
+    """Create a folder with finished files and in-flight downloads."""
+    os.makedirs(TEST_PATH, exist_ok=True)
+    for name in ('old.pdf', 'movie.mp4.crdownload', 'archive.zip.part', 'Setup.EXE.PART'):
+        write(os.path.join(TEST_PATH, name))
+        age(os.path.join(TEST_PATH, name))
+    yield TEST_PATH
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+
+# ------------------------------ Test the stability filter ------------------------------
+
+def test_is_partial_download():
+    """Test the partial-download suffixes, case-insensitively."""
+    assert is_partial_download('movie.mp4.crdownload')
+    assert is_partial_download('a.ZIP.Part')
+    assert is_partial_download('torrent.iso.!ut')
+    assert not is_partial_download('report.pdf')
+    assert not is_partial_download('party.mp3')
+
+def test_filter_sleeps_once_for_recent_files(test_dir, monkeypatch):
+    """Test that recently modified files are sampled twice around a single sleep."""
+    sleeps = []
+    monkeypatch.setattr(stability.time, 'sleep', sleeps.append)
+    for i in range(5):
+        write(os.path.join(test_dir, f'fresh{i}.mp3'))
+
+    file_map = {'Documents': ['old.pdf'], 'Audio': [f'fresh{i}.mp3' for i in range(5)],
+                'Others': ['movie.mp4.crdownload', 'archive.zip.part', 'Setup.EXE.PART']}
+    skipped = StabilityFilter(delay=5).filter(test_dir, file_map)
+
+    assert sleeps == [5]
+    assert skipped == 3
+    assert file_map == {'Documents': ['old.pdf'], 'Audio': [f'fresh{i}.mp3' for i in range(5)], 'Others': []}
+
+def test_filter_no_sleep_for_settled_files(test_dir, monkeypatch):
+    """Test that files untouched for longer than the delay are kept without sleeping."""
+    sleeps = []
+    monkeypatch.setattr(stability.time, 'sleep', sleeps.append)
+    file_map = {'Documents': ['old.pdf']}
+    assert StabilityFilter(delay=5).filter(test_dir, file_map) == 0
+    assert sleeps == []
+    assert file_map == {'Documents': ['old.pdf']}
+
+def test_filter_skips_growing_file(test_dir):
+    """Test that a file still being written to during the delay is left out."""
+    growing = os.path.join(test_dir, 'growing.mp4')
+    write(growing)
+
+    def append():
+        time.sleep(0.05)
+        with open(growing, 'a') as f:
+            f.write('more')
+    writer = threading.Thread(target=append)
+    writer.start()
+    file_map = {'Video': ['growing.mp4'], 'Documents': ['old.pdf']}
+    StabilityFilter(delay=0.3).filter(test_dir, file_map)
+    writer.join()
+    assert file_map == {'Video': [], 'Documents': ['old.pdf']}
+
+def test_main_leaves_partial_downloads(test_dir):
+    """Test that a clean with the filter moves finished files only."""
+    logger = ChangeLogger(test_dir, log_file=os.path.join(test_dir, 'logs', 'log.json'))
+    main(test_dir, stability=StabilityFilter(delay=1), logger=logger)
+
+    assert os.path.exists(os.path.join(test_dir, 'Documents', 'old.pdf'))
+    for name in ('movie.mp4.crdownload', 'archive.zip.part', 'Setup.EXE.PART'):
+        assert os.path.exists(os.path.join(test_dir, name))
+    assert not os.path.exists(os.path.join(test_dir, 'Others'))
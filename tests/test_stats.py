@@ -0,0 +1,82 @@
+import os
+import json
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stats
+from folder_cleaner import main
+from change_logger_singleton import initialize_logger, get_logger
+from revert_changes import revert_changes
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+STATS_FILE = os.path.join(os.path.dirname(__file__), 'test_stats.json')
+
+@pytest.fixture
+def test_dir():
+    """Create a temporary test directory with a few files and stats enabled."""
+    os.makedirs(TEST_PATH, exist_ok=True)
+    for name in ('song.mp3', 'doc.pdf', 'other.xyz'):
+        with open(os.path.join(TEST_PATH, name), 'w') as f:
+            f.write(name)
+    initialize_logger(TEST_PATH)
+    yield TEST_PATH
+    stats.disable_stats()
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+    if os.path.exists(STATS_FILE):
+        os.remove(STATS_FILE)
+    if os.path.exists(get_logger().log_file):
+        os.remove(get_logger().log_file)
+
+# ------------------------------ Test collection ------------------------------
+
+def test_disabled_by_default():
+    """Test that the helpers are no-ops while stats are disabled."""
+    stats.disable_stats()
+    stats.count('rename')
+    stats.observe('rename', 0.001)
+    with stats.timer('scan'):
+        pass
+    assert stats.get_stats() is None
+
+def test_histogram_buckets():
+    """Test that latencies land in power-of-two microsecond buckets."""
+    collector = stats.Stats()
+    collector.observe('rename', 0.000005)  # 5us
+    collector.observe('rename', 0.000006)
+    collector.observe('rename', 0.001)  # 1000us
+    assert collector.to_dict()["histograms"]["rename"] == {"<8us": 2, "<1024us": 1}
+
+def test_main_collects_stats(test_dir):
+    """Test that a clean and its revert are counted per phase and syscall."""
+    collector = stats.enable_stats()
+    main(test_dir)
+    assert collector.counters["files"] == 3
+    assert collector.counters["rename"] == 3
+    assert collector.counters["listdir"] >= 1
+    assert collector.counters["log_bytes"] == os.path.getsize(get_logger().log_file)
+    assert {"scan", "classify", "conflicts", "rename", "save_log"} <= set(collector.phases)
+    assert sum(collector.histograms["rename"].values()) == 3
+
+    revert_changes(get_logger().log_file)
+    assert collector.counters["rename"] == 6
+    assert "revert_rename" in collector.phases
+
+    stats.finish(json_path=STATS_FILE)
+    with open(STATS_FILE) as f:
+        assert json.load(f)["counters"]["files"] == 3
+
+def test_save_log_timed_once(test_dir, monkeypatch):
+    """Test that saving the log at the end of main is added to its phase once, not per nested timer."""
+    collector = stats.enable_stats()
+    added = []
+    add_time = collector.add_time
+    def record(phase, seconds):
+        added.append(phase)
+        add_time(phase, seconds)
+    monkeypatch.setattr(collector, 'add_time', record)
+    main(test_dir)
+    assert added.count("save_log") == 1
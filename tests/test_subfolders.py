@@ -0,0 +1,122 @@
+import os
+import shutil
+import time
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_ops
+from file_ops import DirectoryFds
+from subfolders import SubfolderLayout, move_category
+from folder_cleaner import main
+from change_logger import ChangeLogger, iter_changes
+from planner import build_plan
+from revert_changes import revert_changes
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+LOGS_PATH = os.path.join(os.path.dirname(__file__), 'test_logs')
+
+def write(path: str) -> None:
+    with open(path, 'w') as f:
+        f.write(os.path.basename(path))
+
+@pytest.fixture
+def test_dir():
+    """Create a folder with a few images and an existing Images folder holding a flat file."""
+    os.makedirs(os.path.join(TEST_PATH, 'Images'), exist_ok=True)
+    write(os.path.join(TEST_PATH, 'Images', 'old.png'))
+    for i in range(5):
+        write(os.path.join(TEST_PATH, f'photo{i}.jpg'))
+    yield TEST_PATH
+    for path in (TEST_PATH, LOGS_PATH):
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+@pytest.fixture
+def logger(test_dir):
+    return ChangeLogger(test_dir, log_file=os.path.join(LOGS_PATH, 'log.json'))
+
+# ------------------------------ Test the layouts ------------------------------
+
+def test_date_layout(test_dir, logger):
+    """Test that files go into a subfolder per modification month."""
+    march = time.mktime((2024, 3, 15, 12, 0, 0, 0, 0, -1))
+    os.utime(os.path.join(test_dir, 'photo0.jpg'), (march, march))
+    main(test_dir, layout=SubfolderLayout('date'), logger=logger)
+
+    images = os.path.join(test_dir, 'Images')
+    this_month = time.strftime('%Y-%m')
+    assert os.listdir(os.path.join(images, '2024-03')) == ['photo0.jpg']
+    assert len(os.listdir(os.path.join(images, this_month))) == 4
+    assert os.path.exists(os.path.join(images, 'old.png'))  # flat files stay put
+
+def test_hash_layout_is_stable(test_dir):
+    """Test that a name always hashes to the same two-digit subfolder."""
+    layout = SubfolderLayout('hash')
+    first = layout.directory('Images', os.path.join(test_dir, 'photo0.jpg'))
+    assert first == layout.directory('Images', os.path.join('elsewhere', 'photo0.jpg'))
+    assert len(os.path.basename(first)) == 2
+
+def test_count_layout_fills_up(test_dir, logger):
+    """Test that numbered subfolders are filled up to the limit, continuing where the last run stopped."""
+    images = os.path.join(test_dir, 'Images')
+    os.makedirs(os.path.join(images, '0007'))
+    write(os.path.join(images, '0007', 'earlier.jpg'))
+    main(test_dir, layout=SubfolderLayout('count', limit=2), logger=logger)
+
+    assert sorted(os.listdir(images)) == ['0007', '0008', '0009', 'old.png']
+    assert [len(os.listdir(os.path.join(images, folder))) for folder in ('0007', '0008', '0009')] == [2, 2, 2]
+    assert 'earlier.jpg' in os.listdir(os.path.join(images, '0007'))
+
+def test_layout_revert(test_dir, logger):
+    """Test that subfolders are logged, so a revert removes them again."""
+    before = sorted(os.listdir(test_dir))
+    main(test_dir, layout=SubfolderLayout('hash'), logger=logger)
+    created = [dst for change_type, _, dst in iter_changes(logger.log_file) if change_type == "folder_creation"]
+    assert created and all(os.path.dirname(folder) == os.path.join(test_dir, 'Images') for folder in created)
+
+    revert_changes(logger.log_file)
+    assert sorted(os.listdir(test_dir)) == before
+    assert os.listdir(os.path.join(test_dir, 'Images')) == ['old.png']
+
+def test_layout_many_destination_directories(test_dir, logger, monkeypatch):
+    """Test that a batch spread over many hash subfolders keeps few directories open."""
+    for i in range(300):
+        write(os.path.join(test_dir, f'many{i}.png'))
+    monkeypatch.setattr(file_ops, 'DIR_FD_LIMIT', 8)
+    peak = [0]
+    real_open = DirectoryFds._open
+    def tracked_open(self, directory):
+        fd = real_open(self, directory)
+        peak[0] = max(peak[0], len(self._fds))
+        return fd
+    monkeypatch.setattr(DirectoryFds, '_open', tracked_open)
+    main(test_dir, layout=SubfolderLayout('hash'), logger=logger)
+
+    images = os.path.join(test_dir, 'Images')
+    assert len(os.listdir(images)) > 100
+    assert sum(len(os.listdir(os.path.join(images, folder))) for folder in os.listdir(images)
+               if os.path.isdir(os.path.join(images, folder))) == 305
+    assert not [name for name in os.listdir(test_dir) if name.startswith('many')]
+    if file_ops.SUPPORTS_DIR_FD:
+        assert 0 < peak[0] <= 8
+
+def test_layout_dedupe_finds_originals_in_subfolders(test_dir, logger):
+    """Test that dedupe compares files against copies placed in layout subfolders earlier."""
+    main(test_dir, layout=SubfolderLayout('hash'), logger=logger)
+    write(os.path.join(test_dir, 'photo0.jpg'))  # same name and contents as the copy moved before
+    main(test_dir, layout=SubfolderLayout('hash'), dedupe='skip', logger=logger)
+
+    assert os.path.exists(os.path.join(test_dir, 'photo0.jpg'))
+    bucket = SubfolderLayout('hash').directory(os.path.join(test_dir, 'Images'), 'photo0.jpg')
+    skipped = [src for change_type, src, _ in iter_changes(logger.log_file) if change_type == "duplicate_skipped"]
+    assert skipped == [os.path.join(bucket, 'photo0.jpg')]
+
+def test_layout_plan(test_dir):
+    """Test that planned moves and folders follow the layout and are summed per category."""
+    plan = build_plan(test_dir, layout=SubfolderLayout('count', limit=3))
+    images = os.path.join(test_dir, 'Images')
+    assert plan.create_directories[-2:] == [os.path.join(images, '0001'), os.path.join(images, '0002')]
+    assert plan.summary() == {'Images': 5}
+    assert move_category(os.path.join(test_dir, 'a.jpg'), os.path.join(images, '0001', 'a.jpg')) == 'Images'
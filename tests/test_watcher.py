@@ -0,0 +1,63 @@
+import os
+import shutil
+import pytest
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'), reason="inotify is Linux only")
+
+from watcher import Watcher
+from change_logger_singleton import initialize_logger, get_logger
+
+TEST_PATH = os.path.join(os.path.dirname(__file__), 'test_folder')
+
+@pytest.fixture
+def watcher():
+    """Create a recursive watcher over a temporary test directory."""
+    os.makedirs(TEST_PATH, exist_ok=True)
+    initialize_logger(TEST_PATH)
+    watcher = Watcher(TEST_PATH, recursive=True, debounce=0.1)
+    yield watcher
+    watcher.close()
+    if os.path.exists(TEST_PATH):
+        shutil.rmtree(TEST_PATH)
+    if os.path.exists(get_logger().log_file):
+        os.remove(get_logger().log_file)
+
+def write(path: str) -> None:
+    with open(path, 'w') as f:
+        f.write('content')
+
+# ------------------------------ Test watching ------------------------------
+
+def test_new_files_are_cleaned(watcher):
+    """Test that files written to the folder are moved in one batch."""
+    write(os.path.join(TEST_PATH, 'song.mp3'))
+    write(os.path.join(TEST_PATH, 'doc.pdf'))
+
+    files, new_dirs = watcher.poll(timeout=1)
+    assert files == {TEST_PATH: {'song.mp3', 'doc.pdf'}}
+    assert new_dirs == []
+
+    watcher.clean_batch(files, new_dirs)
+    assert os.path.exists(os.path.join(TEST_PATH, 'Audio', 'song.mp3'))
+    assert os.path.exists(os.path.join(TEST_PATH, 'Documents', 'doc.pdf'))
+
+    # moving files into the category folders doesn't produce a new batch
+    assert watcher.poll(timeout=0.2) == ({}, [])
+
+def test_new_subdirectories_are_cleaned_and_watched(watcher):
+    """Test that a new subfolder is cleaned and its later files are picked up."""
+    subfolder = os.path.join(TEST_PATH, 'subfolder')
+    os.makedirs(subfolder)
+    write(os.path.join(subfolder, 'image.png'))
+
+    watcher.clean_batch(*watcher.poll(timeout=1))
+    assert os.path.exists(os.path.join(subfolder, 'Images', 'image.png'))
+
+    write(os.path.join(subfolder, 'video.mp4'))
+    files, new_dirs = watcher.poll(timeout=1)
+    assert files == {subfolder: {'video.mp4'}}
+    watcher.clean_batch(files, new_dirs)
+    assert os.path.exists(os.path.join(subfolder, 'Video', 'video.mp4'))
@@ -0,0 +1,263 @@
+"""
+Event-driven watch mode for the Download Folder Cleaner (Linux only).
+
+Subscribes to inotify events through ctypes, coalesces bursts of events into
+debounced batches and runs the usual categorize/move/log pipeline only on the
+entries that changed.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from change_logger import ChangeLogger
+from change_logger_singleton import get_logger
+from content_sniffer import ContentSniffer
+from folder_cleaner import DEFAULT_RULES, create_directories, categorize_files, move_files, main
+from rules import RuleSet
+from stability import StabilityFilter
+from exclusions import ExclusionRules
+from subfolders import SubfolderLayout
+
+# inotify constants from <sys/inotify.h>
+IN_MOVED_TO = 0x00000080
+IN_CLOSE_WRITE = 0x00000008
+IN_CREATE = 0x00000100
+IN_MOVE_SELF = 0x00000800
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MOVE_SELF | IN_DELETE_SELF | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+class Inotify:
+    """Thin ctypes wrapper around the Linux inotify API."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError("libc not found, inotify is unavailable")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify is not supported on this platform")
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        """Watch a directory and return its watch descriptor."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        """Stop watching a descriptor (errors for already removed watches are ignored)."""
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: Optional[float]) -> List[Tuple[int, int, str]]:
+        """
+        Wait up to timeout seconds and read all pending events.
+
+        Returns:
+            List of (watch descriptor, mask, name) tuples
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+class Watcher:
+    """
+    Watches a folder (and in recursive mode its subfolders) and cleans new
+    entries in debounced batches.
+
+    Category folders are never watched and events naming them are dropped,
+    so moving files into them doesn't feed back into the watcher.
+    """
+
+    def __init__(self, base_path: str, recursive: bool = False, recursionDepth: int = -1,
+                 debounce: float = 2.0, workers: int = 1, max_batch_delay: float = 30.0,
+                 sniffer: Optional[ContentSniffer] = None, rules: Optional[RuleSet] = None,
+                 logger: Optional[ChangeLogger] = None, stability: Optional[StabilityFilter] = None,
+                 layout: Optional[SubfolderLayout] = None, exclusions: Optional[ExclusionRules] = None):
+        """
+        Args:
+            base_path: Folder to watch
+            recursive: Whether to watch subfolders as well
+            recursionDepth: How deep to watch subfolders (-1 for infinite)
+            debounce: Seconds without new events before a batch is cleaned
+            workers: Number of threads performing renames
+            max_batch_delay: Upper bound in seconds on how long a batch keeps
+                collecting events while the folder never goes quiet
+            sniffer: Optional content sniffer for files with unknown extensions
+            rules: Categorization rules (defaults to the built-in extension sets)
+            logger: Change logger of the run (defaults to the global one)
+            stability: Optional filter leaving files that are still being
+                downloaded in place until a later batch
+            layout: Optional layout placing files in subfolders of their
+                category folder
+            exclusions: Optional gitignore-style rules; excluded files are
+                left alone and excluded subfolders are never watched
+        """
+        self.base_path = base_path
+        self.recursive = recursive
+        self.debounce = debounce
+        self.workers = workers
+        self.max_batch_delay = max_batch_delay
+        self.sniffer = sniffer
+        self.rules = rules or DEFAULT_RULES
+        self.logger = logger or get_logger()
+        self.stability = stability
+        self.layout = layout
+        self.exclusions = exclusions
+        self.inotify = Inotify()
+        self.category_names = tuple(create_directories(base_path, self.rules, self.logger).keys())
+        self._watches: Dict[int, Tuple[str, int]] = {}  # wd -> (path, remaining depth)
+        self._watched_paths: Set[str] = set()
+        self.add_tree(base_path, recursionDepth if recursive else 0)
+
+    def add_tree(self, path: str, depth: int) -> None:
+        """Watch a directory and, within the remaining depth, its non-category subdirectories."""
+        stack = [(path, depth)]
+        while stack:
+            directory, remaining = stack.pop()
+            if directory in self._watched_paths:
+                continue
+            try:
+                wd = self.inotify.add_watch(directory)
+            except OSError as e:
+                print(f"Error watching {directory}: {e}")
+                continue
+            self._watches[wd] = (directory, remaining)
+            self._watched_paths.add(directory)
+            if remaining == 0:
+                continue
+            try:
+                with os.scandir(directory) as entries:
+                    subdir_paths = [entry.path for entry in entries
+                                    if entry.is_dir(follow_symlinks=False) and not entry.name.endswith(self.category_names)]
+            except OSError:
+                continue
+            if self.exclusions is not None:
+                subdir_paths = self.exclusions.prune(subdir_paths)
+            stack.extend((subdir_path, remaining - 1) for subdir_path in subdir_paths)
+
+    def poll(self, timeout: Optional[float] = None) -> Tuple[Dict[str, Set[str]], List[Tuple[str, int]]]:
+        """
+        Wait for events and collect them until the folder has been quiet for
+        the debounce interval.
+
+        Args:
+            timeout: Seconds to wait for the first event (None waits forever)
+
+        Returns:
+            Tuple of (directory -> names of new files, list of (new directory, remaining depth))
+        """
+        files: Dict[str, Set[str]] = {}
+        new_dirs: List[Tuple[str, int]] = []
+        events = self.inotify.read_events(timeout)
+        deadline = time.monotonic() + self.max_batch_delay
+        while events:
+            for wd, mask, name in events:
+                self._handle_event(wd, mask, name, files, new_dirs)
+            if time.monotonic() >= deadline:
+                break
+            events = self.inotify.read_events(self.debounce)
+        return files, new_dirs
+
+    def _handle_event(self, wd: int, mask: int, name: str,
+                      files: Dict[str, Set[str]], new_dirs: List[Tuple[str, int]]) -> None:
+        if mask & IN_Q_OVERFLOW:
+            # events were dropped, fall back to cleaning every watched directory
+            for directory, remaining in self._watches.values():
+                new_dirs.append((directory, 0))
+            return
+        if mask & (IN_IGNORED | IN_MOVE_SELF | IN_DELETE_SELF):
+            if wd in self._watches:
+                self.inotify.rm_watch(wd)
+                self._watched_paths.discard(self._watches.pop(wd)[0])
+            return
+        if wd not in self._watches or not name or name.endswith(self.category_names):
+            return
+
+        directory, remaining = self._watches[wd]
+        if mask & IN_ISDIR:
+            if self.recursive and remaining != 0:
+                path = os.path.join(directory, name)
+                if self.exclusions is None or self.exclusions.prune([path]):
+                    new_dirs.append((path, remaining - 1))
+        elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            files.setdefault(directory, set()).add(name)
+
+    def clean_batch(self, files: Dict[str, Set[str]], new_dirs: List[Tuple[str, int]]) -> None:
+        """Clean the entries collected by poll and start watching new subdirectories."""
+        for directory, names in files.items():
+            # only files that are still there; they may have been moved or deleted during the debounce
+            present = [name for name in names if os.path.isfile(os.path.join(directory, name))]
+            if self.exclusions is not None:
+                present = self.exclusions.filter_files(directory, present)
+            if not present:
+                continue
+            directories = create_directories(directory, self.rules, self.logger)
+            file_map = categorize_files(present, self.rules, directory)
+            if self.stability is not None:
+                self.stability.filter(directory, file_map)
+            if self.sniffer is not None:
+                self.sniffer.reclassify(directory, file_map, self.rules.default)
+            move_files(directory, file_map, directories, self.workers, self.logger, layout=self.layout)
+
+        for directory, remaining in new_dirs:
+            if not os.path.isdir(directory):
+                continue
+            self.add_tree(directory, remaining)
+            main(directory, recursive=remaining != 0, recursionDepth=remaining, workers=self.workers,
+                 sniffer=self.sniffer, rules=self.rules, logger=self.logger, stability=self.stability,
+                 layout=self.layout, exclusions=self.exclusions)
+
+        if files or new_dirs:
+            self.logger.save_log()
+
+    def run(self) -> None:
+        """Clean batches until interrupted."""
+        print(f"Watching {self.base_path} (Ctrl+C to stop)")
+        try:
+            while True:
+                files, new_dirs = self.poll()
+                self.clean_batch(files, new_dirs)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.inotify.close()